@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark: import a Lambda handler module in fresh interpreters
+and aggregate the per-phase "[init] {...}" reports it prints.
+
+    python benchmarks/bench_cold_start.py --module fd --runs 5
+    RESNET_ARTIFACT=/tmp/resnet.pt python benchmarks/bench_cold_start.py --module fr-part1
+
+For the recognition modules a synthetic WEIGHTS_PATH gallery is generated
+unless one is already set in the environment.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+MODULES = {
+    "fd": ("project2-part1-lambdas/face-detection", "fd_lambda"),
+    "fr-part1": ("project2-part1-lambdas/face-recognition", "fr_lambda"),
+    "fr-part2": ("project2-part2-edge/face-recognition", "fr_lambda"),
+}
+
+
+def _synthetic_weights(path, n):
+    code = (
+        "import sys, torch\n"
+        "n = int(sys.argv[2])\n"
+        "emb = torch.nn.functional.normalize(torch.randn(n, 512), dim=1)\n"
+        "torch.save([list(emb), [f'person_{i}' for i in range(n)]], sys.argv[1])\n"
+    )
+    subprocess.run([sys.executable, "-c", code, path, str(n)], check=True)
+
+
+def _one_run(module_dir, module_name, env):
+    proc = subprocess.run(
+        [sys.executable, "-c", f"import {module_name}"],
+        cwd=os.path.join(_ROOT, module_dir),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    for line in proc.stdout.splitlines():
+        if line.startswith("[init] "):
+            return json.loads(line[len("[init] "):])
+    raise RuntimeError(f"no [init] report (exit {proc.returncode}):\n{proc.stderr[-2000:]}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--module", choices=sorted(MODULES), default="fd")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--gallery-size", type=int, default=1000)
+    args = ap.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.module.startswith("fr") and "WEIGHTS_PATH" not in env:
+            env["WEIGHTS_PATH"] = os.path.join(tmp, "weights.pt")
+            _synthetic_weights(env["WEIGHTS_PATH"], args.gallery_size)
+
+        module_dir, module_name = MODULES[args.module]
+        reports = [_one_run(module_dir, module_name, env) for _ in range(args.runs)]
+
+    phases = sorted({p for r in reports for p in r["phases"]})
+    out = {
+        "module": args.module,
+        "runs": args.runs,
+        "total_ms_p50": statistics.median(r["total_ms"] for r in reports),
+        "total_ms_max": max(r["total_ms"] for r in reports),
+        "phases_ms_p50": {
+            p: statistics.median(r["phases"][p] for r in reports if p in r["phases"])
+            for p in phases
+        },
+    }
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Face detection benchmark: the classic path (full JPEG decode, MTCNN at full
+resolution) vs common/fast_detect.py (reduced-scale decode, scaled pyramid,
+crop from the full-resolution frame).
+
+    python benchmarks/bench_detection.py --images ./frames
+    python benchmarks/bench_detection.py --width 1920 --height 1080 --max-side 480 640
+
+Reports per-frame CPU time (process time, all threads) and wall time, and -
+with --images - detection recall and box IoU relative to the classic path.
+Synthetic noise frames have no faces, so they only measure cost.
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(_ROOT, "common"))
+from fast_detect import FastDetector  # noqa: E402
+
+
+def _frames(image_dir, n, size, seed):
+    """Encoded frames (bytes), as they arrive on the wire."""
+    if image_dir:
+        paths = sorted(
+            os.path.join(image_dir, f) for f in os.listdir(image_dir)
+            if f.lower().endswith((".jpg", ".jpeg", ".png"))
+        )[:n]
+        out = []
+        for p in paths:
+            with open(p, "rb") as fh:
+                out.append(fh.read())
+        return out
+    rng = np.random.default_rng(seed)
+    out = []
+    for _ in range(n):
+        buf = io.BytesIO()
+        Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)).save(
+            buf, format="JPEG", quality=90
+        )
+        out.append(buf.getvalue())
+    return out
+
+
+def _iou(a, b):
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _time_case(fn, frames, repeats):
+    cpu_ms, wall_ms = [], []
+    for _ in range(repeats):
+        for data in frames:
+            c0, w0 = time.process_time(), time.perf_counter()
+            fn(data)
+            cpu_ms.append((time.process_time() - c0) * 1000.0)
+            wall_ms.append((time.perf_counter() - w0) * 1000.0)
+    return {
+        "cpu_ms_per_frame": statistics.mean(cpu_ms),
+        "wall_ms_p50": statistics.median(wall_ms),
+        "wall_ms_mean": statistics.mean(wall_ms),
+    }
+
+
+def _classic_box(mtcnn, data):
+    img = Image.open(io.BytesIO(data)).convert("RGB")
+    boxes, probs, points = mtcnn.detect(img, landmarks=True)
+    box, _, _ = mtcnn.select_boxes(boxes, probs, points, img, method=mtcnn.selection_method)
+    return None if box is None else np.asarray(box, dtype=np.float64).reshape(-1, 4)[0]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--images", help="directory of frames (default: synthetic noise JPEGs)")
+    ap.add_argument("--count", type=int, default=32, help="frames to use")
+    ap.add_argument("--width", type=int, default=1920)
+    ap.add_argument("--height", type=int, default=1080)
+    ap.add_argument("--max-side", type=int, nargs="+", default=[320, 480, 640])
+    ap.add_argument("--min-face", type=int, default=20, help="min face size, full-res px")
+    ap.add_argument("--repeats", type=int, default=3)
+    ap.add_argument("--threads", type=int, default=1, help="torch threads")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    from facenet_pytorch import MTCNN
+
+    torch.set_grad_enabled(False)
+    torch.set_num_threads(args.threads)
+    mtcnn = MTCNN(image_size=160, margin=0, min_face_size=args.min_face)
+    frames = _frames(args.images, args.count, (args.width, args.height), args.seed)
+    if not frames:
+        raise SystemExit(f"no frames found in {args.images}")
+
+    def classic(data):
+        img = Image.open(io.BytesIO(data)).convert("RGB")
+        return mtcnn(img, return_prob=True)
+
+    classic(frames[0])
+    results = [dict(mode="classic", **_time_case(classic, frames, args.repeats))]
+    reference = [_classic_box(mtcnn, d) for d in frames]
+
+    for max_side in args.max_side:
+        fast = FastDetector(mtcnn, max_side=max_side, min_face_px=args.min_face)
+
+        def fast_path(data):
+            frame = fast.open(data)
+            (box, prob), = fast.detect([frame])
+            return (fast.crop(frame, box) if box is not None else None), prob
+
+        fast_path(frames[0])
+        case = dict(mode="fast", max_side=max_side, **_time_case(fast_path, frames, args.repeats))
+
+        # Recall / box agreement against the classic detections (full-res coordinates)
+        found = agreed = 0
+        ious = []
+        for data, ref in zip(frames, reference):
+            frame = fast.open(data)
+            (box, _), = fast.detect([frame])
+            if ref is None:
+                continue
+            found += 1
+            if box is not None:
+                agreed += 1
+                ious.append(_iou(ref, box / frame.scale))
+        case.update(
+            classic_faces=found,
+            recall=agreed / found if found else None,
+            box_iou_mean=statistics.mean(ious) if ious else None,
+            box_iou_min=min(ious) if ious else None,
+        )
+        results.append(case)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Face wire format benchmark: per-stage encode (detector) and decode
+(recognizer) time, message size and pixel error for v1 (JPEG) vs v2.
+
+v1 decode reproduces fr_lambda._preprocess_face_from_b64 (PIL decode +
+upsample to 240). Pixel error is measured against the uint8 crop the
+detector started from, after resampling to the decoded size.
+
+    python benchmarks/bench_face_payload.py --images ./faces --iters 50
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+import face_payload  # noqa: E402
+
+
+def _decode_v1(face_b64):
+    img = Image.open(io.BytesIO(base64.b64decode(face_b64))).convert("RGB")
+    img = img.resize((240, 240))
+    img_np = np.transpose(np.array(img).astype(np.float32) / 255.0, (2, 0, 1))
+    return torch.from_numpy((img_np - 0.5) / 0.5).unsqueeze(0)
+
+
+def _faces(image_dir, size, n, seed):
+    """MTCNN-like (3, size, size) float tensors from images or synthetic noise."""
+    if image_dir:
+        paths = sorted(
+            os.path.join(image_dir, f) for f in os.listdir(image_dir)
+            if f.lower().endswith((".jpg", ".jpeg", ".png"))
+        )[:n]
+        out = []
+        for p in paths:
+            img = Image.open(p).convert("RGB").resize((size, size))
+            x = torch.from_numpy(np.array(img)).permute(2, 0, 1).float()
+            out.append((x - 127.5) / 128.0)
+        return out
+    g = torch.Generator().manual_seed(seed)
+    small = torch.rand(n, 3, size // 10, size // 10, generator=g)
+    faces = torch.nn.functional.interpolate(small, size=(size, size), mode="bicubic")
+    return [(f * 255.0 - 127.5) / 128.0 for f in faces]
+
+
+def _pixel_err(face, decoded):
+    ref = torch.from_numpy(face_payload._to_uint8(face)).float().unsqueeze(0) * (2.0 / 255.0) - 1.0
+    if ref.shape[-1] != decoded.shape[-1]:
+        ref = torch.nn.functional.interpolate(ref, size=decoded.shape[-2:], mode="bilinear")
+    return float((decoded - ref).abs().mean())
+
+
+def run(args):
+    results = {}
+    for fmt, size in (("v1", 240), ("v2", args.face_size)):
+        faces = _faces(args.images, size, args.iters, args.seed)
+        enc_ms, dec_ms, sizes, errs = [], [], [], []
+        for face in faces:
+            t0 = time.perf_counter()
+            fields = face_payload.encode(face, fmt)
+            body = json.dumps(fields)
+            t1 = time.perf_counter()
+            parsed = json.loads(body)
+            x = (
+                face_payload.decode_v2(parsed["face"]) if fmt == "v2"
+                else _decode_v1(parsed["face_image"])
+            )
+            t2 = time.perf_counter()
+            enc_ms.append((t1 - t0) * 1000.0)
+            dec_ms.append((t2 - t1) * 1000.0)
+            sizes.append(len(body))
+            errs.append(_pixel_err(face, x))
+        results[fmt] = {
+            "crop_size": size,
+            "decoded_shape": list(x.shape),
+            "encode_ms_p50": statistics.median(enc_ms),
+            "decode_ms_p50": statistics.median(dec_ms),
+            "message_bytes_mean": statistics.fmean(sizes),
+            "message_bytes_max": max(sizes),
+            "mean_abs_pixel_err": statistics.fmean(errs),
+        }
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--images", help="directory of face crops (default: synthetic)")
+    ap.add_argument("--face-size", type=int, default=240, help="v2 crop size (FACE_SIZE)")
+    ap.add_argument("--iters", type=int, default=50)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Gallery scoring benchmark: memory, latency and accuracy of the compact
+gallery modes against the exact float32 gallery.
+
+Uses a synthetic gallery of unit-norm 512-d embeddings (FaceNet outputs are
+L2-normalized) and queries drawn near random gallery rows, so top-1 agreement
+with float32 is a meaningful accuracy signal.
+
+    python benchmarks/bench_gallery.py --sizes 1000 10000 100000 --queries 200
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import torch
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from gallery import MODES, Gallery  # noqa: E402
+
+
+def _synthetic(n, dim, n_queries, noise, seed):
+    g = torch.Generator().manual_seed(seed)
+    emb = torch.nn.functional.normalize(torch.randn(n, dim, generator=g), dim=1)
+    picks = torch.randint(0, n, (n_queries,), generator=g)
+    queries = emb[picks] + noise * torch.randn(n_queries, dim, generator=g)
+    queries = torch.nn.functional.normalize(queries, dim=1)
+    return emb, [f"person_{i}" for i in range(n)], queries
+
+
+def _legacy_scan(emb_matrix, query):
+    """The pre-Gallery scorer: materialized (N, D) diff + argmin."""
+    diff = emb_matrix - query.unsqueeze(0)
+    return int(torch.argmin((diff * diff).sum(dim=1)).item())
+
+
+def _time_per_query(fn, queries, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for q in queries:
+            fn(q)
+        best = min(best, (time.perf_counter() - t0) / len(queries))
+    return best * 1000.0
+
+
+def run(sizes, dim, n_queries, noise, k, repeat, seed):
+    results = []
+    for n in sizes:
+        emb, labels, queries = _synthetic(n, dim, n_queries, noise, seed)
+        exact = Gallery(emb, labels, mode="float32")
+        ref_d, ref_i = exact.search(queries, k)
+
+        row = {
+            "n": n,
+            "dim": dim,
+            "legacy_ms_per_query": _time_per_query(
+                lambda q: _legacy_scan(emb, q), queries, repeat
+            ),
+            "modes": {},
+        }
+        for mode in MODES:
+            gal = exact if mode == "float32" else Gallery(emb, labels, mode=mode)
+            d, i = gal.search(queries, k)
+            t0 = time.perf_counter()
+            gal.search(queries, k)
+            batch_ms = (time.perf_counter() - t0) * 1000.0
+            row["modes"][mode] = {
+                "bytes": gal.nbytes,
+                "compression_vs_float32": exact.nbytes / gal.nbytes,
+                "ms_per_query": _time_per_query(lambda q: gal.search(q, k), queries, repeat),
+                "batch_ms": batch_ms,
+                "top1_agreement": float((i[:, 0] == ref_i[:, 0]).float().mean()),
+                "max_abs_dist_err": float((d - ref_d).abs().max()),
+            }
+        results.append(row)
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    ap.add_argument("--dim", type=int, default=512)
+    ap.add_argument("--queries", type=int, default=100)
+    ap.add_argument("--noise", type=float, default=0.02)
+    ap.add_argument("--top-k", type=int, default=5)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--threads", type=int, default=1, help="torch intra-op threads")
+    args = ap.parse_args()
+
+    torch.set_num_threads(args.threads)
+    torch.set_grad_enabled(False)
+    out = run(args.sizes, args.dim, args.queries, args.noise, args.top_k, args.repeat, args.seed)
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
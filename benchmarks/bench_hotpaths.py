@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks of the per-image hot paths, CPU only, with a stored
+baseline and regression check.
+
+Cases (name/parameter):
+  decode_rgb/WxH         JPEG decode + convert("RGB") of a frame
+  mtcnn_detect/WxH       MTCNN detection + crop (the detectors' classic path)
+  face_normalize/S       MTCNN face min-max normalization to uint8
+  face_encode_v1/S       normalization + 160x160 JPEG q70 re-encode (v1 wire format)
+  face_encode_v2/S       normalization + zlib-sub encode (v2 wire format)
+  preprocess_b64_v1      fr_lambda._preprocess_face_from_b64 (reproduced here:
+                         importing fr_lambda would load the model and AWS clients)
+  decode_v2/S            face_payload.decode_v2
+  resnet_forward/S       InceptionResnetV1 forward pass, batch 1
+  gallery_torch_dist/N   the original per-entry torch.dist loop + argmin
+  gallery_search/MODE/N  Gallery.search (top-1) in each GALLERY_MODE
+
+Frames and faces are synthetic (smooth noise, so JPEG sizes are realistic)
+unless --images is given; gallery embeddings are random unit vectors. Times
+are per operation: median and p95 over at least --iters runs and --min-secs.
+
+    python benchmarks/bench_hotpaths.py --save-baseline benchmarks/baseline_hotpaths.json
+    python benchmarks/bench_hotpaths.py --baseline benchmarks/baseline_hotpaths.json --threshold 0.15
+    python benchmarks/bench_hotpaths.py --only gallery --gallery-sizes 1000 100000
+
+With --baseline, cases whose median is more than --threshold slower than the
+baseline are reported as regressions and the exit status is 1.
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+import face_payload  # noqa: E402
+from gallery import MODES, Gallery  # noqa: E402
+from inference import build_eager  # noqa: E402
+
+
+def _frames(image_dir, n, size, seed):
+    """Encoded frames (bytes), as they arrive on the wire."""
+    if image_dir:
+        paths = sorted(
+            os.path.join(image_dir, f) for f in os.listdir(image_dir)
+            if f.lower().endswith((".jpg", ".jpeg", ".png"))
+        )[:n]
+        out = []
+        for p in paths:
+            with open(p, "rb") as fh:
+                out.append(fh.read())
+        return out
+    g = torch.Generator().manual_seed(seed)
+    out = []
+    for _ in range(n):
+        small = torch.rand(1, 3, size[1] // 16, size[0] // 16, generator=g)
+        img = torch.nn.functional.interpolate(small, size=(size[1], size[0]), mode="bicubic")
+        img = (img[0] + 0.05 * torch.randn(img.shape[1:], generator=g)).clamp(0, 1)
+        buf = io.BytesIO()
+        Image.fromarray((img.permute(1, 2, 0) * 255).byte().numpy()).save(buf, format="JPEG", quality=90)
+        out.append(buf.getvalue())
+    return out
+
+
+def _faces(n, size, seed):
+    """MTCNN-like (3, size, size) float face tensors."""
+    g = torch.Generator().manual_seed(seed)
+    small = torch.rand(n, 3, size // 10, size // 10, generator=g)
+    faces = torch.nn.functional.interpolate(small, size=(size, size), mode="bicubic")
+    return [(f * 255.0 - 127.5) / 128.0 for f in faces]
+
+
+def _preprocess_face_from_b64(face_b64: str) -> torch.Tensor:
+    # Same steps as fr_lambda._preprocess_face_from_b64 (both variants)
+    face_bytes = base64.b64decode(face_b64)
+    img = Image.open(io.BytesIO(face_bytes)).convert("RGB")
+    img = img.resize((240, 240))
+    img_np = np.array(img).astype(np.float32) / 255.0
+    img_np = np.transpose(img_np, (2, 0, 1))
+    img_np = (img_np - 0.5) / 0.5
+    return torch.from_numpy(img_np).unsqueeze(0)
+
+
+def _torch_dist_scan(embedding_list, name_list, emb):
+    # The original fr_lambda scorer: one torch.dist per gallery entry
+    dist_list = []
+    for emb_db in embedding_list:
+        db_vec = emb_db
+        if db_vec.ndim > 1:
+            db_vec = db_vec.squeeze(0)
+        dist = torch.dist(emb, db_vec).item()
+        dist_list.append(dist)
+    min_idx = int(np.argmin(np.array(dist_list)))
+    return name_list[min_idx]
+
+
+def _measure(fn, inputs, iters, min_secs, warmup):
+    """Per-call times (ms) of fn over inputs, cycled."""
+    for i in range(warmup):
+        fn(inputs[i % len(inputs)])
+    samples = []
+    start = time.perf_counter()
+    i = 0
+    while i < iters or time.perf_counter() - start < min_secs:
+        x = inputs[i % len(inputs)]
+        t0 = time.perf_counter()
+        fn(x)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+        i += 1
+    samples.sort()
+    return {
+        "median_ms": round(statistics.median(samples), 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(0.95 * len(samples)))], 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "runs": len(samples),
+    }
+
+
+def _cases(args):
+    """Yield (name, setup); setup() -> (fn, inputs) runs only for selected cases."""
+    w, h = args.width, args.height
+    frame_tag = "images" if args.images else f"{w}x{h}"
+    frames = _frames(args.images, args.frames, (w, h), args.seed)
+    faces = _faces(args.frames, args.face_size, args.seed)
+
+    yield f"decode_rgb/{frame_tag}", lambda: (lambda b: Image.open(io.BytesIO(b)).convert("RGB"), frames)
+
+    def mtcnn_case():
+        from facenet_pytorch import MTCNN
+
+        mtcnn = MTCNN(image_size=args.face_size, margin=0, min_face_size=20)
+        imgs = [Image.open(io.BytesIO(b)).convert("RGB") for b in frames]
+        return lambda img: mtcnn(img, return_prob=True), imgs
+
+    yield f"mtcnn_detect/{frame_tag}", mtcnn_case
+    yield f"face_normalize/{args.face_size}", lambda: (face_payload._to_uint8, faces)
+    yield f"face_encode_v1/{args.face_size}", lambda: (face_payload.encode_v1, faces)
+    yield f"face_encode_v2/{args.face_size}", lambda: (face_payload.encode_v2, faces)
+    yield "preprocess_b64_v1", lambda: (
+        _preprocess_face_from_b64, [face_payload.encode_v1(f)["face_image"] for f in faces]
+    )
+    yield f"decode_v2/{args.face_size}", lambda: (
+        face_payload.decode_v2, [face_payload.encode_v2(f)["face"] for f in faces]
+    )
+
+    for size in args.resnet_sizes:
+        def resnet_case(size=size):
+            model = build_eager(None if args.pretrained == "none" else args.pretrained)
+            return lambda t: model(t.unsqueeze(0)), _faces(4, size, args.seed)
+
+        yield f"resnet_forward/{size}", resnet_case
+
+    for n in args.gallery_sizes:
+        g = torch.Generator().manual_seed(args.seed)
+        emb = torch.nn.functional.normalize(torch.randn(n, 512, generator=g), dim=1)
+        names = [f"person_{i}" for i in range(n)]
+        queries = list(torch.nn.functional.normalize(torch.randn(8, 512, generator=g), dim=1))
+        # fr_lambda loaded the gallery as a list of tensors
+        rows = list(emb)
+        yield f"gallery_torch_dist/{n}", lambda rows=rows, names=names, queries=queries: (
+            lambda q: _torch_dist_scan(rows, names, q), queries
+        )
+        for mode in MODES:
+            def search_case(emb=emb, names=names, queries=queries, mode=mode):
+                gal = Gallery(emb, names, mode=mode)
+                return lambda q: gal.search(q, 1), queries
+
+            yield f"gallery_search/{mode}/{n}", search_case
+
+
+def _environment(args):
+    return {
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "threads": args.threads,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Regressions / improvements beyond `threshold` (a fraction) vs baseline medians."""
+    regressions, improvements = [], []
+    for name, r in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base.get("median_ms"):
+            continue
+        ratio = r["median_ms"] / base["median_ms"]
+        r["vs_baseline"] = round(ratio, 3)
+        entry = {"case": name, "baseline_ms": base["median_ms"], "median_ms": r["median_ms"], "ratio": round(ratio, 3)}
+        if ratio > 1.0 + threshold:
+            regressions.append(entry)
+        elif ratio < 1.0 - threshold:
+            improvements.append(entry)
+    return regressions, improvements
+
+
+def main():
+    ap = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="\n".join(__doc__.strip().splitlines()[1:]),
+    )
+    ap.add_argument("--images", help="directory of frames (default: synthetic)")
+    ap.add_argument("--width", type=int, default=640)
+    ap.add_argument("--height", type=int, default=480)
+    ap.add_argument("--frames", type=int, default=8, help="distinct frames / faces cycled through")
+    ap.add_argument("--face-size", type=int, default=240, help="MTCNN crop size (FACE_SIZE)")
+    ap.add_argument("--resnet-sizes", type=int, nargs="+", default=[160, 240])
+    ap.add_argument("--gallery-sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    ap.add_argument("--pretrained", default="none",
+                    help="InceptionResnetV1 weights ('none' avoids a download; timing is the same)")
+    ap.add_argument("--iters", type=int, default=10, help="minimum runs per case")
+    ap.add_argument("--min-secs", type=float, default=1.0, help="minimum time per case")
+    ap.add_argument("--warmup", type=int, default=2)
+    ap.add_argument("--threads", type=int, default=1, help="torch intra-op threads")
+    ap.add_argument("--only", nargs="+", help="run cases whose name contains any of these")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--baseline", help="compare against this baseline JSON")
+    ap.add_argument("--threshold", type=float, default=0.15, help="allowed median slowdown (fraction)")
+    ap.add_argument("--save-baseline", help="write the results as a baseline JSON")
+    args = ap.parse_args()
+
+    torch.set_num_threads(args.threads)
+    torch.set_grad_enabled(False)
+
+    results = {}
+    for name, setup in _cases(args):
+        if args.only and not any(sub in name for sub in args.only):
+            continue
+        fn, inputs = setup()
+        results[name] = _measure(fn, inputs, args.iters, args.min_secs, args.warmup)
+        print(f"[bench] {name}: {results[name]['median_ms']} ms", file=sys.stderr, flush=True)
+
+    out = {"environment": _environment(args), "results": results}
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("environment") != out["environment"]:
+            print(f"[bench] WARNING: baseline environment differs: {baseline.get('environment')}",
+                  file=sys.stderr, flush=True)
+        regressions, improvements = compare(results, baseline, args.threshold)
+        out["threshold"] = args.threshold
+        out["regressions"] = regressions
+        out["improvements"] = improvements
+        status = 1 if regressions else 0
+    print(json.dumps(out, indent=2))
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"environment": out["environment"], "results": results}, f, indent=2)
+            f.write("\n")
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
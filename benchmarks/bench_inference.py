@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+InceptionResnetV1 backend benchmark: latency, throughput and embedding drift
+of each RESNET_BACKEND against the eager float32 model.
+
+Drift is reported as the worst-case L2 distance and cosine similarity between
+backend and eager embeddings, plus nearest-neighbour agreement on a gallery
+built from eager embeddings of the same inputs' perturbations.
+
+    python benchmarks/bench_inference.py --threads 1 2 --batch 8
+    python benchmarks/bench_inference.py --pretrained none   # offline run
+"""
+import argparse
+import copy
+import json
+import os
+import statistics
+import sys
+import time
+
+import torch
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from inference import BACKENDS, build_eager, optimize  # noqa: E402
+
+
+def _inputs(n, image_size, seed):
+    # Smooth random images in [-1, 1] (the normalized range the model sees)
+    g = torch.Generator().manual_seed(seed)
+    small = torch.rand(n, 3, image_size // 8, image_size // 8, generator=g)
+    x = torch.nn.functional.interpolate(small, size=(image_size, image_size), mode="bilinear")
+    return x * 2.0 - 1.0
+
+
+def _latency_ms(model, x, iters):
+    samples = []
+    for i in range(iters):
+        t0 = time.perf_counter()
+        model(x[i % x.shape[0]:i % x.shape[0] + 1])
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    samples.sort()
+    return {
+        "p50": statistics.median(samples),
+        "p95": samples[min(len(samples) - 1, int(0.95 * len(samples)))],
+        "mean": statistics.fmean(samples),
+    }
+
+
+def _throughput(model, x, batch, iters):
+    xb = x[:batch]
+    t0 = time.perf_counter()
+    for _ in range(iters):
+        model(xb)
+    return batch * iters / (time.perf_counter() - t0)
+
+
+def run(args):
+    pretrained = None if args.pretrained == "none" else args.pretrained
+    x = _inputs(max(args.batch, 16), args.image_size, args.seed)
+    eager = build_eager(pretrained)
+    ref = eager(x)
+    # Gallery from slightly perturbed copies, so nearest-neighbour agreement
+    # measures whether drift would change a recognition result
+    gallery = eager(x + 0.05 * torch.randn_like(x))
+
+    results = []
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+        for backend in args.backends:
+            t0 = time.perf_counter()
+            # Optimize a copy of the same weights so drift is backend-only
+            model = optimize(copy.deepcopy(eager), backend, image_size=args.image_size)
+            build_s = time.perf_counter() - t0
+
+            for _ in range(args.warmup):
+                model(x[:1])
+
+            emb = model(x)
+            cos = torch.nn.functional.cosine_similarity(emb, ref, dim=1)
+            nn_backend = torch.cdist(emb, gallery).argmin(dim=1)
+            nn_eager = torch.cdist(ref, gallery).argmin(dim=1)
+
+            results.append({
+                "backend": backend,
+                "threads": threads,
+                "build_s": build_s,
+                "latency_ms": _latency_ms(model, x, args.iters),
+                "throughput_per_s": _throughput(model, x, args.batch, max(1, args.iters // 4)),
+                "batch": args.batch,
+                "drift": {
+                    "max_l2": float((emb - ref).norm(dim=1).max()),
+                    "min_cosine": float(cos.min()),
+                    "nn_agreement": float((nn_backend == nn_eager).float().mean()),
+                },
+            })
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    ap.add_argument("--threads", type=int, nargs="+", default=[1, 2])
+    ap.add_argument("--batch", type=int, default=8)
+    ap.add_argument("--iters", type=int, default=20)
+    ap.add_argument("--warmup", type=int, default=3)
+    ap.add_argument("--image-size", type=int, default=240)
+    ap.add_argument("--pretrained", default="vggface2", help="'vggface2', 'casia-webface' or 'none'")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    torch.set_grad_enabled(False)
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
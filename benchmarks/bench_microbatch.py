@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+MTCNN micro-batching benchmark: throughput vs added latency across batch
+windows, with `--producers` threads submitting frames closed-loop (the shape
+of the edge worker pool feeding the batcher).
+
+    python benchmarks/bench_microbatch.py --windows 0 5 10 20 50 --batch 8 --producers 8
+    python benchmarks/bench_microbatch.py --images ./frames
+
+window 0 with batch 1 is the unbatched baseline (each producer calls MTCNN).
+Detection is fd_component's batch path: fast_detect.detect_best over the
+batch, then one mtcnn.extract per frame with a face.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(_ROOT, "project2-part2-edge", "face-detection"))
+sys.path.append(os.path.join(_ROOT, "common"))
+from fast_detect import detect_best  # noqa: E402
+from microbatch import MicroBatcher  # noqa: E402
+
+
+def _frames(image_dir, n, size, seed):
+    if image_dir:
+        paths = sorted(
+            os.path.join(image_dir, f) for f in os.listdir(image_dir)
+            if f.lower().endswith((".jpg", ".jpeg", ".png"))
+        )[:n]
+        return [Image.open(p).convert("RGB").resize(size) for p in paths]
+    rng = np.random.default_rng(seed)
+    return [
+        Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8))
+        for _ in range(n)
+    ]
+
+
+def _run_case(detect, frames, producers, duration):
+    latencies = []
+    lock = threading.Lock()
+    stop = time.perf_counter() + duration
+
+    def producer(offset):
+        i = offset
+        local = []
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            detect(frames[i % len(frames)])
+            local.append((time.perf_counter() - t0) * 1000.0)
+            i += producers
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=producer, args=(k,)) for k in range(producers)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "frames": len(latencies),
+        "throughput_fps": len(latencies) / elapsed,
+        "latency_ms_p50": statistics.median(latencies),
+        "latency_ms_p95": latencies[int(0.95 * (len(latencies) - 1))],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--images", help="directory of frames (default: synthetic noise)")
+    ap.add_argument("--width", type=int, default=640)
+    ap.add_argument("--height", type=int, default=480)
+    ap.add_argument("--batch", type=int, default=8)
+    ap.add_argument("--windows", type=float, nargs="+", default=[0, 5, 10, 20, 50])
+    ap.add_argument("--producers", type=int, default=8)
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds per case")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--face-size", type=int, default=240, help="MTCNN crop size (FACE_SIZE)")
+    args = ap.parse_args()
+
+    from facenet_pytorch import MTCNN
+
+    torch.set_grad_enabled(False)
+    mtcnn = MTCNN(image_size=args.face_size, margin=0, min_face_size=20)
+    frames = _frames(args.images, 32, (args.width, args.height), args.seed)
+
+    def detect_batch(imgs):
+        # Frames are all one size, so one detect call covers the batch
+        return [
+            (mtcnn.extract(img, box.reshape(1, 4), None), prob) if box is not None else (None, None)
+            for img, (box, prob) in zip(imgs, detect_best(mtcnn, imgs))
+        ]
+
+    # Baseline: every producer calls MTCNN itself, threads split across producers
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // args.producers))
+    results = [dict(
+        mode="unbatched",
+        **_run_case(lambda img: detect_batch([img])[0], frames, args.producers, args.duration),
+    )]
+
+    torch.set_num_threads(os.cpu_count() or 1)
+    for window in args.windows:
+        batcher = MicroBatcher(detect_batch, args.batch, window)
+        case = _run_case(batcher.submit, frames, args.producers, args.duration)
+        results.append(dict(mode="batched", window_ms=window, max_batch=args.batch,
+                            **case, batcher=batcher.stats()))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Edge recognition offload benchmark: latency and throughput of the
+RECOGNITION_MODEs (cloud, local, adaptive) under an open-loop frame rate.
+
+Faces go through the component's FramePool and OffloadScheduler. "local"
+runs the real EdgeRecognizer (InceptionResnetV1 + gallery); "cloud" is
+simulated: the worker pays --send-ms for the SQS send and the result lands
+after a log-normal round trip around --cloud-rtt-ms, which is also fed back
+to the scheduler as the recognition feedback would be.
+
+    python benchmarks/bench_offload.py --rate 4 8 16 --workers 4 --cloud-rtt-ms 800
+    python benchmarks/bench_offload.py --pretrained none   # no weight download
+"""
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import torch
+
+_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(_ROOT, "common"))
+sys.path.append(os.path.join(_ROOT, "project2-part2-edge", "face-detection"))
+from edge_recognizer import EdgeRecognizer  # noqa: E402
+from frame_pool import FramePool  # noqa: E402
+from offload import MODES, OffloadScheduler  # noqa: E402
+
+
+def _synthetic_weights(path, n):
+    emb = torch.nn.functional.normalize(torch.randn(n, 512), dim=1)
+    torch.save([list(emb), [f"person_{i}" for i in range(n)]], path)
+
+
+def _run_case(mode, recognizer, args, rate, rng):
+    scheduler = OffloadScheduler(mode, args.workers, cloud_rtt_ms=args.cloud_rtt_ms)
+    latencies = []
+    outstanding = []
+    lock = threading.Lock()
+    face = torch.rand(3, args.face_size, args.face_size) * 2 - 1
+
+    def done(submitted):
+        with lock:
+            latencies.append((time.perf_counter() - submitted) * 1000.0)
+
+    def cloud_reply(submitted, rtt_ms):
+        scheduler.observe_cloud(rtt_ms)
+        done(submitted)
+
+    def handler(submitted):
+        if scheduler.decide(pool.depth()) == "local":
+            _, took_ms = recognizer.recognize(face)
+            scheduler.observe_local(took_ms)
+            done(submitted)
+            return
+        time.sleep(args.send_ms / 1000.0)
+        with lock:
+            rtt_ms = rng.lognormvariate(math.log(args.cloud_rtt_ms), args.rtt_sigma)
+        t = threading.Timer(rtt_ms / 1000.0, cloud_reply, args=(submitted, rtt_ms))
+        t.start()
+        with lock:
+            outstanding.append(t)
+
+    pool = FramePool(handler, workers=args.workers, maxsize=100000, policy="block")
+    pool.start()
+
+    frames = int(rate * args.duration)
+    t0 = time.perf_counter()
+    for i in range(frames):
+        # Open loop: frames arrive on schedule whether or not earlier ones finished
+        delay = t0 + i / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        pool.submit(time.perf_counter())
+
+    while pool.depth() or pool.processed < frames:
+        time.sleep(0.01)
+    for t in list(outstanding):
+        t.join()
+    elapsed = time.perf_counter() - t0
+    pool.stop()
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "rate_fps": rate,
+        "frames": len(latencies),
+        "throughput_fps": len(latencies) / elapsed,
+        "latency_ms_p50": statistics.median(latencies),
+        "latency_ms_p95": latencies[int(0.95 * (len(latencies) - 1))],
+        "latency_ms_mean": statistics.mean(latencies),
+        "scheduler": scheduler.stats(),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    ap.add_argument("--rate", type=float, nargs="+", default=[2.0, 8.0], help="offered frames/s")
+    ap.add_argument("--duration", type=float, default=15.0, help="seconds of arrivals per case")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--cloud-rtt-ms", type=float, default=800.0)
+    ap.add_argument("--rtt-sigma", type=float, default=0.3, help="log-normal spread of the RTT")
+    ap.add_argument("--send-ms", type=float, default=20.0, help="worker time per SQS send")
+    ap.add_argument("--gallery-size", type=int, default=1000)
+    ap.add_argument("--face-size", type=int, default=240)
+    ap.add_argument("--pretrained", default="vggface2", help="'vggface2', 'casia-webface' or 'none'")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    torch.set_grad_enabled(False)
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // args.workers))
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        weights = os.path.join(tmp, "weights.pt")
+        _synthetic_weights(weights, args.gallery_size)
+        recognizer = EdgeRecognizer(
+            weights,
+            image_size=args.face_size,
+            pretrained=None if args.pretrained == "none" else args.pretrained,
+        )
+
+    results = [
+        _run_case(mode, recognizer, args, rate, rng)
+        for rate in args.rate
+        for mode in args.modes
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
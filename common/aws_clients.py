@@ -0,0 +1,203 @@
+"""
+Shared boto3 clients: one per (service, region, pool size) per process,
+with the HTTP connection pool sized to the caller's concurrency, TCP
+keep-alive on, and the time calls wait for a pooled connection recorded.
+
+    import aws_clients
+    sqs = aws_clients.client("sqs", region_name=REGION, concurrency=POOL_WORKERS)
+    sqs.send_message(...)                      # same API as the boto3 client
+
+    s3 = aws_clients.async_client("s3")        # event-loop code
+    obj = await s3.get_object(Bucket=b, Key=k)
+    data = await s3.run(obj["Body"].read)
+
+Pool size is max(10, concurrency), or AWS_MAX_POOL_CONNECTIONS if set.
+botocore's pool doesn't block: past max_pool_connections urllib3 opens an
+extra connection and throws it away afterwards ("Connection pool is full,
+discarding connection"), paying a TCP + TLS handshake per overflowing call.
+Calls here take a slot first, so overflow shows up as "aws_pool_wait_ms"
+(histogram, per service) instead; "aws_pool_in_use" and "aws_pool_size"
+are gauges summed over the service's clients. Paginators and waiters call
+the underlying client directly and bypass the slots.
+
+Clients are cached at module level, so a Lambda container reuses them (and
+their kept-alive connections) across invocations. The cache is dropped
+when boto3.client changes, so aws_fakes.install() / uninstall() get fresh
+clients.
+
+The async facade runs calls on a dedicated thread pool of the same size as
+the connection pool, leaving the event loop (and its default executor)
+free; boto3 has no native asyncio transport.
+
+Environment:
+  AWS_MAX_POOL_CONNECTIONS  connections per client (default max(10, concurrency))
+  AWS_TCP_KEEPALIVE         0 turns keep-alive probes off (default 1)
+"""
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+DEFAULT_POOL = 10   # botocore's default max_pool_connections
+
+# Client attributes that don't issue a request (or manage their own)
+_UNPOOLED = frozenset({
+    "can_paginate", "close", "exceptions", "generate_presigned_post", "generate_presigned_url",
+    "get_paginator", "get_waiter", "meta", "waiter_names",
+})
+
+_lock = threading.Lock()
+_clients = {}
+_async_clients = {}
+_factory = None     # the boto3.client the cached clients came from
+
+
+def pool_size(concurrency: int = 0) -> int:
+    """Connections per client for `concurrency` threads issuing calls."""
+    override = int(os.environ.get("AWS_MAX_POOL_CONNECTIONS", "0") or 0)
+    return override if override > 0 else max(DEFAULT_POOL, concurrency)
+
+
+def make_config(size: int, retries: dict = None):
+    """botocore Config with the pool size, keep-alive and optional retry policy."""
+    from botocore.config import Config
+
+    kwargs = {"max_pool_connections": size}
+    if retries:
+        kwargs["retries"] = dict(retries)
+    if os.environ.get("AWS_TCP_KEEPALIVE", "1") != "0":
+        kwargs["tcp_keepalive"] = True
+    try:
+        return Config(**kwargs)
+    except TypeError:
+        # botocore < 1.27.84 has no tcp_keepalive; urllib3 still reuses connections
+        kwargs.pop("tcp_keepalive", None)
+        return Config(**kwargs)
+
+
+class PooledClient:
+    """A boto3 client whose calls take one of `size` connection slots."""
+
+    def __init__(self, client, service: str, size: int, reg: metrics.Registry = metrics.registry):
+        self._client = client
+        self.service = service
+        self.size = size
+        self._slots = threading.BoundedSemaphore(size)
+        self._count_lock = threading.Lock()
+        self.in_use = 0
+        self._wait_ms = reg.histogram("aws_pool_wait_ms", "time AWS calls waited for a pooled connection")
+
+    @property
+    def raw(self):
+        """The underlying boto3 client."""
+        return self._client
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name in _UNPOOLED or name.startswith("_") or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            return self._invoke(attr, args, kwargs, time.perf_counter())
+
+        # Cache the wrapper: later lookups skip __getattr__
+        self.__dict__[name] = call
+        return call
+
+    def _invoke(self, method, args, kwargs, queued_at: float):
+        self._slots.acquire()
+        self._wait_ms.observe((time.perf_counter() - queued_at) * 1000.0, service=self.service)
+        with self._count_lock:
+            self.in_use += 1
+        try:
+            return method(*args, **kwargs)
+        finally:
+            with self._count_lock:
+                self.in_use -= 1
+            self._slots.release()
+
+
+class AsyncClient:
+    """
+    Awaitable facade over a PooledClient: `await c.put_object(...)` runs the
+    call on a dedicated pool of `size` threads. Time queued there counts as
+    pool wait, since its workers are the connection slots.
+    """
+
+    def __init__(self, pooled: PooledClient):
+        self._pooled = pooled
+        self.service = pooled.service
+        self._executor = ThreadPoolExecutor(max_workers=pooled.size, thread_name_prefix=f"aws-{pooled.service}")
+
+    async def run(self, fn, *args, **kwargs):
+        """Run any other blocking step (e.g. a StreamingBody read) on this client's threads."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    def __getattr__(self, name):
+        attr = getattr(self._pooled.raw, name)
+        if name in _UNPOOLED or name.startswith("_") or not callable(attr):
+            return attr
+        pooled = self._pooled
+
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            task = functools.partial(pooled._invoke, attr, args, kwargs, time.perf_counter())
+            return await loop.run_in_executor(self._executor, task)
+
+        call.__name__ = name
+        self.__dict__[name] = call
+        return call
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+def _service_total(service: str, attr: str) -> int:
+    with _lock:
+        return sum(getattr(c, attr) for c in _clients.values() if c.service == service)
+
+
+def client(service: str, region_name: str = None, concurrency: int = 0, retries: dict = None,
+           reg: metrics.Registry = metrics.registry) -> PooledClient:
+    """
+    The process-wide client for `service`, with a pool for `concurrency`
+    threads. Thread-safe; repeated calls return the same client.
+    """
+    global _factory
+    import boto3
+
+    size = pool_size(concurrency)
+    key = (service, region_name, size, tuple(sorted((retries or {}).items())))
+    with _lock:
+        if boto3.client is not _factory:
+            _clients.clear()
+            _async_clients.clear()
+            _factory = boto3.client
+        c = _clients.get(key)
+        if c is not None:
+            return c
+        raw = boto3.client(service, region_name=region_name, config=make_config(size, retries))
+        c = _clients[key] = PooledClient(raw, service, size, reg)
+    reg.gauge("aws_pool_size", "pooled connections per service").set_function(
+        lambda: _service_total(service, "size"), service=service
+    )
+    reg.gauge("aws_pool_in_use", "AWS calls holding a pooled connection").set_function(
+        lambda: _service_total(service, "in_use"), service=service
+    )
+    return c
+
+
+def async_client(service: str, region_name: str = None, concurrency: int = 0, retries: dict = None) -> AsyncClient:
+    """Awaitable facade over client(...); one per underlying client."""
+    pooled = client(service, region_name, concurrency, retries)
+    with _lock:
+        a = _async_clients.get(id(pooled))
+        if a is None or a._pooled is not pooled:
+            a = _async_clients[id(pooled)] = AsyncClient(pooled)
+        return a
@@ -0,0 +1,947 @@
+"""
+In-process stand-ins for the AWS services the pipelines use - S3, SimpleDB,
+SQS and EC2 - plus an SQS-triggered Lambda runner and the Greengrass IPC
+client, so every component can run end to end on one machine
+(tools/local_pipeline.py wires them up).
+
+    fake = FakeAws(latency_ms={"sqs": 5, "s3": 20})
+    fake.install()            # boto3.client() / boto3.Session() now return fakes
+    import server             # module-level clients talk to `fake`
+    ...
+    fake.uninstall()
+
+Only the calls and response fields the components use are implemented.
+Errors are botocore ClientErrors with the real error codes, also exposed on
+`client.exceptions` as boto3 does (s3.exceptions.NoSuchKey, ...). SQS keeps
+visibility timeouts, receipt handles, receive counts, long polling and the
+size / batch limits; EC2 instances pass through pending and stopping on a
+timer. Every call sleeps the injected latency (per service, or per
+"service.operation") outside the service lock, so concurrency behaves like a
+remote endpoint.
+
+A client created with `instance_id=` belongs to code "running on" that fake
+EC2 instance: once the instance leaves the running state its next call
+raises InstanceStopped, a BaseException that unwinds the caller's
+`except Exception` loops the way a shutdown would.
+"""
+import fnmatch
+import hashlib
+import itertools
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from botocore.exceptions import ClientError
+
+DEFAULT_REGION = "us-east-1"
+ACCOUNT_ID = "000000000000"
+
+# SQS limits
+MAX_MESSAGE_BYTES = 256 * 1024
+MAX_BATCH_ENTRIES = 10
+MAX_RECEIVE = 10
+
+# Long polls re-check the host instance at least this often
+_POLL_SLICE_SECS = 0.25
+
+_EC2_STATE_CODES = {"pending": 0, "running": 16, "stopping": 64, "stopped": 80}
+
+
+class InstanceStopped(BaseException):
+    """The fake EC2 instance this client belongs to is no longer running."""
+
+
+# ---------- errors ----------
+
+_ERROR_CLASSES = {}
+
+
+def _error_class(code: str):
+    cls = _ERROR_CLASSES.get(code)
+    if cls is None:
+        name = code.split(".")[-1] if not code.isdigit() else f"Http{code}"
+        cls = _ERROR_CLASSES[code] = type(name, (ClientError,), {})
+    return cls
+
+
+def _error(code: str, message: str, operation: str, status: int = 400):
+    return _error_class(code)(
+        {
+            "Error": {"Code": code, "Message": message},
+            "ResponseMetadata": {"HTTPStatusCode": status},
+        },
+        operation,
+    )
+
+
+class _Exceptions:
+    """client.exceptions: ClientError subclasses by short name."""
+
+    def __init__(self, codes):
+        self.ClientError = ClientError
+        for code in codes:
+            cls = _error_class(code)
+            setattr(self, cls.__name__, cls)
+
+
+# ---------- service state ----------
+
+class _Queue:
+    def __init__(self, name, url, attrs):
+        self.name = name
+        self.url = url
+        self.attrs = {
+            "VisibilityTimeout": "30",
+            "ReceiveMessageWaitTimeSeconds": "0",
+            "MaximumMessageSize": str(MAX_MESSAGE_BYTES),
+            "MessageRetentionPeriod": "345600",
+            "DelaySeconds": "0",
+            **(attrs or {}),
+        }
+        self.created = time.time()
+        self.messages = {}        # message id -> _Message, in send order
+        self.receipts = {}        # receipt handle -> message id
+        self.cond = threading.Condition()
+
+
+class _Message:
+    __slots__ = ("id", "body", "attrs", "sent", "visible_at", "receipt", "receive_count", "first_receive")
+
+    def __init__(self, body, attrs, sent, visible_at):
+        self.id = str(uuid.uuid4())
+        self.body = body
+        self.attrs = attrs or {}
+        self.sent = sent
+        self.visible_at = visible_at
+        self.receipt = None
+        self.receive_count = 0
+        self.first_receive = None
+
+
+class _Instance:
+    __slots__ = ("id", "state", "tags", "transition")
+
+    def __init__(self, instance_id, state, tags):
+        self.id = instance_id
+        self.state = state
+        self.tags = tags
+        self.transition = None    # pending threading.Timer
+
+
+class _Body:
+    """get_object()["Body"]: the read() side of botocore's StreamingBody."""
+
+    def __init__(self, data: bytes):
+        self._data = data
+        self._pos = 0
+
+    def read(self, amt=None):
+        end = len(self._data) if amt is None else min(len(self._data), self._pos + amt)
+        chunk = self._data[self._pos:end]
+        self._pos = end
+        return chunk
+
+    def iter_chunks(self, chunk_size=1024 * 1024):
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        pass
+
+
+def _as_bytes(body) -> bytes:
+    if body is None:
+        return b""
+    if isinstance(body, str):
+        return body.encode("utf-8")
+    if hasattr(body, "read"):
+        data = body.read()
+        return data.encode("utf-8") if isinstance(data, str) else bytes(data)
+    return bytes(body)
+
+
+class FakeAws:
+    def __init__(self, region: str = DEFAULT_REGION, latency_ms=0.0, jitter: float = 0.0,
+                 ec2_boot_secs: float = 1.0, ec2_stop_secs: float = 0.5, seed=None):
+        """
+        latency_ms: added to every call - a number, or a dict keyed by
+        service ("sqs") or "service.operation" ("sqs.receive_message");
+        jitter: +- fraction of that latency, uniformly distributed.
+        """
+        self.region = region
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.ec2_boot_secs = ec2_boot_secs
+        self.ec2_stop_secs = ec2_stop_secs
+        self._rng = random.Random(seed)
+
+        self._lock = threading.Lock()          # S3 / SDB / EC2 / queue table
+        self.buckets = {}                      # name -> {key: (bytes, etag, metadata)}
+        self.domains = {}                      # name -> {item: {attr: [values]}}
+        self.queues = {}                       # name -> _Queue
+        self.instances = {}                    # id -> _Instance
+        self._instance_ids = itertools.count(1)
+        self._listeners = []
+
+        # (service, operation) -> calls, for the harness's per-request accounting
+        self.calls = Counter()
+        self._saved = None
+
+    # ---------- boto3 patching ----------
+
+    def client(self, service_name: str, region_name=None, instance_id=None, **_):
+        cls = _CLIENTS.get(service_name)
+        if cls is None:
+            raise ValueError(f"no fake for AWS service {service_name!r}")
+        return cls(self, region_name or self.region, instance_id)
+
+    def session(self, region_name=None, **_):
+        return FakeSession(self, region_name)
+
+    def install(self) -> None:
+        """Make boto3.client() and boto3.Session() return clients of this fake."""
+        import boto3
+
+        if self._saved is None:
+            self._saved = (boto3.client, boto3.Session)
+        boto3.client = lambda service_name, *args, **kwargs: self.client(
+            service_name, region_name=kwargs.get("region_name")
+        )
+        boto3.Session = self.session
+
+    def uninstall(self) -> None:
+        import boto3
+
+        if self._saved is not None:
+            boto3.client, boto3.Session = self._saved
+            self._saved = None
+
+    # ---------- latency / accounting ----------
+
+    def _call(self, service: str, operation: str) -> None:
+        self.calls[(service, operation)] += 1
+        lat = self.latency_ms
+        if isinstance(lat, dict):
+            lat = lat.get(f"{service}.{operation}", lat.get(service, 0.0))
+        if lat:
+            if self.jitter:
+                lat *= 1.0 + self._rng.uniform(-self.jitter, self.jitter)
+            time.sleep(max(0.0, lat) / 1000.0)
+
+    # ---------- SQS helpers ----------
+
+    def queue_url(self, name: str) -> str:
+        return f"https://sqs.{self.region}.amazonaws.com/{ACCOUNT_ID}/{name}"
+
+    def create_queue(self, name: str, attrs=None) -> str:
+        """Create (or return) a queue directly, without a client call."""
+        with self._lock:
+            q = self.queues.get(name)
+            if q is None:
+                q = self.queues[name] = _Queue(name, self.queue_url(name), attrs)
+            return q.url
+
+    def _queue(self, url: str, operation: str) -> _Queue:
+        # Any URL ending in the queue name resolves, whatever account/region it names
+        name = str(url).rstrip("/").rsplit("/", 1)[-1]
+        with self._lock:
+            q = self.queues.get(name)
+        if q is None:
+            raise _error(
+                "AWS.SimpleQueueService.NonExistentQueue",
+                "The specified queue does not exist.", operation,
+            )
+        return q
+
+    # ---------- EC2 helpers ----------
+
+    def add_instances(self, count: int, name_prefix: str = "instance-", state: str = "stopped"):
+        """Create `count` instances tagged Name=<name_prefix><n>; returns their ids."""
+        ids = []
+        with self._lock:
+            for _ in range(count):
+                n = next(self._instance_ids)
+                iid = f"i-{n:017x}"
+                self.instances[iid] = _Instance(iid, state, [{"Key": "Name", "Value": f"{name_prefix}{n}"}])
+                ids.append(iid)
+        return ids
+
+    def on_instance_state(self, callback) -> None:
+        """callback(instance_id, state) after every state change (on a timer thread for timed ones)."""
+        self._listeners.append(callback)
+
+    def instance_state(self, instance_id: str):
+        with self._lock:
+            inst = self.instances.get(instance_id)
+            return inst.state if inst is not None else None
+
+    def _set_state(self, inst: _Instance, state: str, after_secs: float = 0.0, then: str = None) -> None:
+        """Called with _lock held. Moves to `state`, and to `then` after `after_secs`."""
+        if inst.transition is not None:
+            inst.transition.cancel()
+            inst.transition = None
+        inst.state = state
+        self._notify(inst.id, state)
+        if then is not None:
+            def finish():
+                with self._lock:
+                    if inst.state != state:
+                        return
+                    inst.transition = None
+                    inst.state = then
+                self._notify(inst.id, then)
+
+            inst.transition = threading.Timer(after_secs, finish)
+            inst.transition.daemon = True
+            inst.transition.start()
+
+    def _notify(self, instance_id: str, state: str) -> None:
+        for cb in list(self._listeners):
+            # Listeners may call back into the fake, so never under _lock
+            threading.Thread(target=cb, args=(instance_id, state), daemon=True).start()
+
+    def stats(self) -> dict:
+        """Queue depths, instance states and API call counts."""
+        with self._lock:
+            queues = list(self.queues.values())
+            states = Counter(i.state for i in self.instances.values())
+        out = {"queues": {}, "instances": dict(states), "calls": {}}
+        now = time.time()
+        for q in queues:
+            with q.cond:
+                visible = sum(1 for m in q.messages.values() if m.visible_at <= now)
+                out["queues"][q.name] = {"visible": visible, "in_flight": len(q.messages) - visible}
+        for (service, op), n in sorted(self.calls.items()):
+            out["calls"][f"{service}.{op}"] = n
+        return out
+
+
+class FakeSession:
+    """boto3.Session replacement handing out FakeAws clients."""
+
+    def __init__(self, aws: FakeAws, region_name=None):
+        self._aws = aws
+        self.region_name = region_name or aws.region
+
+    def client(self, service_name, region_name=None, **kwargs):
+        return self._aws.client(service_name, region_name=region_name or self.region_name)
+
+
+# ---------- clients ----------
+
+class _FakeClient:
+    service = ""
+    error_codes = ()
+
+    def __init__(self, aws: FakeAws, region: str, instance_id=None):
+        self._aws = aws
+        self._instance_id = instance_id
+        self.exceptions = _Exceptions(self.error_codes)
+        self.meta = type("ClientMeta", (), {"region_name": region, "service_name": self.service})()
+
+    def _call(self, operation: str) -> None:
+        self._check_host()
+        self._aws._call(self.service, operation)
+        self._check_host()
+
+    def _check_host(self) -> None:
+        if self._instance_id is not None and self._aws.instance_state(self._instance_id) != "running":
+            raise InstanceStopped(self._instance_id)
+
+
+class FakeS3(_FakeClient):
+    service = "s3"
+    error_codes = ("NoSuchBucket", "NoSuchKey", "BucketAlreadyOwnedByYou", "404")
+
+    def _bucket(self, name, operation):
+        bucket = self._aws.buckets.get(name)
+        if bucket is None:
+            raise _error("NoSuchBucket", "The specified bucket does not exist", operation, 404)
+        return bucket
+
+    def create_bucket(self, Bucket, **_):
+        self._call("create_bucket")
+        with self._aws._lock:
+            self._aws.buckets.setdefault(Bucket, {})
+        return {"Location": f"/{Bucket}"}
+
+    def head_bucket(self, Bucket, **_):
+        self._call("head_bucket")
+        with self._aws._lock:
+            if Bucket not in self._aws.buckets:
+                raise _error("404", "Not Found", "HeadBucket", 404)
+        return {}
+
+    def put_object(self, Bucket, Key, Body=b"", Metadata=None, **_):
+        data = _as_bytes(Body)
+        self._call("put_object")
+        etag = '"' + hashlib.md5(data).hexdigest() + '"'
+        with self._aws._lock:
+            self._bucket(Bucket, "PutObject")[Key] = (data, etag, dict(Metadata or {}))
+        return {"ETag": etag}
+
+    def _object(self, Bucket, Key, operation):
+        with self._aws._lock:
+            obj = self._bucket(Bucket, operation).get(Key)
+        if obj is None:
+            raise _error("NoSuchKey", "The specified key does not exist.", operation, 404)
+        return obj
+
+    def get_object(self, Bucket, Key, **_):
+        self._call("get_object")
+        data, etag, meta = self._object(Bucket, Key, "GetObject")
+        return {"Body": _Body(data), "ContentLength": len(data), "ETag": etag, "Metadata": meta}
+
+    def head_object(self, Bucket, Key, **_):
+        self._call("head_object")
+        with self._aws._lock:
+            obj = self._bucket(Bucket, "HeadObject").get(Key)
+        if obj is None:
+            raise _error("404", "Not Found", "HeadObject", 404)
+        return {"ContentLength": len(obj[0]), "ETag": obj[1], "Metadata": obj[2]}
+
+    def delete_object(self, Bucket, Key, **_):
+        self._call("delete_object")
+        with self._aws._lock:
+            self._bucket(Bucket, "DeleteObject").pop(Key, None)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix="", MaxKeys=1000, ContinuationToken=None, StartAfter="", **_):
+        self._call("list_objects_v2")
+        with self._aws._lock:
+            keys = sorted(k for k in self._bucket(Bucket, "ListObjectsV2") if k.startswith(Prefix))
+            objs = {k: self._aws.buckets[Bucket][k] for k in keys}
+        after = ContinuationToken or StartAfter
+        keys = [k for k in keys if k > after] if after else keys
+        page = keys[:MaxKeys]
+        out = {
+            "KeyCount": len(page),
+            "IsTruncated": len(keys) > len(page),
+            "Contents": [{"Key": k, "Size": len(objs[k][0]), "ETag": objs[k][1]} for k in page],
+        }
+        if out["IsTruncated"]:
+            out["NextContinuationToken"] = page[-1]
+        if not page:
+            del out["Contents"]
+        return out
+
+
+class FakeSdb(_FakeClient):
+    service = "sdb"
+    error_codes = ("NoSuchDomain",)
+
+    def _domain(self, name, operation):
+        domain = self._aws.domains.get(name)
+        if domain is None:
+            raise _error("NoSuchDomain", "The specified domain does not exist.", operation)
+        return domain
+
+    def create_domain(self, DomainName, **_):
+        self._call("create_domain")
+        with self._aws._lock:
+            self._aws.domains.setdefault(DomainName, {})
+        return {}
+
+    def list_domains(self, **_):
+        self._call("list_domains")
+        with self._aws._lock:
+            return {"DomainNames": sorted(self._aws.domains)}
+
+    @staticmethod
+    def _put(item, attrs):
+        for a in attrs:
+            if a.get("Replace"):
+                item[a["Name"]] = []
+        for a in attrs:
+            values = item.setdefault(a["Name"], [])
+            if a["Value"] not in values:
+                values.append(a["Value"])
+
+    def put_attributes(self, DomainName, ItemName, Attributes, **_):
+        self._call("put_attributes")
+        with self._aws._lock:
+            self._put(self._domain(DomainName, "PutAttributes").setdefault(ItemName, {}), Attributes)
+        return {}
+
+    def batch_put_attributes(self, DomainName, Items, **_):
+        self._call("batch_put_attributes")
+        with self._aws._lock:
+            domain = self._domain(DomainName, "BatchPutAttributes")
+            for it in Items:
+                self._put(domain.setdefault(it["Name"], {}), it["Attributes"])
+        return {}
+
+    def get_attributes(self, DomainName, ItemName, AttributeNames=None, **_):
+        self._call("get_attributes")
+        with self._aws._lock:
+            item = dict(self._domain(DomainName, "GetAttributes").get(ItemName, {}))
+        attrs = [
+            {"Name": name, "Value": v}
+            for name, values in item.items()
+            if not AttributeNames or name in AttributeNames
+            for v in values
+        ]
+        return {"Attributes": attrs} if attrs else {}
+
+    def delete_attributes(self, DomainName, ItemName, Attributes=None, **_):
+        self._call("delete_attributes")
+        with self._aws._lock:
+            domain = self._domain(DomainName, "DeleteAttributes")
+            if not Attributes:
+                domain.pop(ItemName, None)
+            else:
+                item = domain.get(ItemName, {})
+                for a in Attributes:
+                    if "Value" in a and a["Value"] in item.get(a["Name"], []):
+                        item[a["Name"]].remove(a["Value"])
+                    else:
+                        item.pop(a["Name"], None)
+        return {}
+
+
+class FakeSqs(_FakeClient):
+    service = "sqs"
+    error_codes = (
+        "AWS.SimpleQueueService.NonExistentQueue",
+        "QueueAlreadyExists",
+        "ReceiptHandleIsInvalid",
+        "InvalidParameterValue",
+        "AWS.SimpleQueueService.TooManyEntriesInBatchRequest",
+        "AWS.SimpleQueueService.BatchRequestTooLong",
+        "AWS.SimpleQueueService.BatchEntryIdsNotDistinct",
+        "AWS.SimpleQueueService.EmptyBatchRequest",
+    )
+
+    def __init__(self, aws, region, instance_id=None):
+        super().__init__(aws, region, instance_id)
+        # boto3 exposes the non-existent-queue error under this name
+        self.exceptions.QueueDoesNotExist = _error_class("AWS.SimpleQueueService.NonExistentQueue")
+
+    # ---------- queues ----------
+
+    def create_queue(self, QueueName, Attributes=None, **_):
+        self._call("create_queue")
+        with self._aws._lock:
+            q = self._aws.queues.get(QueueName)
+            if q is None:
+                q = self._aws.queues[QueueName] = _Queue(QueueName, self._aws.queue_url(QueueName), Attributes)
+            elif Attributes and any(q.attrs.get(k) != str(v) for k, v in Attributes.items()):
+                raise _error(
+                    "QueueAlreadyExists",
+                    "A queue already exists with the same name and a different value for attribute(s)",
+                    "CreateQueue",
+                )
+            return {"QueueUrl": q.url}
+
+    def get_queue_url(self, QueueName, **_):
+        self._call("get_queue_url")
+        return {"QueueUrl": self._aws._queue(QueueName, "GetQueueUrl").url}
+
+    def set_queue_attributes(self, QueueUrl, Attributes, **_):
+        self._call("set_queue_attributes")
+        q = self._aws._queue(QueueUrl, "SetQueueAttributes")
+        with q.cond:
+            q.attrs.update({k: str(v) for k, v in Attributes.items()})
+        return {}
+
+    def get_queue_attributes(self, QueueUrl, AttributeNames=("All",), **_):
+        self._call("get_queue_attributes")
+        q = self._aws._queue(QueueUrl, "GetQueueAttributes")
+        now = time.time()
+        with q.cond:
+            visible = sum(1 for m in q.messages.values() if m.visible_at <= now)
+            attrs = {
+                **q.attrs,
+                "ApproximateNumberOfMessages": str(visible),
+                "ApproximateNumberOfMessagesNotVisible": str(len(q.messages) - visible),
+                "ApproximateNumberOfMessagesDelayed": "0",
+                "CreatedTimestamp": str(int(q.created)),
+                "QueueArn": f"arn:aws:sqs:{self._aws.region}:{ACCOUNT_ID}:{q.name}",
+            }
+        if "All" not in AttributeNames:
+            attrs = {k: v for k, v in attrs.items() if k in AttributeNames}
+        return {"Attributes": attrs}
+
+    def purge_queue(self, QueueUrl, **_):
+        self._call("purge_queue")
+        q = self._aws._queue(QueueUrl, "PurgeQueue")
+        with q.cond:
+            q.messages.clear()
+            q.receipts.clear()
+        return {}
+
+    # ---------- messages ----------
+
+    def _enqueue(self, q: _Queue, body, attrs, delay, operation):
+        if not isinstance(body, str) or not body:
+            raise _error("InvalidParameterValue", "The message body must be a non-empty string.", operation)
+        limit = int(q.attrs.get("MaximumMessageSize", MAX_MESSAGE_BYTES))
+        if len(body.encode("utf-8")) > limit:
+            raise _error(
+                "InvalidParameterValue",
+                f"One or more parameters are invalid. Reason: Message must be shorter than {limit} bytes.",
+                operation,
+            )
+        now = time.time()
+        if delay is None:
+            delay = int(q.attrs.get("DelaySeconds", "0"))
+        m = _Message(body, attrs, now, now + delay)
+        with q.cond:
+            q.messages[m.id] = m
+            q.cond.notify_all()
+        return m
+
+    @staticmethod
+    def _send_result(m: _Message) -> dict:
+        return {"MessageId": m.id, "MD5OfMessageBody": hashlib.md5(m.body.encode("utf-8")).hexdigest()}
+
+    def send_message(self, QueueUrl, MessageBody, MessageAttributes=None, DelaySeconds=None, **_):
+        self._call("send_message")
+        q = self._aws._queue(QueueUrl, "SendMessage")
+        return self._send_result(self._enqueue(q, MessageBody, MessageAttributes, DelaySeconds, "SendMessage"))
+
+    def _check_batch(self, entries, operation, size_of=None):
+        if not entries:
+            raise _error("AWS.SimpleQueueService.EmptyBatchRequest", "There should be at least one entry.", operation)
+        if len(entries) > MAX_BATCH_ENTRIES:
+            raise _error(
+                "AWS.SimpleQueueService.TooManyEntriesInBatchRequest",
+                f"Maximum number of entries per request are {MAX_BATCH_ENTRIES}.", operation,
+            )
+        if len({e["Id"] for e in entries}) != len(entries):
+            raise _error("AWS.SimpleQueueService.BatchEntryIdsNotDistinct", "Batch entry ids must be distinct.", operation)
+        if size_of is not None and sum(size_of(e) for e in entries) > MAX_MESSAGE_BYTES:
+            raise _error(
+                "AWS.SimpleQueueService.BatchRequestTooLong",
+                f"Batch requests cannot be longer than {MAX_MESSAGE_BYTES} bytes.", operation,
+            )
+
+    def send_message_batch(self, QueueUrl, Entries, **_):
+        self._call("send_message_batch")
+        q = self._aws._queue(QueueUrl, "SendMessageBatch")
+        self._check_batch(Entries, "SendMessageBatch", lambda e: len(str(e.get("MessageBody", "")).encode("utf-8")))
+        ok, failed = [], []
+        for e in Entries:
+            try:
+                m = self._enqueue(q, e.get("MessageBody"), e.get("MessageAttributes"), e.get("DelaySeconds"),
+                                  "SendMessageBatch")
+            except ClientError as err:
+                failed.append({
+                    "Id": e["Id"], "SenderFault": True,
+                    "Code": err.response["Error"]["Code"], "Message": err.response["Error"]["Message"],
+                })
+                continue
+            ok.append({"Id": e["Id"], **self._send_result(m)})
+        out = {"Successful": ok}
+        if failed:
+            out["Failed"] = failed
+        return out
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=None, VisibilityTimeout=None,
+                        AttributeNames=(), MessageAttributeNames=(), MessageSystemAttributeNames=(), **_):
+        self._call("receive_message")
+        q = self._aws._queue(QueueUrl, "ReceiveMessage")
+        if not 1 <= MaxNumberOfMessages <= MAX_RECEIVE:
+            raise _error("InvalidParameterValue", "MaxNumberOfMessages must be between 1 and 10.", "ReceiveMessage")
+        with q.cond:
+            wait = float(q.attrs.get("ReceiveMessageWaitTimeSeconds", "0") if WaitTimeSeconds is None
+                         else WaitTimeSeconds)
+            vis = int(q.attrs.get("VisibilityTimeout", "30") if VisibilityTimeout is None else VisibilityTimeout)
+        deadline = time.time() + wait
+        want_attrs = set(AttributeNames) | set(MessageSystemAttributeNames)
+
+        while True:
+            with q.cond:
+                now = time.time()
+                ready = [m for m in q.messages.values() if m.visible_at <= now][:MaxNumberOfMessages]
+                if ready or now >= deadline:
+                    return self._deliver(q, ready, vis, now, want_attrs, MessageAttributeNames)
+                # Sleep until a send, the next visibility expiry or the deadline
+                next_visible = min((m.visible_at for m in q.messages.values()), default=deadline)
+                q.cond.wait(max(0.0, min(deadline, next_visible, now + _POLL_SLICE_SECS) - now))
+            self._check_host()
+
+    @staticmethod
+    def _deliver(q, ready, vis, now, want_attrs, want_msg_attrs):
+        out = []
+        for m in ready:
+            if m.receipt is not None:
+                q.receipts.pop(m.receipt, None)
+            m.receipt = f"{m.id}#{uuid.uuid4().hex}"
+            q.receipts[m.receipt] = m.id
+            m.receive_count += 1
+            if m.first_receive is None:
+                m.first_receive = now
+            m.visible_at = now + vis
+            msg = {
+                "MessageId": m.id,
+                "ReceiptHandle": m.receipt,
+                "MD5OfBody": hashlib.md5(m.body.encode("utf-8")).hexdigest(),
+                "Body": m.body,
+            }
+            if want_attrs:
+                attrs = {
+                    "ApproximateReceiveCount": str(m.receive_count),
+                    "SentTimestamp": str(int(m.sent * 1000)),
+                    "ApproximateFirstReceiveTimestamp": str(int(m.first_receive * 1000)),
+                }
+                if "All" not in want_attrs:
+                    attrs = {k: v for k, v in attrs.items() if k in want_attrs}
+                msg["Attributes"] = attrs
+            if want_msg_attrs and m.attrs:
+                msg["MessageAttributes"] = (
+                    dict(m.attrs) if "All" in want_msg_attrs or ".*" in want_msg_attrs
+                    else {k: v for k, v in m.attrs.items() if k in want_msg_attrs}
+                )
+            out.append(msg)
+        return {"Messages": out} if out else {}
+
+    def _by_receipt(self, q, receipt, operation):
+        """Message for `receipt` (called under q.cond); None for a superseded handle."""
+        mid = q.receipts.get(receipt)
+        if mid is None:
+            if not isinstance(receipt, str) or "#" not in receipt:
+                raise _error("ReceiptHandleIsInvalid", f"The input receipt handle \"{receipt}\" is not valid.",
+                             operation)
+            return None
+        return q.messages.get(mid)
+
+    def delete_message(self, QueueUrl, ReceiptHandle, **_):
+        self._call("delete_message")
+        q = self._aws._queue(QueueUrl, "DeleteMessage")
+        with q.cond:
+            m = self._by_receipt(q, ReceiptHandle, "DeleteMessage")
+            if m is not None:
+                del q.messages[m.id]
+                q.receipts.pop(ReceiptHandle, None)
+        return {}
+
+    def delete_message_batch(self, QueueUrl, Entries, **_):
+        self._call("delete_message_batch")
+        q = self._aws._queue(QueueUrl, "DeleteMessageBatch")
+        self._check_batch(Entries, "DeleteMessageBatch")
+        ok, failed = [], []
+        with q.cond:
+            for e in Entries:
+                try:
+                    m = self._by_receipt(q, e["ReceiptHandle"], "DeleteMessageBatch")
+                except ClientError as err:
+                    failed.append({"Id": e["Id"], "SenderFault": True, "Code": err.response["Error"]["Code"],
+                                   "Message": err.response["Error"]["Message"]})
+                    continue
+                if m is not None:
+                    del q.messages[m.id]
+                    q.receipts.pop(e["ReceiptHandle"], None)
+                ok.append({"Id": e["Id"]})
+        out = {"Successful": ok}
+        if failed:
+            out["Failed"] = failed
+        return out
+
+    def change_message_visibility(self, QueueUrl, ReceiptHandle, VisibilityTimeout, **_):
+        self._call("change_message_visibility")
+        q = self._aws._queue(QueueUrl, "ChangeMessageVisibility")
+        with q.cond:
+            m = self._by_receipt(q, ReceiptHandle, "ChangeMessageVisibility")
+            if m is not None:
+                m.visible_at = time.time() + int(VisibilityTimeout)
+                q.cond.notify_all()
+        return {}
+
+
+class FakeEc2(_FakeClient):
+    service = "ec2"
+    error_codes = ("InvalidInstanceID.NotFound", "IncorrectInstanceState")
+
+    def _instances(self, ids, operation):
+        missing = [i for i in ids if i not in self._aws.instances]
+        if missing:
+            raise _error("InvalidInstanceID.NotFound", f"The instance IDs '{', '.join(missing)}' do not exist",
+                         operation)
+        return [self._aws.instances[i] for i in ids]
+
+    @staticmethod
+    def _matches(inst, filters) -> bool:
+        for f in filters or []:
+            name, values = f["Name"], f["Values"]
+            if name == "instance-state-name":
+                actual = [inst.state]
+            elif name == "instance-id":
+                actual = [inst.id]
+            elif name.startswith("tag:"):
+                actual = [t["Value"] for t in inst.tags if t["Key"] == name[4:]]
+            else:
+                raise _error("InvalidParameterValue", f"The filter '{name}' is invalid", "DescribeInstances")
+            if not any(fnmatch.fnmatchcase(a, v) for a in actual for v in values):
+                return False
+        return True
+
+    @staticmethod
+    def _state(state: str) -> dict:
+        return {"Code": _EC2_STATE_CODES[state], "Name": state}
+
+    def describe_instances(self, Filters=None, InstanceIds=None, **_):
+        self._call("describe_instances")
+        with self._aws._lock:
+            insts = self._instances(InstanceIds, "DescribeInstances") if InstanceIds else list(
+                self._aws.instances.values())
+            found = [
+                {"InstanceId": i.id, "State": self._state(i.state), "Tags": list(i.tags)}
+                for i in insts if self._matches(i, Filters)
+            ]
+        return {"Reservations": [{"Instances": found}] if found else []}
+
+    def start_instances(self, InstanceIds, **_):
+        self._call("start_instances")
+        out = []
+        with self._aws._lock:
+            for inst in self._instances(InstanceIds, "StartInstances"):
+                prev = inst.state
+                if prev == "stopped":
+                    self._aws._set_state(inst, "pending", self._aws.ec2_boot_secs, "running")
+                elif prev == "stopping":
+                    raise _error("IncorrectInstanceState",
+                                 f"The instance '{inst.id}' is not in a state from which it can be started.",
+                                 "StartInstances")
+                out.append({"InstanceId": inst.id, "PreviousState": self._state(prev),
+                            "CurrentState": self._state(inst.state)})
+        return {"StartingInstances": out}
+
+    def stop_instances(self, InstanceIds, **_):
+        self._call("stop_instances")
+        out = []
+        with self._aws._lock:
+            for inst in self._instances(InstanceIds, "StopInstances"):
+                prev = inst.state
+                if prev in ("pending", "running"):
+                    self._aws._set_state(inst, "stopping", self._aws.ec2_stop_secs, "stopped")
+                out.append({"InstanceId": inst.id, "PreviousState": self._state(prev),
+                            "CurrentState": self._state(inst.state)})
+        return {"StoppingInstances": out}
+
+
+_CLIENTS = {"s3": FakeS3, "sdb": FakeSdb, "sqs": FakeSqs, "ec2": FakeEc2}
+
+
+# ---------- Lambda ----------
+
+class LambdaContext:
+    """The parts of the Lambda context object handlers read."""
+
+    def __init__(self, function_name: str, timeout_secs: float, memory_mb: int = 3008):
+        self.function_name = function_name
+        self.memory_limit_in_mb = memory_mb
+        self.aws_request_id = str(uuid.uuid4())
+        self.invoked_function_arn = f"arn:aws:lambda:{DEFAULT_REGION}:{ACCOUNT_ID}:function:{function_name}"
+        self._deadline = time.monotonic() + timeout_secs
+
+    def get_remaining_time_in_millis(self) -> int:
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+class SqsLambdaTrigger:
+    """
+    SQS event source mapping for a handler: `concurrency` pollers each
+    receive up to `batch_size` messages, invoke
+    handler({"Records": [...]}, context) and delete the batch when it
+    returns (minus any reported batchItemFailures). A raising handler leaves
+    its messages to reappear after the visibility timeout, as on AWS.
+    """
+
+    def __init__(self, aws: FakeAws, queue_url: str, handler, batch_size: int = 10,
+                 concurrency: int = 1, function_name: str = "handler", timeout_secs: float = 60.0):
+        self._sqs = aws.client("sqs")
+        self._aws = aws
+        self.queue_url = queue_url
+        self.handler = handler
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.function_name = function_name
+        self.timeout_secs = timeout_secs
+        self._running = False
+        self._threads = []
+        self.invocations = 0
+        self.errors = 0
+
+    def start(self) -> None:
+        self._running = True
+        for i in range(self.concurrency):
+            t = threading.Thread(target=self._poll, name=f"{self.function_name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._running = False
+        for t in self._threads:
+            t.join(timeout)
+
+    def _poll(self) -> None:
+        arn = f"arn:aws:sqs:{self._aws.region}:{ACCOUNT_ID}:{self.queue_url.rsplit('/', 1)[-1]}"
+        while self._running:
+            resp = self._sqs.receive_message(
+                QueueUrl=self.queue_url, MaxNumberOfMessages=self.batch_size, WaitTimeSeconds=1,
+                VisibilityTimeout=int(self.timeout_secs), AttributeNames=["All"],
+            )
+            msgs = resp.get("Messages", [])
+            if not msgs:
+                continue
+            event = {"Records": [
+                {
+                    "messageId": m["MessageId"],
+                    "receiptHandle": m["ReceiptHandle"],
+                    "body": m["Body"],
+                    "attributes": m.get("Attributes", {}),
+                    "md5OfBody": m["MD5OfBody"],
+                    "eventSource": "aws:sqs",
+                    "eventSourceARN": arn,
+                    "awsRegion": self._aws.region,
+                }
+                for m in msgs
+            ]}
+            self.invocations += 1
+            try:
+                result = self.handler(event, LambdaContext(self.function_name, self.timeout_secs))
+            except Exception as e:
+                self.errors += 1
+                print(f"[{self.function_name}] handler raised: {e}", file=sys.stderr, flush=True)
+                continue
+            failed = {f.get("itemIdentifier") for f in (result or {}).get("batchItemFailures", [])} \
+                if isinstance(result, dict) else set()
+            done = [m for m in msgs if m["MessageId"] not in failed]
+            if done:
+                self._sqs.delete_message_batch(
+                    QueueUrl=self.queue_url,
+                    Entries=[{"Id": str(i), "ReceiptHandle": m["ReceiptHandle"]} for i, m in enumerate(done)],
+                )
+
+
+# ---------- Greengrass IPC ----------
+
+def install_greengrass_ipc(ipc_module=None):
+    """
+    Serve `import awsiot.greengrasscoreipc[.client|.model]` from the
+    in-process IPC stand-in (project2-part2-edge/face-detection/local_ipc.py,
+    which must be importable unless passed in). Returns the module; publish
+    and subscribe on its `broker`.
+    """
+    import types
+
+    if ipc_module is None:
+        import local_ipc as ipc_module
+
+    pkg = sys.modules.get("awsiot")
+    if pkg is None or not hasattr(pkg, "__path__"):
+        pkg = types.ModuleType("awsiot")
+        pkg.__path__ = []
+        sys.modules["awsiot"] = pkg
+    pkg.greengrasscoreipc = ipc_module
+    sys.modules["awsiot.greengrasscoreipc"] = ipc_module
+    sys.modules["awsiot.greengrasscoreipc.client"] = ipc_module
+    sys.modules["awsiot.greengrasscoreipc.model"] = ipc_module
+    return ipc_module
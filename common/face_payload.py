@@ -0,0 +1,153 @@
+"""
+Face crop wire format between detection (fd_lambda / fd_component) and
+recognition (fr_lambda).
+
+v1 (legacy): "face_image" = base64 JPEG (q70) of the crop resized to 160x160;
+    the recognizer decodes with PIL and upsamples to 240x240.
+
+v2: "face" = {"v": 2, "shape": [3, H, W], "codec": "zlib-sub", "data": <b64>}
+    The crop is carried losslessly as uint8 CHW at the size MTCNN produced
+    (FACE_SIZE, default 240 like the v1 recognizer input). Each row is
+    delta-coded left-to-right ("sub" filter, as in PNG) before zlib, which
+    compresses smooth face images much better than raw bytes. Decoding is
+    zlib + numpy cumsum straight into a tensor: no PIL, no resize.
+
+Both versions encode the same min-max normalized uint8 image, so the
+recognizer's [-1, 1] input scaling is unchanged.
+
+Multi-face messages carry "faces": [{"box": [x1, y1, x2, y2], "prob": p,
+<v1 or v2 fields>}, ...] for every face in a frame. encode_faces() splits
+them into as few messages as fit under the SQS size limit.
+"""
+import json
+import base64
+import io
+import time
+import zlib
+
+import numpy as np
+import torch
+
+FORMATS = ("v1", "v2")
+
+V2_CODEC = "zlib-sub"
+
+# zlib level 1 is ~3x faster than the default (6) on 160x160 crops for ~10%
+# more bytes; a v2 message stays far below the 256 KB SQS limit either way.
+_ZLIB_LEVEL = 1
+
+# SQS message limit, minus room for request_id / filename / timing fields
+MAX_FACES_BYTES = 256 * 1024 - 4096
+
+
+def _to_uint8(face: torch.Tensor) -> np.ndarray:
+    """MTCNN output (3, H, W) float -> min-max normalized uint8 CHW array."""
+    face_img = face - face.min()
+    if face_img.max() > 0:
+        face_img = face_img / face_img.max()
+    return (face_img * 255).byte().numpy()
+
+
+def encode_v1(face: torch.Tensor) -> dict:
+    """Legacy payload: 160x160 JPEG q70, base64."""
+    from PIL import Image
+
+    face_img = np.ascontiguousarray(np.transpose(_to_uint8(face), (1, 2, 0)))
+    face_pil = Image.fromarray(face_img, mode="RGB")
+
+    # Resize smaller to keep message body well under SQS limits
+    face_pil = face_pil.resize((160, 160))
+
+    buf = io.BytesIO()
+    face_pil.save(buf, format="JPEG", quality=70, optimize=True)
+    return {"face_image": base64.b64encode(buf.getvalue()).decode("utf-8")}
+
+
+def encode_v2(face: torch.Tensor) -> dict:
+    """Lossless native-resolution payload (see module docstring)."""
+    chw = _to_uint8(face)
+    filtered = chw.copy()
+    # uint8 arithmetic wraps mod 256, which is exactly what the decoder undoes
+    filtered[:, :, 1:] -= chw[:, :, :-1]
+    data = zlib.compress(filtered.tobytes(), _ZLIB_LEVEL)
+    return {
+        "face": {
+            "v": 2,
+            "shape": list(chw.shape),
+            "codec": V2_CODEC,
+            "data": base64.b64encode(data).decode("ascii"),
+        }
+    }
+
+
+def encode(face: torch.Tensor, fmt: str = "v2") -> dict:
+    """
+    Message fields for one MTCNN face tensor in wire format `fmt`, plus
+    "timing": {"encode_ms": ...} so the recognizer can log the detector cost.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"face wire format must be one of {FORMATS}, got {fmt!r}")
+    t0 = time.perf_counter()
+    fields = encode_v2(face) if fmt == "v2" else encode_v1(face)
+    fields["timing"] = {"encode_ms": round((time.perf_counter() - t0) * 1000.0, 3)}
+    return fields
+
+
+def encode_faces(faces, boxes, probs, fmt: str = "v2", max_bytes: int = MAX_FACES_BYTES):
+    """
+    Message fields for all faces of one frame: a list of
+    {"faces": [...], "timing": {...}} dicts, one per message, each under
+    `max_bytes` of face data. Usually a single one.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"face wire format must be one of {FORMATS}, got {fmt!r}")
+    t0 = time.perf_counter()
+    parts, current, size = [], [], 0
+    for face, box, prob in zip(faces, boxes, probs):
+        entry = encode_v2(face) if fmt == "v2" else encode_v1(face)
+        entry["box"] = [round(float(v), 1) for v in box]
+        entry["prob"] = round(float(prob), 4)
+        entry_bytes = len(json.dumps(entry))
+        if current and size + entry_bytes > max_bytes:
+            parts.append(current)
+            current, size = [], 0
+        current.append(entry)
+        size += entry_bytes
+    if current:
+        parts.append(current)
+    encode_ms = round((time.perf_counter() - t0) * 1000.0, 3)
+    return [{"faces": p, "timing": {"encode_ms": encode_ms}} for p in parts]
+
+
+def decode_v2(face: dict) -> torch.Tensor:
+    """v2 payload -> (1, 3, H, W) float tensor in [-1, 1]."""
+    if face.get("v") != 2 or face.get("codec") != V2_CODEC:
+        raise ValueError(f"unsupported face payload v={face.get('v')} codec={face.get('codec')}")
+    shape = tuple(int(d) for d in face["shape"])
+    raw = zlib.decompress(base64.b64decode(face["data"]))
+    filtered = np.frombuffer(raw, dtype=np.uint8).reshape(shape)
+    chw = np.cumsum(filtered, axis=2, dtype=np.uint8)
+
+    x = torch.from_numpy(chw).float().unsqueeze(0)
+    # [0, 255] -> [0, 1] -> [-1, 1], same as the legacy preprocessing
+    return x.mul_(2.0 / 255.0).sub_(1.0)
+
+
+def model_input(face: torch.Tensor) -> torch.Tensor:
+    """
+    MTCNN face (3, H, W) -> the (1, 3, H, W) tensor decode_v2() would yield
+    for it, without the wire round trip (edge-local recognition).
+    """
+    x = torch.from_numpy(_to_uint8(face)).float().unsqueeze(0)
+    return x.mul_(2.0 / 255.0).sub_(1.0)
+
+
+def detect_format(body: dict) -> str:
+    """Wire format of a request message body or "faces" entry ("v1" or "v2")."""
+    if "faces" in body and body["faces"]:
+        return detect_format(body["faces"][0])
+    if "face" in body:
+        return "v2"
+    if "face_image" in body:
+        return "v1"
+    raise KeyError("message has neither 'face' nor 'face_image'")
@@ -0,0 +1,176 @@
+"""
+Fast detection path for the face-detection stages (fd_lambda, fd_component).
+
+Large JPEG frames are decoded straight to a reduced size using libjpeg's
+DCT-domain scaling (PIL's Image.draft, 1/2, 1/4 or 1/8), and MTCNN runs on
+that small image with min_face_size scaled to match, so its image pyramid
+has fewer, smaller levels. The face is then cropped from the
+full-resolution frame - which is only decoded when a face was found and the
+reduced image doesn't already have enough pixels for the crop.
+
+    fast = FastDetector(mtcnn, max_side=640, min_face_px=20)
+    frame = fast.open(jpeg_bytes)
+    (box, prob), = fast.detect([frame])
+    face = fast.crop(frame, box) if box is not None else None
+"""
+import copy
+import io
+import math
+import threading
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+# PNet scans with a 12x12 window; smaller min_face_size values are meaningless
+_PNET_WINDOW = 12
+
+Frame = namedtuple("Frame", ["data", "image", "scale", "full_size"])
+
+
+def detect_best(mtcnn, imgs):
+    """
+    One batched MTCNN detect over equal-size `imgs`, then the face MTCNN's
+    forward() would pick for each: [(box (4,) or None, prob or None), ...].
+
+    Selection runs per image: select_boxes' batch mode builds a ragged
+    ndarray when some images have no face, which current numpy rejects.
+    """
+    boxes, probs, points = mtcnn.detect(imgs, landmarks=True)
+    out = []
+    for img, b, p, pts in zip(imgs, boxes, probs, points):
+        if b is None:
+            out.append((None, None))
+            continue
+        box, prob, _ = mtcnn.select_boxes(
+            np.asarray(b, dtype=np.float64), np.asarray(p, dtype=np.float64),
+            np.asarray(pts, dtype=np.float64), img, method=mtcnn.selection_method,
+        )
+        if box is None:
+            out.append((None, None))
+        else:
+            out.append((np.asarray(box, dtype=np.float64).reshape(-1, 4)[0], float(prob)))
+    return out
+
+
+def detect_all(mtcnn, imgs, min_prob: float, max_faces: int):
+    """
+    Every face with probability >= `min_prob` in each of the equal-size
+    `imgs`, largest first, at most `max_faces`: [[(box (4,), prob), ...], ...].
+    """
+    boxes, probs = mtcnn.detect(imgs)
+    out = []
+    for b, p in zip(boxes, probs):
+        if b is None:
+            out.append([])
+            continue
+        b = np.asarray(b, dtype=np.float64).reshape(-1, 4)
+        p = np.asarray(p, dtype=np.float64).reshape(-1)
+        if not mtcnn.select_largest:
+            order = np.argsort((b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1]))[::-1]
+            b, p = b[order], p[order]
+        keep = p >= min_prob
+        out.append([(box, float(prob)) for box, prob in zip(b[keep][:max_faces], p[keep][:max_faces])])
+    return out
+
+
+class FastDetector:
+    def __init__(self, mtcnn, max_side: int = 640, min_face_px: int = 20):
+        """
+        mtcnn: the configured facenet_pytorch MTCNN (image_size, margin, ...).
+        max_side: longest side of the image MTCNN sees.
+        min_face_px: smallest face to find, in full-resolution pixels.
+        """
+        self.mtcnn = mtcnn
+        self.max_side = max_side
+        self.min_face_px = min_face_px
+        self._variants = {}
+        self._lock = threading.Lock()
+
+    def open(self, data: bytes) -> Frame:
+        """Decode `data` at reduced resolution for detection."""
+        img = Image.open(io.BytesIO(data))
+        full_size = img.size
+        longest = max(full_size)
+        if longest > self.max_side:
+            ratio = self.max_side / longest
+            target = (math.ceil(full_size[0] * ratio), math.ceil(full_size[1] * ratio))
+            # JPEG only: picks the largest 1/2^k DCT scale that is >= target
+            img.draft("RGB", target)
+        img = img.convert("RGB")
+        if max(img.size) > self.max_side:
+            # Non-JPEG input, or the DCT scale steps overshot the target
+            ratio = self.max_side / max(img.size)
+            img = img.resize(
+                (max(1, round(img.size[0] * ratio)), max(1, round(img.size[1] * ratio))),
+                Image.BILINEAR,
+            )
+        return Frame(data, img, img.size[0] / full_size[0], full_size)
+
+    def _variant(self, scale: float):
+        """Shallow MTCNN copy (shared P/R/O-Nets) with min_face_size for `scale`."""
+        min_face = max(_PNET_WINDOW, int(round(self.min_face_px * scale)))
+        with self._lock:
+            m = self._variants.get(min_face)
+            if m is None:
+                m = copy.copy(self.mtcnn)
+                m.min_face_size = min_face
+                self._variants[min_face] = m
+        return m
+
+    def detect(self, frames):
+        """
+        Best face box per frame (in reduced-image coordinates) as
+        [(box or None, prob or None), ...]. Equal-size frames are detected in
+        one batched MTCNN call.
+        """
+        results = [(None, None)] * len(frames)
+        by_size = {}
+        for i, f in enumerate(frames):
+            by_size.setdefault(f.image.size, []).append(i)
+
+        for idxs in by_size.values():
+            m = self._variant(frames[idxs[0]].scale)
+            for i, res in zip(idxs, detect_best(m, [frames[i].image for i in idxs])):
+                results[i] = res
+        return results
+
+    def detect_all(self, frames, min_prob: float, max_faces: int):
+        """Like detect(), but every face above `min_prob`: [[(box, prob), ...], ...]."""
+        results = [[] for _ in frames]
+        by_size = {}
+        for i, f in enumerate(frames):
+            by_size.setdefault(f.image.size, []).append(i)
+
+        for idxs in by_size.values():
+            m = self._variant(frames[idxs[0]].scale)
+            found = detect_all(m, [frames[i].image for i in idxs], min_prob, max_faces)
+            for i, faces in zip(idxs, found):
+                results[i] = faces
+        return results
+
+    def crop(self, frame: Frame, box):
+        """
+        MTCNN-style face tensor for `box` (reduced-image coordinates),
+        cropped from the full-resolution frame when that adds detail.
+        """
+        return self.crop_many(frame, [box])[0]
+
+    def crop_many(self, frame: Frame, boxes):
+        """crop() for several boxes of one frame, decoding the full frame at most once."""
+        faces, full = [], None
+        for box in boxes:
+            box = np.asarray(box, dtype=np.float64)
+            if frame.scale >= 1.0 or (box[2] - box[0]) >= self.mtcnn.image_size:
+                # The reduced image already has at least image_size pixels across the face
+                src = frame.image
+            else:
+                if full is None:
+                    full = Image.open(io.BytesIO(frame.data)).convert("RGB")
+                src, box = full, box / frame.scale
+            faces.append(self.mtcnn.extract(src, box.reshape(1, 4), None))
+        return faces
+
+    def full_box(self, frame: Frame, box):
+        """`box` (reduced-image coordinates) in full-resolution pixels."""
+        return np.asarray(box, dtype=np.float64) / frame.scale
@@ -0,0 +1,210 @@
+"""
+Face gallery: enrolled embeddings + labels with nearest-neighbour lookup.
+
+Shared by the recognition Lambdas (Project 2 Part 1 and Part 2). Rows can be
+held as float32 (exact), float16, or int8 with a per-row scale; the int8 form
+is ~4x smaller than float32 for 512-d FaceNet embeddings.
+
+Distances use ||q||^2 + ||g||^2 - 2 q.g with the gallery norms precomputed
+once, so scoring is a single matmul instead of an (N, 512) difference tensor.
+"""
+from collections import namedtuple
+
+import numpy as np
+import torch
+
+MODES = ("float32", "float16", "int8")
+
+UNKNOWN_LABEL = "Unknown"
+
+# Rows are upcast to float32 in chunks of this many when scoring a compact
+# gallery, so the temporary never exceeds CHUNK x 512 floats.
+_SCORE_CHUNK = 8192
+
+Match = namedtuple("Match", ["label", "distance"])
+
+
+def _as_matrix(embeddings) -> torch.Tensor:
+    """
+    Stack a list of tensors / ndarrays (each (512,) or (1, 512)) or an
+    existing 2-D tensor into one float32 (N, D) matrix.
+    """
+    if isinstance(embeddings, np.ndarray):
+        embeddings = torch.from_numpy(embeddings)
+    if isinstance(embeddings, torch.Tensor):
+        return embeddings.reshape(embeddings.shape[0], -1).float().contiguous()
+
+    rows = []
+    for emb_db in embeddings:
+        t = emb_db
+        if isinstance(t, np.ndarray):
+            t = torch.from_numpy(t)
+        # Flatten (e.g., (1, 512) -> (512,))
+        rows.append(t.reshape(-1).float())
+    return torch.stack(rows, dim=0)
+
+
+class Gallery:
+    """
+    Immutable embedding gallery. `extend` returns a new Gallery so a reader
+    holding the old one never sees a half-built matrix.
+    """
+
+    def __init__(self, embeddings, labels, mode: str = "float32"):
+        if mode not in MODES:
+            raise ValueError(f"gallery mode must be one of {MODES}, got {mode!r}")
+
+        matrix = _as_matrix(embeddings)
+        labels = list(labels)
+        if matrix.shape[0] != len(labels):
+            raise ValueError(
+                f"{matrix.shape[0]} embeddings but {len(labels)} labels"
+            )
+
+        self.mode = mode
+        self.labels = labels
+        self.dim = int(matrix.shape[1])
+
+        if mode == "int8":
+            # Symmetric per-row quantization: row ~= scale * q, q in [-127, 127]
+            scales = matrix.abs().amax(dim=1) / 127.0
+            scales = torch.where(scales > 0, scales, torch.ones_like(scales))
+            self._data = torch.round(matrix / scales.unsqueeze(1)).clamp_(-127, 127).to(torch.int8)
+            self._scales = scales
+        elif mode == "float16":
+            self._data = matrix.half()
+            self._scales = None
+        else:
+            self._data = matrix
+            self._scales = None
+
+        # Squared norms of the rows as actually stored (post-quantization),
+        # so ||q - g||^2 stays consistent with the dot products we compute.
+        self._norms = self._row_sq_norms()
+
+    # ------------------------------------------------------------------
+    # Construction helpers
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def from_weights(cls, path: str, mode: str = "float32") -> "Gallery":
+        """
+        Load the course weights file: torch.save([embedding_list, name_list]).
+        """
+        saved = torch.load(path, map_location="cpu")
+        return cls(saved[0], saved[1], mode=mode)
+
+    def dequantized(self) -> torch.Tensor:
+        """Full float32 (N, D) copy of the stored rows."""
+        if self._data.shape[0] == 0:
+            return torch.zeros(0, self.dim)
+        rows = self._data.float()
+        if self._scales is not None:
+            rows.mul_(self._scales.unsqueeze(1))
+        return rows
+
+    def extend(self, embeddings, labels) -> "Gallery":
+        """
+        Return a new Gallery with extra rows appended (same mode). Only the
+        new rows are quantized; existing rows are copied as stored.
+        """
+        extra = Gallery(embeddings, labels, mode=self.mode)
+        if extra.dim != self.dim:
+            raise ValueError(f"cannot extend {self.dim}-d gallery with {extra.dim}-d rows")
+
+        merged = Gallery.__new__(Gallery)
+        merged.mode = self.mode
+        merged.labels = self.labels + extra.labels
+        merged.dim = self.dim
+        merged._data = torch.cat([self._data, extra._data], dim=0)
+        merged._scales = (
+            None if self._scales is None else torch.cat([self._scales, extra._scales])
+        )
+        merged._norms = torch.cat([self._norms, extra._norms])
+        return merged
+
+    # ------------------------------------------------------------------
+    # Introspection
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the embedding rows, scales and precomputed norms."""
+        total = self._data.numel() * self._data.element_size()
+        total += self._norms.numel() * self._norms.element_size()
+        if self._scales is not None:
+            total += self._scales.numel() * self._scales.element_size()
+        return total
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+
+    def _float_chunks(self):
+        """Stored rows upcast to float32 chunk by chunk (int8 rows unscaled)."""
+        if self.mode == "float32":
+            yield 0, self._data
+            return
+        for start in range(0, self._data.shape[0], _SCORE_CHUNK):
+            yield start, self._data[start:start + _SCORE_CHUNK].float()
+
+    def _row_sq_norms(self) -> torch.Tensor:
+        out = torch.empty(self._data.shape[0], dtype=torch.float32)
+        for start, chunk in self._float_chunks():
+            out[start:start + chunk.shape[0]] = (chunk * chunk).sum(dim=1)
+        if self._scales is not None:
+            out.mul_(self._scales * self._scales)
+        return out
+
+    def _dot(self, queries: torch.Tensor) -> torch.Tensor:
+        """(N, B) dot products between gallery rows and query rows."""
+        if self.mode == "float32":
+            return self._data @ queries.t()
+        out = torch.empty(self._data.shape[0], queries.shape[0], dtype=torch.float32)
+        for start, chunk in self._float_chunks():
+            torch.matmul(chunk, queries.t(), out=out[start:start + chunk.shape[0]])
+        if self._scales is not None:
+            # (s * q) . x == s * (q . x): scale the (N, B) result, not the rows
+            out.mul_(self._scales.unsqueeze(1))
+        return out
+
+    def distances(self, queries: torch.Tensor) -> torch.Tensor:
+        """
+        L2 distances from each query to every gallery row.
+        queries: (D,) or (B, D). Returns (B, N).
+        """
+        q = queries.reshape(-1, self.dim).float()
+        q_norms = (q * q).sum(dim=1)                          # (B,)
+        d2 = self._norms.unsqueeze(0) + q_norms.unsqueeze(1) - 2.0 * self._dot(q).t()
+        return d2.clamp_min_(0.0).sqrt_()
+
+    def search(self, queries: torch.Tensor, k: int = 1):
+        """
+        Top-k nearest rows per query. Returns (distances, indices), each (B, k).
+        """
+        if len(self) == 0:
+            raise ValueError("gallery is empty")
+        k = max(1, min(int(k), len(self)))
+        return torch.topk(self.distances(queries), k, dim=1, largest=False, sorted=True)
+
+    def match_many(self, queries: torch.Tensor, k: int = 1, threshold=None):
+        """
+        Top-k matches for each query row as lists of Match(label, distance).
+        If `threshold` is set and the nearest distance exceeds it, the first
+        entry's label is UNKNOWN_LABEL (the remaining candidates are kept).
+        """
+        dists, idxs = self.search(queries, k)
+        results = []
+        for row_d, row_i in zip(dists.tolist(), idxs.tolist()):
+            matches = [Match(self.labels[i], d) for d, i in zip(row_d, row_i)]
+            if threshold is not None and matches[0].distance > threshold:
+                matches[0] = Match(UNKNOWN_LABEL, matches[0].distance)
+            results.append(matches)
+        return results
+
+    def match(self, emb: torch.Tensor, k: int = 1, threshold=None):
+        """Top-k matches for a single (D,) embedding."""
+        return self.match_many(emb.reshape(1, -1), k=k, threshold=threshold)[0]
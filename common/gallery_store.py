@@ -0,0 +1,237 @@
+"""
+Versioned, append-only gallery store with incremental hot reload.
+
+Layout (under a local directory or an s3://bucket/prefix):
+
+    segments/00000001.npz   embeddings (n, 512) float32 + labels, immutable
+    segments/00000002.npz
+    VERSION                 highest committed segment number
+
+Version 0 is the base gallery baked into the image (WEIGHTS_PATH). Writers
+(tools/enroll_faces.py) claim the next segment number with a create-only
+write, then advance VERSION with a compare-and-swap, so concurrent enrollments
+never overwrite each other. A segment is complete before VERSION can point at
+it, and readers only apply segments <= VERSION.
+
+Readers (LiveGallery) poll VERSION at most every `refresh_secs`, fetch only
+the new segments, build a new Gallery off to the side and swap it in with a
+single assignment: a request sees either the old gallery or the new one.
+"""
+import io
+import os
+import threading
+import time
+
+import numpy as np
+
+from gallery import Gallery
+
+_SEGMENT_FMT = "segments/{:08d}.npz"
+_VERSION_KEY = "VERSION"
+
+
+def pack_segment(embeddings, labels) -> bytes:
+    emb = np.asarray(embeddings, dtype=np.float32).reshape(len(labels), -1)
+    buf = io.BytesIO()
+    np.savez(buf, embeddings=emb, labels=np.asarray(list(labels), dtype=str))
+    return buf.getvalue()
+
+
+def unpack_segment(data: bytes):
+    with np.load(io.BytesIO(data), allow_pickle=False) as z:
+        return z["embeddings"], [str(s) for s in z["labels"]]
+
+
+class LocalStore:
+    """Gallery store in a local (or EFS-mounted) directory."""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(os.path.join(root, "segments"), exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, key)
+
+    def read_version(self) -> int:
+        try:
+            with open(self._path(_VERSION_KEY)) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def read_segment(self, version: int) -> bytes:
+        with open(self._path(_SEGMENT_FMT.format(version)), "rb") as f:
+            return f.read()
+
+    def create_segment(self, version: int, data: bytes) -> bool:
+        """Write segment `version` unless it already exists. Returns success."""
+        final = self._path(_SEGMENT_FMT.format(version))
+        tmp = f"{final}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            # link() fails if `final` exists: an atomic create-only publish
+            os.link(tmp, final)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.unlink(tmp)
+
+    def advance_version(self, version: int) -> None:
+        """Set VERSION to max(VERSION, version)."""
+        import fcntl
+
+        with open(self._path(_VERSION_KEY + ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if self.read_version() >= version:
+                return
+            tmp = self._path(_VERSION_KEY + ".tmp")
+            with open(tmp, "w") as f:
+                f.write(str(version))
+            os.replace(tmp, self._path(_VERSION_KEY))
+
+
+class S3Store:
+    """Gallery store under s3://bucket/prefix (uses S3 conditional writes)."""
+
+    def __init__(self, bucket: str, prefix: str = "", s3=None):
+        if s3 is None:
+            import aws_clients
+
+            s3 = aws_clients.client("s3")
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+
+    def _key(self, key):
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def _get_version(self):
+        try:
+            obj = self.s3.get_object(Bucket=self.bucket, Key=self._key(_VERSION_KEY))
+        except self.s3.exceptions.NoSuchKey:
+            return 0, None
+        return int(obj["Body"].read().decode().strip() or 0), obj["ETag"]
+
+    def read_version(self) -> int:
+        return self._get_version()[0]
+
+    def read_segment(self, version: int) -> bytes:
+        obj = self.s3.get_object(Bucket=self.bucket, Key=self._key(_SEGMENT_FMT.format(version)))
+        return obj["Body"].read()
+
+    def create_segment(self, version: int, data: bytes) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.s3.put_object(
+                Bucket=self.bucket,
+                Key=self._key(_SEGMENT_FMT.format(version)),
+                Body=data,
+                IfNoneMatch="*",
+            )
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("PreconditionFailed", "ConditionalRequestConflict"):
+                return False
+            raise
+
+    def advance_version(self, version: int) -> None:
+        from botocore.exceptions import ClientError
+
+        while True:
+            current, etag = self._get_version()
+            if current >= version:
+                return
+            cond = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+            try:
+                self.s3.put_object(
+                    Bucket=self.bucket,
+                    Key=self._key(_VERSION_KEY),
+                    Body=str(version).encode(),
+                    **cond,
+                )
+                return
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") not in (
+                    "PreconditionFailed", "ConditionalRequestConflict",
+                ):
+                    raise
+                # Lost the race to another writer; re-read and retry
+
+
+def open_store(uri: str):
+    """`s3://bucket/prefix` -> S3Store, anything else -> LocalStore(path)."""
+    if uri.startswith("s3://"):
+        bucket, _, prefix = uri[len("s3://"):].partition("/")
+        return S3Store(bucket, prefix)
+    return LocalStore(uri)
+
+
+def append(store, embeddings, labels) -> int:
+    """Enroll one batch as a new segment. Returns the committed version."""
+    data = pack_segment(embeddings, labels)
+    version = store.read_version() + 1
+    while not store.create_segment(version, data):
+        version += 1
+    store.advance_version(version)
+    return version
+
+
+class LiveGallery:
+    """
+    Base Gallery plus the store's segments, refreshed incrementally.
+    With store=None this is just the static base gallery.
+    """
+
+    def __init__(self, base: Gallery, store=None, refresh_secs: float = 30.0):
+        self._gallery = base
+        self.store = store
+        self.version = 0
+        self.refresh_secs = refresh_secs
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        if store is not None:
+            self.refresh()
+
+    def current(self) -> Gallery:
+        """The gallery to use for this request (may trigger a refresh)."""
+        if self.store is not None and time.monotonic() - self._last_check >= self.refresh_secs:
+            self.refresh()
+        return self._gallery
+
+    def refresh(self) -> bool:
+        """Apply any committed segments past our version. True if updated."""
+        # One refresher at a time; everyone else keeps using the current gallery
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            self._last_check = time.monotonic()
+            latest = self.store.read_version()
+            if latest <= self.version:
+                return False
+
+            embs, labels = [], []
+            for v in range(self.version + 1, latest + 1):
+                e, l = unpack_segment(self.store.read_segment(v))
+                embs.append(e)
+                labels.extend(l)
+
+            new_gallery = self._gallery.extend(np.concatenate(embs, axis=0), labels)
+            # Single reference swap: readers see the old or new gallery, never a mix
+            self._gallery = new_gallery
+            print(
+                f"[gallery] applied segments {self.version + 1}..{latest} "
+                f"(+{len(labels)} entries, total {len(new_gallery)})",
+                flush=True,
+            )
+            self.version = latest
+            return True
+        except Exception as e:
+            print(f"[gallery] refresh failed, keeping version {self.version}: {e}", flush=True)
+            return False
+        finally:
+            self._lock.release()
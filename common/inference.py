@@ -0,0 +1,128 @@
+"""
+InceptionResnetV1 inference backends for CPU (Lambda / Greengrass core).
+
+RESNET_BACKEND selects how the FaceNet model is run:
+  - eager            plain nn.Module in float32 (the original behaviour)
+  - script           traced + frozen TorchScript graph (fused conv/bn, no
+                     Python dispatch per layer)
+  - quantized        dynamic int8 quantization of the Linear layers
+  - script-quantized both of the above
+
+Thread count comes from TORCH_NUM_THREADS, or is derived from the Lambda
+memory size (Lambda allots one vCPU per 1769 MB, up to 6).
+
+RESNET_ARTIFACT points at a TorchScript file written by export_resnet()
+(tools/export_models.py). Loading it skips facenet_pytorch, the weight
+download check, tracing and freezing - the bulk of a cold start.
+"""
+import math
+import os
+
+import torch
+
+BACKENDS = ("eager", "script", "quantized", "script-quantized")
+
+# Lambda CPU share: 1 vCPU per 1769 MB of configured memory, max 6 vCPUs
+_LAMBDA_MB_PER_VCPU = 1769
+_LAMBDA_MAX_VCPUS = 6
+
+
+def default_num_threads() -> int:
+    """Intra-op threads matching the CPUs this process can actually use."""
+    mem_mb = os.environ.get("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", "").strip()
+    if mem_mb:
+        vcpus = math.ceil(int(mem_mb) / _LAMBDA_MB_PER_VCPU)
+        return max(1, min(vcpus, _LAMBDA_MAX_VCPUS))
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
+
+
+def configure_threads(num_threads=None) -> int:
+    """
+    Pin torch intra-op threads (TORCH_NUM_THREADS or default_num_threads()).
+    Inter-op threads default to 1: we run a single graph at a time.
+    """
+    if num_threads is None:
+        env = os.environ.get("TORCH_NUM_THREADS", "").strip()
+        num_threads = int(env) if env else default_num_threads()
+    torch.set_num_threads(num_threads)
+
+    interop = int(os.environ.get("TORCH_INTEROP_THREADS", "1"))
+    try:
+        torch.set_num_interop_threads(interop)
+    except RuntimeError:
+        # Can only be set once, before any inter-op work has started
+        pass
+    return num_threads
+
+
+def _check_backend(backend: str) -> None:
+    if backend not in BACKENDS:
+        raise ValueError(f"RESNET_BACKEND must be one of {BACKENDS}, got {backend!r}")
+
+
+def build_eager(pretrained="vggface2") -> torch.nn.Module:
+    from facenet_pytorch import InceptionResnetV1
+
+    return InceptionResnetV1(pretrained=pretrained).eval()
+
+
+def optimize(model: torch.nn.Module, backend: str, image_size: int = 240):
+    """Wrap an eager model according to `backend` (see module docstring)."""
+    _check_backend(backend)
+
+    if backend in ("quantized", "script-quantized"):
+        model = torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+
+    if backend in ("script", "script-quantized"):
+        example = torch.zeros(1, 3, image_size, image_size)
+        with torch.no_grad():
+            traced = torch.jit.trace(model, example)
+        model = torch.jit.freeze(traced.eval())
+        # Run the profiling executor's warm-up passes now instead of on the
+        # first real request.
+        with torch.no_grad():
+            model(example)
+            model(example)
+
+    return model
+
+
+def export_resnet(path: str, backend: str = "script", image_size: int = 160,
+                  pretrained="vggface2") -> None:
+    """Build, optimize and save a TorchScript artifact for RESNET_ARTIFACT."""
+    if backend == "eager":
+        raise ValueError("eager models cannot be exported; use a script backend")
+    model = optimize(build_eager(pretrained), backend, image_size=image_size)
+    if not isinstance(model, torch.jit.ScriptModule):
+        # quantized-only: script it so it can be serialized
+        model = torch.jit.freeze(torch.jit.trace(model, torch.zeros(1, 3, image_size, image_size)))
+    torch.jit.save(model, path)
+
+
+def load_resnet(backend=None, image_size: int = 240, pretrained="vggface2"):
+    """
+    Load the FaceNet embedder with threads tuned for this host: from
+    RESNET_ARTIFACT when it exists, otherwise built for RESNET_BACKEND
+    (default "eager").
+    """
+    artifact = os.environ.get("RESNET_ARTIFACT", "").strip()
+    if artifact:
+        if os.path.exists(artifact):
+            threads = configure_threads()
+            model = torch.jit.load(artifact, map_location="cpu").eval()
+            print(f"[inference] artifact={artifact} threads={threads}", flush=True)
+            return model
+        print(f"[inference] WARNING: RESNET_ARTIFACT {artifact} not found; building model", flush=True)
+
+    if backend is None:
+        backend = os.environ.get("RESNET_BACKEND", "eager").strip().lower() or "eager"
+    _check_backend(backend)
+    threads = configure_threads()
+    model = optimize(build_eager(pretrained), backend, image_size=image_size)
+    print(f"[inference] backend={backend} threads={threads}", flush=True)
+    return model
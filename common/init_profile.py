@@ -0,0 +1,48 @@
+"""
+Cold-start timing for module-level init in the Lambdas.
+
+    _init = InitProfile("fr_lambda")
+    with _init.phase("import"):
+        import torch
+    ...
+    _init.report()   # prints: [init] {"component": "fr_lambda", "total_ms": ..., "phases": {...}}
+
+Phases may run on background threads and overlap, so their sum can exceed
+total_ms. Kept stdlib-only so it can be imported before anything heavy.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class InitProfile:
+    def __init__(self, component: str):
+        self.component = component
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = round((time.perf_counter() - t) * 1000.0, 2)
+            with self._lock:
+                self.phases[name] = ms
+
+    def report(self) -> dict:
+        """Print the init report as one JSON log line and return it."""
+        with self._lock:
+            out = {
+                "component": self.component,
+                "total_ms": round((time.perf_counter() - self._t0) * 1000.0, 2),
+                "phases": dict(self.phases),
+                # Set by the Lambda runtime; absent when imported locally
+                "memory_mb": os.environ.get("AWS_LAMBDA_FUNCTION_MEMORY_SIZE"),
+            }
+        print(f"[init] {json.dumps(out)}", flush=True)
+        return out
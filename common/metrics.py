@@ -0,0 +1,389 @@
+"""
+Shared instrumentation: counters, gauges and latency histograms, plus trace
+timestamps that travel inside the pipeline's messages.
+
+    import metrics
+    FRAMES = metrics.registry.counter("frames_total", "frames by outcome")
+    DETECT_MS = metrics.registry.histogram("detect_ms", "MTCNN time per frame")
+
+    FRAMES.inc(outcome="no_face")
+    with DETECT_MS.time():
+        ...
+
+Tracing: each hop appends [stage, epoch_ms] to the message's "trace" list
+with metrics.mark(msg, "fr.dequeued"). The hop that finishes a request
+calls metrics.observe_trace(trace), which records the time between
+consecutive marks in the "stage_ms" histogram, labeled hop="<a>-><b>" and
+kind="queue" when the two marks are from different components (the part
+before the first dot), else kind="stage"; "e2e_ms" gets first-to-last.
+Marks from different hosts use wall clocks, so cross-host hops include
+clock skew (NTP keeps it to a few ms on EC2 / Lambda). A trace that comes
+from outside (a client's frame) goes through clean_trace() first.
+
+Export (configure(), from the environment):
+  METRICS_PORT       serve GET /metrics (Prometheus text) and /metrics.json
+  METRICS_DUMP_SECS  log a "[metrics] {...}" JSON line this often
+  METRICS_DUMP_PATH  append the JSON lines to this file instead of stdout
+
+Lambdas have no background threads between invocations: configure(...,
+background=False) and call maybe_dump() at the end of each invocation.
+Both are off by default; updates cost one lock and a dict lookup. Kept
+stdlib-only so every component can import it.
+"""
+import json
+import math
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds (ms)
+BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000, math.inf)
+
+
+def _key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _series_name(name: str, key: tuple) -> str:
+    if not key:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in key) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str = ""):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def series(self):
+        """[(label key, value)] snapshot."""
+        with self._lock:
+            return list(self._values.items())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, n: float = 1, **labels) -> None:
+        key = _key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + n
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str = ""):
+        super().__init__(name, help)
+        self._functions = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_key(labels)] = value
+
+    def inc(self, n: float = 1, **labels) -> None:
+        key = _key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + n
+
+    def dec(self, n: float = 1, **labels) -> None:
+        self.inc(-n, **labels)
+
+    def set_function(self, fn, **labels) -> None:
+        """Read the value from fn() at export time (queue depths and the like)."""
+        with self._lock:
+            self._functions[_key(labels)] = fn
+
+    def series(self):
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, fn in functions.items():
+            try:
+                values[key] = fn()
+            except Exception:
+                values[key] = None
+        return list(values.items())
+
+
+class _Buckets:
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def observe(self, ms: float, **labels) -> None:
+        key = _key(labels)
+        i = 0
+        while ms > BUCKETS_MS[i]:
+            i += 1
+        with self._lock:
+            b = self._values.get(key)
+            if b is None:
+                b = self._values[key] = _Buckets()
+            b.counts[i] += 1
+            b.count += 1
+            b.sum += ms
+            if ms > b.max:
+                b.max = ms
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe((time.perf_counter() - t0) * 1000.0, **labels)
+
+    def series(self):
+        with self._lock:
+            return [(key, (list(b.counts), b.count, b.sum, b.max)) for key, b in self._values.items()]
+
+    @staticmethod
+    def quantile(counts, count: int, q: float, max_ms: float) -> float:
+        """Estimate from buckets: linear within the bucket holding the q-th observation."""
+        if not count:
+            return 0.0
+        rank = q * count
+        seen, lower = 0, 0.0
+        for bound, c in zip(BUCKETS_MS, counts):
+            if c and seen + c >= rank:
+                upper = min(bound, max_ms)
+                return lower + (upper - lower) * (rank - seen) / c
+            seen += c
+            lower = bound
+        return max_ms
+
+
+class Registry:
+    def __init__(self, component: str = ""):
+        self.component = component
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._last_dump = time.monotonic()
+        self.dump_secs = 0.0
+        self.dump_path = ""
+        self._exporting = False
+
+    def _get(self, cls, name: str, help: str):
+        with self._lock:
+            m = self._metrics.get(name)
+            if m is None:
+                m = self._metrics[name] = cls(name, help)
+            elif not isinstance(m, cls):
+                raise ValueError(f"metric {name!r} is already a {m.kind}")
+            return m
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        return self._get(Counter, name, help)
+
+    def gauge(self, name: str, help: str = "") -> Gauge:
+        return self._get(Gauge, name, help)
+
+    def histogram(self, name: str, help: str = "") -> Histogram:
+        return self._get(Histogram, name, help)
+
+    def snapshot(self) -> dict:
+        """{"component", "ts", "counters", "gauges", "histograms"} keyed by series name."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        out = {"component": self.component, "ts": round(time.time(), 3),
+               "counters": {}, "gauges": {}, "histograms": {}}
+        for m in metrics:
+            for key, value in m.series():
+                name = _series_name(m.name, key)
+                if m.kind == "histogram":
+                    counts, count, total, max_ms = value
+                    out["histograms"][name] = {
+                        "count": count,
+                        "mean": round(total / count, 3) if count else 0.0,
+                        "p50": round(Histogram.quantile(counts, count, 0.50, max_ms), 3),
+                        "p95": round(Histogram.quantile(counts, count, 0.95, max_ms), 3),
+                        "p99": round(Histogram.quantile(counts, count, 0.99, max_ms), 3),
+                        "max": round(max_ms, 3),
+                    }
+                else:
+                    out[m.kind + "s"][name] = value
+        return out
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for m in metrics:
+            if m.help:
+                lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            for key, value in m.series():
+                if m.kind != "histogram":
+                    if value is not None:
+                        lines.append(f"{_series_name(m.name, key)} {value}")
+                    continue
+                counts, count, total, _ = value
+                cumulative = 0
+                for bound, c in zip(BUCKETS_MS, counts):
+                    cumulative += c
+                    le = "+Inf" if bound == math.inf else repr(float(bound))
+                    lines.append(f"{_series_name(m.name + '_bucket', key + (('le', le),))} {cumulative}")
+                lines.append(f"{_series_name(m.name + '_sum', key)} {total}")
+                lines.append(f"{_series_name(m.name + '_count', key)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self) -> None:
+        line = json.dumps(self.snapshot())
+        self._last_dump = time.monotonic()
+        if self.dump_path:
+            with open(self.dump_path, "a") as f:
+                f.write(line + "\n")
+        else:
+            print(f"[metrics] {line}", flush=True)
+
+    def maybe_dump(self) -> None:
+        """Dump if METRICS_DUMP_SECS have passed since the last one (for Lambdas)."""
+        if self.dump_secs > 0 and time.monotonic() - self._last_dump >= self.dump_secs:
+            self.dump()
+
+
+registry = Registry()
+
+
+def serve(port: int, host: str = "0.0.0.0", reg: Registry = registry):
+    """Serve /metrics and /metrics.json on a daemon thread; returns the server."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, ctype = reg.prometheus().encode(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, ctype = json.dumps(reg.snapshot()).encode(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    httpd = ThreadingHTTPServer((host, port), _Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="metrics-http", daemon=True).start()
+    return httpd
+
+
+def _dump_loop(reg: Registry) -> None:
+    while True:
+        time.sleep(reg.dump_secs)
+        try:
+            reg.dump()
+        except Exception as e:
+            print(f"[metrics] dump failed: {e}", flush=True)
+
+
+def configure(component: str, background: bool = True, reg: Registry = registry) -> Registry:
+    """
+    Name the registry's component and start the exporters the environment
+    asks for (see module docstring). background=False (Lambdas) skips the
+    HTTP server and dump thread; use maybe_dump() instead. Exporters start
+    once per registry, however many components share the process.
+    """
+    reg.component = component
+    reg.dump_secs = float(os.environ.get("METRICS_DUMP_SECS", "0") or 0)
+    reg.dump_path = os.environ.get("METRICS_DUMP_PATH", "").strip()
+    with reg._lock:
+        if not background or reg._exporting:
+            return reg
+        reg._exporting = True
+    port = int(os.environ.get("METRICS_PORT", "0") or 0)
+    if port:
+        serve(port, reg=reg)
+        print(f"[metrics] serving /metrics on port {port}", flush=True)
+    if reg.dump_secs > 0:
+        threading.Thread(target=_dump_loop, args=(reg,), name="metrics-dump", daemon=True).start()
+    return reg
+
+
+# ---------- tracing ----------
+
+# Traces arriving from clients are untrusted: stage names become metric
+# labels, and the list rides in every message downstream
+MAX_TRACE_MARKS = 16
+_STAGE_RE = re.compile(r"(client|web|backend|fd|fr|edge)\.[a-z_]{1,16}")
+
+
+def clean_trace(trace) -> list:
+    """
+    The well-formed [stage, epoch ms] marks of an incoming trace, at most
+    MAX_TRACE_MARKS; anything else (unknown stage names, non-numbers) is
+    dropped. Not a list -> [].
+    """
+    if not isinstance(trace, list):
+        return []
+    out = []
+    for m in trace:
+        if len(out) >= MAX_TRACE_MARKS:
+            break
+        if not (isinstance(m, list) and len(m) == 2):
+            continue
+        stage, ts = m
+        if not isinstance(stage, str) or not _STAGE_RE.fullmatch(stage):
+            continue
+        if isinstance(ts, bool) or not isinstance(ts, (int, float)) or not math.isfinite(ts):
+            continue
+        out.append([stage, float(ts)])
+    return out
+
+
+def mark(msg: dict, stage: str, ts_ms=None) -> dict:
+    """Append [stage, epoch ms] to msg["trace"]; returns msg."""
+    msg.setdefault("trace", []).append([stage, round(time.time() * 1000.0 if ts_ms is None else ts_ms, 1)])
+    return msg
+
+
+def hops(trace):
+    """[(hop, kind, ms)] between consecutive marks of a trace."""
+    out = []
+    for (a, ta), (b, tb) in zip(trace, trace[1:]):
+        kind = "queue" if a.split(".", 1)[0] != b.split(".", 1)[0] else "stage"
+        out.append((f"{a}->{b}", kind, tb - ta))
+    return out
+
+
+def observe_trace(trace, reg: Registry = registry) -> dict:
+    """
+    Record a finished trace's per-hop durations ("stage_ms") and first-to-last
+    ("e2e_ms"); returns {hop: ms} for logging. Malformed traces are ignored.
+    """
+    try:
+        trace = [(str(s), float(t)) for s, t in trace or []]
+    except (TypeError, ValueError):
+        return {}
+    if len(trace) < 2:
+        return {}
+    stage_ms = reg.histogram("stage_ms", "time between consecutive trace marks")
+    durations = {}
+    for hop, kind, ms in hops(trace):
+        stage_ms.observe(max(ms, 0.0), hop=hop, kind=kind)
+        durations[hop] = round(ms, 1)
+    reg.histogram("e2e_ms", "first to last trace mark").observe(
+        max(trace[-1][1] - trace[0][1], 0.0), origin=trace[0][0]
+    )
+    return durations
@@ -0,0 +1,248 @@
+"""
+On-demand profiling of request handlers with cProfile (and optionally the
+torch profiler), switched on by env var or signal.
+
+    _profiler = profiling.Profiler("fd_component")
+    ...
+    with _profiler.request():
+        handle(msg)
+
+Modes (environment):
+  PROFILE_EVERY=N        profile every Nth request, one file per sample
+  PROFILE_ON_START=1     profile every request for the first window
+  PROFILE_WINDOW_SECS    window length (default 30); SIGUSR2 opens a new
+                         window at the next request (PROFILE_SIGNAL=none to
+                         disable, or another signal name)
+  PROFILE_TORCH=1        also run torch.profiler (CPU ops) on sampled requests
+  PROFILE_DIR            output directory (default ./profiles, /tmp/profiles
+                         on Lambda)
+  PROFILE_KEEP           profiles kept before the oldest are deleted (default 20)
+  PROFILE_TOP            functions listed in each summary (default 15)
+
+A window's requests are merged into one profile written when it closes.
+Each profile is a .prof file (pstats / snakeviz) plus a .txt summary of the
+top functions by own and cumulative time. A "[profile] {...}" log line
+carries the top few, since Lambda's /tmp doesn't outlive the container.
+
+Only one request is profiled at a time (cProfile can't nest across threads);
+concurrent requests run unprofiled. Work handed to another thread is not in
+the caller's profile: wrap the code on that thread instead (fd_component
+profiles its micro-batched MTCNN calls, not the waiting workers). When no mode is active request() returns
+a shared no-op context manager: one attribute check per request.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import signal
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+_NOOP = nullcontext()
+
+
+def _default_dir() -> str:
+    return "/tmp/profiles" if os.environ.get("AWS_LAMBDA_FUNCTION_NAME") else "profiles"
+
+
+class Profiler:
+    def __init__(self, component: str, every: int = None, window_secs: float = None,
+                 on_start: bool = None, torch_ops: bool = None, out_dir: str = None,
+                 keep: int = None, top: int = None, signal_name: str = None):
+        env = os.environ.get
+        self.component = component
+        self.every = int(env("PROFILE_EVERY", "0")) if every is None else every
+        self.window_secs = float(env("PROFILE_WINDOW_SECS", "30")) if window_secs is None else window_secs
+        self.torch_ops = env("PROFILE_TORCH", "0") == "1" if torch_ops is None else torch_ops
+        self.out_dir = out_dir or env("PROFILE_DIR", "").strip() or _default_dir()
+        self.keep = int(env("PROFILE_KEEP", "20")) if keep is None else keep
+        self.top = int(env("PROFILE_TOP", "15")) if top is None else top
+
+        self._lock = threading.Lock()
+        self._busy = threading.Lock()   # held while a request is profiled
+        self._count = 0
+        self._seq = 0
+        self._window_end = 0.0
+        self._window_stats = None
+        self._window_requests = 0
+        self._window_torch = []
+        # Set by the signal handler, which can't take locks or print: it may
+        # interrupt this thread while it holds _lock. The next request opens
+        # the window.
+        self._window_requested = False
+        self.active = self.every > 0
+
+        if (env("PROFILE_ON_START", "0") == "1") if on_start is None else on_start:
+            self.open_window()
+        sig = (env("PROFILE_SIGNAL", "SIGUSR2") if signal_name is None else signal_name).strip()
+        if sig and sig.lower() != "none" and hasattr(signal, sig):
+            try:
+                signal.signal(getattr(signal, sig), self._on_signal)
+            except ValueError:
+                # Not the main thread (e.g. imported by a worker): env modes only
+                pass
+
+    # ---------- control ----------
+
+    def open_window(self, secs: float = None) -> None:
+        """Profile every request for the next `secs` (default PROFILE_WINDOW_SECS)."""
+        secs = self.window_secs if secs is None else secs
+        with self._lock:
+            self._window_end = time.monotonic() + secs
+            self.active = True
+        timer = threading.Timer(secs + 0.05, self._close_window_if_due)
+        timer.daemon = True
+        timer.start()
+        print(f"[profile] {self.component}: window open for {secs:g}s", flush=True)
+
+    def _on_signal(self, *_) -> None:
+        self._window_requested = True
+        self.active = True
+
+    def _in_window(self) -> bool:
+        return time.monotonic() < self._window_end
+
+    # ---------- hot path ----------
+
+    def request(self):
+        """Context manager around one request; a no-op unless a mode is active."""
+        if not self.active:
+            return _NOOP
+        return self._maybe_profile()
+
+    @contextmanager
+    def _maybe_profile(self):
+        if self._window_requested:
+            self._window_requested = False
+            self.open_window()
+        with self._lock:
+            self._count += 1
+            sampled = self._in_window() or (self.every > 0 and self._count % self.every == 0)
+        if not sampled or not self._busy.acquire(blocking=False):
+            yield
+            self._close_window_if_due()
+            return
+        prof = cProfile.Profile()
+        torch_prof = self._start_torch()
+        t0 = time.perf_counter()
+        try:
+            prof.enable()
+            try:
+                yield
+            finally:
+                prof.disable()
+        finally:
+            wall_ms = (time.perf_counter() - t0) * 1000.0
+            torch_table = self._stop_torch(torch_prof)
+            self._busy.release()
+            self._record(prof, torch_table, wall_ms)
+
+    def _start_torch(self):
+        if not self.torch_ops:
+            return None
+        try:
+            import torch
+
+            p = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU])
+            p.__enter__()
+            return p
+        except Exception as e:
+            print(f"[profile] torch profiler unavailable: {e}", flush=True)
+            self.torch_ops = False
+            return None
+
+    def _stop_torch(self, p):
+        if p is None:
+            return None
+        try:
+            p.__exit__(None, None, None)
+            return p.key_averages().table(sort_by="self_cpu_time_total", row_limit=self.top)
+        except Exception as e:
+            return f"torch profiler failed: {e}"
+
+    def _record(self, prof, torch_table, wall_ms: float) -> None:
+        with self._lock:
+            if self._in_window():
+                if self._window_stats is None:
+                    self._window_stats = pstats.Stats(prof)
+                else:
+                    self._window_stats.add(prof)
+                self._window_requests += 1
+                if torch_table:
+                    self._window_torch.append(torch_table)
+                return
+        self._write(pstats.Stats(prof), 1, [torch_table] if torch_table else [], f"sample, {wall_ms:.1f} ms")
+        self._close_window_if_due()
+
+    def _close_window_if_due(self) -> None:
+        """Write the window's merged profile once it has ended; go idle if no mode remains."""
+        with self._lock:
+            if self._in_window():
+                return
+            stats, n, torch_tables = self._window_stats, self._window_requests, self._window_torch
+            self._window_stats, self._window_requests, self._window_torch = None, 0, []
+            self.active = self.every > 0 or self._window_requested
+        if stats is not None:
+            self._write(stats, n, torch_tables[-1:], "window")
+
+    # ---------- output ----------
+
+    def _write(self, stats: pstats.Stats, requests: int, torch_tables, kind: str) -> None:
+        try:
+            os.makedirs(self.out_dir, exist_ok=True)
+            with self._lock:
+                self._seq += 1
+                seq = self._seq
+            base = os.path.join(
+                self.out_dir, f"{self.component}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{seq}"
+            )
+            stats.dump_stats(base + ".prof")
+
+            buf = io.StringIO()
+            stats.stream = buf
+            buf.write(f"{self.component}: {kind}, {requests} request(s)\n\n")
+            stats.sort_stats("tottime").print_stats(self.top)
+            stats.sort_stats("cumulative").print_stats(self.top)
+            for table in torch_tables:
+                buf.write("\ntorch ops (last request):\n" + table + "\n")
+            with open(base + ".txt", "w") as f:
+                f.write(buf.getvalue())
+
+            print(f"[profile] {json.dumps(self.summary(stats, base, requests, kind))}", flush=True)
+            self._rotate()
+        except Exception as e:
+            print(f"[profile] write failed: {e}", flush=True)
+
+    def summary(self, stats: pstats.Stats, path: str, requests: int, kind: str, n: int = 5) -> dict:
+        """Top `n` functions by own time, for the log line."""
+        rows = sorted(stats.stats.items(), key=lambda kv: kv[1][2], reverse=True)[:n]
+        return {
+            "component": self.component,
+            "kind": kind,
+            "requests": requests,
+            "file": path + ".prof",
+            "top": [
+                {
+                    "func": f"{os.path.basename(file)}:{line}({name})",
+                    "calls": nc,
+                    "tottime_ms": round(tt * 1000.0, 2),
+                    "cumtime_ms": round(ct * 1000.0, 2),
+                }
+                for (file, line, name), (cc, nc, tt, ct, _) in rows
+            ],
+        }
+
+    def _rotate(self) -> None:
+        profs = sorted(
+            (os.path.join(self.out_dir, f) for f in os.listdir(self.out_dir)
+             if f.startswith(self.component + "-") and f.endswith(".prof")),
+            key=os.path.getmtime,
+        )
+        for old in profs[:max(0, len(profs) - self.keep)]:
+            for path in (old, old[:-5] + ".txt"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
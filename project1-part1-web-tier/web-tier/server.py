@@ -4,13 +4,18 @@ import os
 import sys
 import cgi
 import logging
+import time
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from socketserver import ThreadingMixIn
 
-import boto3
-from botocore.config import Config
 from botocore.exceptions import BotoCoreError, ClientError
 
+# Shared helpers (common/) are copied next to this file on the instance; in a
+# repo checkout they live two directories up.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+import aws_clients  # noqa: E402
+import metrics  # noqa: E402
+
 # --------------------- CONFIG ---------------------
 ASU_ID = os.environ.get("ASU_ID", "").strip()
 REGION = os.environ.get("AWS_REGION", "us-east-1").strip() or "us-east-1"
@@ -22,10 +27,12 @@ SDB_DOMAIN = os.environ.get("SDB_DOMAIN", "").strip() or (
     f"{ASU_ID}-simpleDB" if ASU_ID else ""
 )
 
-# Boto3 clients (thread-safe)
-_boto_cfg = Config(region_name=REGION, retries={"max_attempts": 5, "mode": "standard"})
-_s3  = boto3.client("s3",  config=_boto_cfg)
-_sdb = boto3.client("sdb", config=_boto_cfg)
+# Boto3 clients (thread-safe). One server thread per request, so the pools
+# are sized for AWS_CONCURRENCY requests in flight (see common/aws_clients.py)
+AWS_CONCURRENCY = int(os.environ.get("AWS_CONCURRENCY", "64"))
+_retries = {"max_attempts": 5, "mode": "standard"}
+_s3  = aws_clients.client("s3",  region_name=REGION, concurrency=AWS_CONCURRENCY, retries=_retries)
+_sdb = aws_clients.client("sdb", region_name=REGION, concurrency=AWS_CONCURRENCY, retries=_retries)
 
 # Logging
 logging.basicConfig(
@@ -35,6 +42,12 @@ logging.basicConfig(
 )
 log = logging.getLogger("web-tier")
 
+# Metrics (METRICS_PORT / METRICS_DUMP_SECS, see common/metrics.py)
+metrics.configure("p1-web")
+_REQUESTS = metrics.registry.counter("requests_total", "POST / by HTTP status")
+_REQUEST_MS = metrics.registry.histogram("request_ms", "POST / handling time")
+_AWS_MS = metrics.registry.histogram("aws_call_ms", "S3 / SimpleDB call time")
+
 # ------------------ UTILITIES ---------------------
 def _basename_no_ext(filename: str) -> str:
     base = os.path.basename(filename)
@@ -59,11 +72,12 @@ def _find_label(attrs):
 
 def sdb_lookup(item_name: str) -> str:
     try:
-        resp = _sdb.get_attributes(
-            DomainName=SDB_DOMAIN,
-            ItemName=item_name,
-            ConsistentRead=True
-        )
+        with _AWS_MS.time(call="sdb.get_attributes"):
+            resp = _sdb.get_attributes(
+                DomainName=SDB_DOMAIN,
+                ItemName=item_name,
+                ConsistentRead=True
+            )
         return _find_label(resp.get("Attributes"))
     except (BotoCoreError, ClientError) as e:
         log.error("SimpleDB get_attributes failed: %s", e)
@@ -73,7 +87,8 @@ def s3_put_object(key: str, fileobj) -> None:
     try:
         if hasattr(fileobj, "seek"):
             fileobj.seek(0)
-        _s3.put_object(Bucket=INPUT_BUCKET, Key=key, Body=fileobj)
+        with _AWS_MS.time(call="s3.put_object"):
+            _s3.put_object(Bucket=INPUT_BUCKET, Key=key, Body=fileobj)
     except (BotoCoreError, ClientError) as e:
         log.error("S3 put_object failed: %s", e)
         raise
@@ -86,6 +101,9 @@ class Handler(BaseHTTPRequestHandler):
     protocol_version = "HTTP/1.1"
 
     def _send_plain(self, code: int, text: str):
+        if self.path == "/":
+            _REQUESTS.inc(status=code)
+            _REQUEST_MS.observe((time.perf_counter() - self._started) * 1000.0)
         body = text.encode("utf-8")
         self.send_response(code)
         self.send_header("Content-Type", "text/plain; charset=utf-8")
@@ -98,6 +116,7 @@ class Handler(BaseHTTPRequestHandler):
             pass
 
     def do_POST(self):
+        self._started = time.perf_counter()
         if self.path != "/":
             self._send_plain(404, "Not Found")
             return
@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
-import os, io, json, time
-import boto3
+import os, io, sys, json, time
 from botocore.exceptions import ClientError
 
+# Shared helpers (common/) are copied next to this file on the instance; in a
+# repo checkout they live two directories up.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+import aws_clients  # noqa: E402
+import metrics  # noqa: E402
+import profiling  # noqa: E402
+
 ASU_ID = os.environ.get("ASU_ID", "").strip()
 REGION = os.environ.get("AWS_REGION", "us-east-1").strip() or "us-east-1"
 
@@ -26,10 +32,18 @@ VISIBILITY_TIMEOUT  = int(os.environ.get("VISIBILITY_TIMEOUT", "60"))
 SELF_STOP = os.environ.get("SELF_STOP", "0") == "1"
 IDLE_CHECKS_BEFORE_STOP = int(os.environ.get("IDLE_CHECKS_BEFORE_STOP", "2"))
 
-session = boto3.Session(region_name=REGION)
-s3  = session.client("s3")
-sqs = session.client("sqs")
-ec2 = session.client("ec2")
+s3  = aws_clients.client("s3", region_name=REGION)
+sqs = aws_clients.client("sqs", region_name=REGION)
+ec2 = aws_clients.client("ec2", region_name=REGION)
+
+# Metrics (METRICS_PORT / METRICS_DUMP_SECS, see common/metrics.py); the
+# request's trace is extended per stage and returned in the response
+MESSAGES = metrics.registry.counter("messages_total", "request messages by outcome")
+PREDICT_MS = metrics.registry.histogram("predict_ms", "model inference time")
+AWS_MS = metrics.registry.histogram("aws_call_ms", "S3 / SQS call time")
+
+# Off unless PROFILE_EVERY / PROFILE_ON_START is set or SIGUSR2 arrives
+PROFILER = profiling.Profiler("p1-backend")
 
 def qurl(name): return sqs.get_queue_url(QueueName=name)["QueueUrl"]
 def resolve_queue_url(name, override_url):
@@ -46,9 +60,13 @@ def get_queue_depth(q_url):
         AttributeNames=["ApproximateNumberOfMessages","ApproximateNumberOfMessagesNotVisible"])["Attributes"]
     return int(a.get("ApproximateNumberOfMessages","0")), int(a.get("ApproximateNumberOfMessagesNotVisible","0"))
 
-def send_response(request_id, label):
-    body = json.dumps({"request_id": request_id, "prediction": label})
-    sqs.send_message(QueueUrl=RESP_URL, MessageBody=body)
+def send_response(request_id, label, trace=None):
+    out = {"request_id": request_id, "prediction": label}
+    if trace is not None:
+        out["trace"] = trace
+    body = json.dumps(metrics.mark(out, "backend.respond") if trace is not None else out)
+    with AWS_MS.time(call="sqs.send_message"):
+        sqs.send_message(QueueUrl=RESP_URL, MessageBody=body)
 
 def stop_myself():
     try:
@@ -72,9 +90,59 @@ def ensure_model():
         from model_infer import predict
         PREDICT = predict
 
+def handle_message(m):
+    receipt = m["ReceiptHandle"]
+    try:
+        body = json.loads(m.get("Body","{}"))
+    except: body = {}
+    request_id = str(body.get("request_id","") or "").strip()
+    s3_key     = str(body.get("s3_key","") or "").strip()
+    if not request_id or not s3_key:
+        print("[backend] invalid msg; deleting:", body)
+        MESSAGES.inc(outcome="invalid")
+        sqs.delete_message(QueueUrl=REQ_URL, ReceiptHandle=receipt)
+        return
+    trace = metrics.clean_trace(body["trace"]) if isinstance(body.get("trace"), list) else None
+    if trace is not None:
+        metrics.mark(body, "backend.dequeue")
+
+    try:
+        with AWS_MS.time(call="s3.get_object"):
+            obj = s3.get_object(Bucket=INPUT_BUCKET, Key=s3_key)
+            img_bytes = obj["Body"].read()
+    except ClientError as e:
+        print(f"[backend] S3 get_object failed for {s3_key}:", e)
+        MESSAGES.inc(outcome="s3_get_failed")
+        return
+
+    try:
+        ensure_model()
+        with PREDICT_MS.time():
+            label = str(PREDICT(img_bytes))
+    except Exception as e:
+        print("[backend] inference failed:", e)
+        MESSAGES.inc(outcome="predict_failed")
+        return
+    if trace is not None:
+        metrics.mark(body, "backend.predict")
+
+    out_key = stem(s3_key)
+    try:
+        with AWS_MS.time(call="s3.put_object"):
+            s3.put_object(Bucket=OUTPUT_BUCKET, Key=out_key, Body=label.encode())
+    except ClientError as e:
+        print(f"[backend] S3 put_object failed for {out_key}:", e)
+        MESSAGES.inc(outcome="s3_put_failed")
+        return
+
+    send_response(request_id, label, trace)
+    sqs.delete_message(QueueUrl=REQ_URL, ReceiptHandle=receipt)
+    MESSAGES.inc(outcome="answered")
+
 def main():
     if not INPUT_BUCKET or not OUTPUT_BUCKET:
         raise RuntimeError("INPUT_BUCKET and OUTPUT_BUCKET must be set (or ASU_ID)")
+    metrics.configure("p1-backend")
     print("[backend] up; region=", REGION, "ASU_ID=", ASU_ID)
     idle_checks = 0
     while True:
@@ -95,40 +163,9 @@ def main():
                 continue
 
             idle_checks = 0
-            m = msgs[0]; receipt = m["ReceiptHandle"]
-            try:
-                body = json.loads(m.get("Body","{}"))
-            except: body = {}
-            request_id = str(body.get("request_id","") or "").strip()
-            s3_key     = str(body.get("s3_key","") or "").strip()
-            if not request_id or not s3_key:
-                print("[backend] invalid msg; deleting:", body)
-                sqs.delete_message(QueueUrl=REQ_URL, ReceiptHandle=receipt)
-                continue
-
-            try:
-                obj = s3.get_object(Bucket=INPUT_BUCKET, Key=s3_key)
-                img_bytes = obj["Body"].read()
-            except ClientError as e:
-                print(f"[backend] S3 get_object failed for {s3_key}:", e)
-                continue
-
-            try:
-                ensure_model()
-                label = str(PREDICT(img_bytes))
-            except Exception as e:
-                print("[backend] inference failed:", e)
-                continue
-
-            out_key = stem(s3_key)
-            try:
-                s3.put_object(Bucket=OUTPUT_BUCKET, Key=out_key, Body=label.encode())
-            except ClientError as e:
-                print(f"[backend] S3 put_object failed for {out_key}:", e)
-                continue
-
-            send_response(request_id, label)
-            sqs.delete_message(QueueUrl=REQ_URL, ReceiptHandle=receipt)
+            # One message per iteration; sampled by PROFILE_EVERY / SIGUSR2 (common/profiling.py)
+            with PROFILER.request():
+                handle_message(msgs[0])
 
         except Exception as e:
             print("[backend] loop error:", e)
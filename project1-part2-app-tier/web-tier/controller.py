@@ -1,5 +1,11 @@
 #!/usr/bin/env python3
-import os, time, boto3
+import os, sys, time
+
+# Shared helpers (common/) are copied next to this file on the instance; in a
+# repo checkout they live two directories up.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+import aws_clients  # noqa: E402
+
 ASU_ID = os.environ.get("ASU_ID", "").strip()
 REGION = os.environ.get("AWS_REGION", "us-east-1").strip() or "us-east-1"
 REQ_QUEUE_NAME = os.environ.get("REQ_QUEUE_NAME", "").strip() or (
@@ -8,8 +14,7 @@ REQ_QUEUE_NAME = os.environ.get("REQ_QUEUE_NAME", "").strip() or (
 REQ_QUEUE_URL = os.environ.get("REQ_QUEUE_URL", "").strip() or None
 MAX_APP = 15
 NAME_PREFIX = "app-tier-instance-"
-session = boto3.Session(region_name=REGION)
-sqs = session.client("sqs"); ec2 = session.client("ec2")
+sqs = aws_clients.client("sqs", region_name=REGION); ec2 = aws_clients.client("ec2", region_name=REGION)
 
 def qurl(n): return sqs.get_queue_url(QueueName=n)["QueueUrl"]
 def qdepth(u):
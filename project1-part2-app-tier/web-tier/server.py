@@ -1,10 +1,15 @@
 #!/usr/bin/env python3
-import os, json, uuid, time, threading, queue
-import boto3
+import os, sys, json, uuid, time, threading, queue
 from flask import Flask, request, Response
 from werkzeug.utils import secure_filename
 from botocore.exceptions import ClientError
 
+# Shared helpers (common/) are copied next to this file on the instance; in a
+# repo checkout they live two directories up.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+import aws_clients  # noqa: E402
+import metrics  # noqa: E402
+
 ASU_ID = os.environ.get("ASU_ID", "").strip()
 REGION = os.environ.get("AWS_REGION", "us-east-1").strip() or "us-east-1"
 INPUT_BUCKET = os.environ.get("INPUT_BUCKET", "").strip() or (
@@ -26,11 +31,20 @@ RESP_QUEUE_ATTRS = {"ReceiveMessageWaitTimeSeconds": "20", "VisibilityTimeout":
 RESPONSE_TIMEOUT_SEC = 300
 PORT = int(os.environ.get("CSE546_WEB_PORT", "8000"))
 
-session = boto3.Session(region_name=REGION)
-s3 = session.client("s3")
-sqs = session.client("sqs")
+# Flask runs a thread per request (plus the dispatcher's long poll); the
+# shared clients' pools are sized for that (see common/aws_clients.py)
+AWS_CONCURRENCY = int(os.environ.get("AWS_CONCURRENCY", "64"))
+s3 = aws_clients.client("s3", region_name=REGION, concurrency=AWS_CONCURRENCY)
+sqs = aws_clients.client("sqs", region_name=REGION, concurrency=AWS_CONCURRENCY + 1)
 app = Flask(__name__)
 
+# Metrics (METRICS_PORT / METRICS_DUMP_SECS, see common/metrics.py); requests
+# carry a trace the backend extends, observed here when the answer arrives
+metrics.configure("p1-app-web")
+REQUESTS = metrics.registry.counter("requests_total", "POST / by HTTP status")
+REQUEST_MS = metrics.registry.histogram("request_ms", "POST / handling time")
+AWS_MS = metrics.registry.histogram("aws_call_ms", "S3 / SQS call time")
+
 def ensure_bucket(name):
     try: s3.head_bucket(Bucket=name)
     except ClientError as e:
@@ -93,27 +107,39 @@ ensure_bucket(INPUT_BUCKET); ensure_bucket(OUTPUT_BUCKET)
 REQ_URL = resolve_queue_url(REQ_QUEUE_NAME, REQ_QUEUE_ATTRS, REQ_QUEUE_URL)
 RESP_URL = resolve_queue_url(RESP_QUEUE_NAME, RESP_QUEUE_ATTRS, RESP_QUEUE_URL)
 DISP = Dispatcher(RESP_URL); DISP.start()
+metrics.registry.gauge("waiting_requests", "requests waiting for a response").set_function(lambda: len(DISP.waiters))
 
 @app.route("/", methods=["POST"])
 def root():
+    started = time.perf_counter()
+    msg = metrics.mark({}, "web.recv")
+    resp = handle_upload(msg)
+    REQUESTS.inc(status=resp.status_code)
+    REQUEST_MS.observe((time.perf_counter() - started) * 1000.0)
+    return resp
+
+def handle_upload(msg):
     if "inputFile" not in request.files:
         return Response("Missing 'inputFile'", status=400, mimetype="text/plain")
     f = request.files["inputFile"]; name = secure_filename(f.filename)
     if not name: return Response("Invalid filename", status=400, mimetype="text/plain")
 
     # 1) store input
-    f.seek(0); s3.put_object(Bucket=INPUT_BUCKET, Key=name, Body=f.read())
+    f.seek(0)
+    with AWS_MS.time(call="s3.put_object"): s3.put_object(Bucket=INPUT_BUCKET, Key=name, Body=f.read())
 
     # 2) send small request (<= 1KB)
-    rid=str(uuid.uuid4()); body=json.dumps({"request_id": rid, "s3_key": name})
+    rid=str(uuid.uuid4()); msg.update(request_id=rid, s3_key=name)
+    body=json.dumps(metrics.mark(msg, "web.enqueue"))
     if len(body.encode())>1024: return Response("Message too large", status=500, mimetype="text/plain")
-    sqs.send_message(QueueUrl=REQ_URL, MessageBody=body)
+    with AWS_MS.time(call="sqs.send_message"): sqs.send_message(QueueUrl=REQ_URL, MessageBody=body)
 
     # 3) wait for response
     waiter=DISP.add_waiter(rid)
     try: payload=waiter.get(timeout=RESPONSE_TIMEOUT_SEC)
     except queue.Empty: return Response("Timed out waiting for result", status=504, mimetype="text/plain")
 
+    metrics.observe_trace(metrics.mark(payload, "web.respond").get("trace"))
     label=payload.get("prediction","Unknown")
     return Response(f"{stem(name)}:{label}", status=200, mimetype="text/plain")
 
@@ -1,22 +1,109 @@
 import os
+import sys
 import json
 import base64
 import io
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-import boto3
-import numpy as np
-from facenet_pytorch import MTCNN
-from PIL import Image
+# Shared helpers (common/) are packaged next to this file; in a repo checkout
+# they live two directories up.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from init_profile import InitProfile  # noqa: E402
+import metrics  # noqa: E402
+import profiling  # noqa: E402
 
 # ---------- GLOBALS ----------
 
-sqs = boto3.client("sqs")
+_init = InitProfile("fd_lambda")
+
+
+def _make_sqs_client():
+    with _init.phase("sqs_client"):
+        import aws_clients
+
+        # Cached for the container's lifetime: warm invocations reuse the
+        # client and its kept-alive connections
+        return aws_clients.client("sqs")
+
+
+# boto3 import + client setup overlaps with the torch / MTCNN init below
+_init_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="init")
+_sqs_future = _init_pool.submit(_make_sqs_client)
+
+with _init.phase("import"):
+    from facenet_pytorch import MTCNN
+    from PIL import Image
+
+    import face_payload
+    from fast_detect import FastDetector, detect_all, detect_best
 
 # Get request queue URL from env
 REQUEST_QUEUE_URL = os.environ.get("REQUEST_QUEUE_URL")
 
+# Face wire format sent to recognition: "v2" (lossless, native size) or "v1" (legacy JPEG)
+FACE_WIRE_FORMAT = os.environ.get("FACE_WIRE_FORMAT", "v2").strip().lower() or "v2"
+
+# v2 crop size. 240 matches the baseline crops the gallery was enrolled from;
+# 160 (InceptionResnetV1's native input) is cheaper but needs a gallery
+# enrolled at 160. v1 always crops at 240.
+FACE_SIZE = int(os.environ.get("FACE_SIZE", "240"))
+
+# Fast detection: decode large JPEGs at reduced scale (DCT-domain), detect on
+# an image of at most DETECT_MAX_SIDE px, crop from the full-resolution frame.
+# MIN_FACE_SIZE is in full-resolution pixels either way.
+FAST_DETECT = os.environ.get("FAST_DETECT", "0") == "1"
+DETECT_MAX_SIDE = int(os.environ.get("DETECT_MAX_SIDE", "640"))
+MIN_FACE_SIZE = int(os.environ.get("MIN_FACE_SIZE", "20"))
+
+# Multi-face mode: every face with probability >= MULTI_FACE_MIN_PROB (at
+# most MULTI_FACE_MAX, largest first) goes to recognition in one "faces"
+# message per frame, split only if it would exceed the SQS size limit
+MULTI_FACE = os.environ.get("MULTI_FACE", "0") == "1"
+MULTI_FACE_MIN_PROB = float(os.environ.get("MULTI_FACE_MIN_PROB", "0.9"))
+MULTI_FACE_MAX = int(os.environ.get("MULTI_FACE_MAX", "16"))
+
+# Batched invocations: a body with a "frames" array of {content, request_id,
+# filename} is detected in one MTCNN pass (per frame size) and its faces are
+# enqueued with send_message_batch. At most MAX_FRAMES_PER_REQUEST frames.
+MAX_FRAMES_PER_REQUEST = int(os.environ.get("MAX_FRAMES_PER_REQUEST", "32"))
+
+# SQS limits for one send_message_batch call
+SQS_BATCH_ENTRIES = 10
+SQS_BATCH_BYTES = 256 * 1024
+
+# Metrics: METRICS_DUMP_SECS logs a "[metrics] {...}" line at most this often
+# (checked at the end of each invocation). Messages carry a "trace" the
+# recognition Lambda extends (see common/metrics.py).
+metrics.configure("fd_lambda", background=False)
+_FRAMES = metrics.registry.counter("frames_total", "frames by outcome")
+_DETECT_MS = metrics.registry.histogram("detect_ms", "face detection time per invocation")
+
+# Handler profiling: PROFILE_EVERY=N or PROFILE_ON_START=1 (see common/profiling.py)
+_profiler = profiling.Profiler("fd_lambda")
+
+# Run MTCNN once on a blank frame at init so the first request doesn't pay
+# for lazy allocations
+WARMUP_ON_INIT = os.environ.get("WARMUP_ON_INIT", "1") == "1"
+
 # One MTCNN instance reused across invocations
-mtcnn = MTCNN(image_size=240, margin=0, min_face_size=20)
+with _init.phase("mtcnn"):
+    mtcnn = MTCNN(
+        image_size=FACE_SIZE if FACE_WIRE_FORMAT == "v2" else 240,
+        margin=0,
+        min_face_size=MIN_FACE_SIZE,
+    )
+    fast = FastDetector(mtcnn, DETECT_MAX_SIDE, MIN_FACE_SIZE) if FAST_DETECT else None
+
+if WARMUP_ON_INIT:
+    with _init.phase("warmup"):
+        mtcnn(Image.new("RGB", (320, 240)), return_prob=True)
+
+with _init.phase("wait_background"):
+    sqs = _sqs_future.result()
+_init_pool.shutdown(wait=False)
+
+_init.report()
 
 
 def _extract_body(event):
@@ -31,7 +118,172 @@ def _extract_body(event):
         return event
 
 
+def _open_frame(img_bytes: bytes):
+    """Decoded frame for _detect_faces(): a FastDetector Frame in fast mode, else an RGB image."""
+    if fast is not None:
+        return fast.open(img_bytes)
+    return Image.open(io.BytesIO(img_bytes)).convert("RGB")
+
+
+def _detect_faces(opened):
+    """
+    [(face, box, prob), ...] for each _open_frame() frame: the single face
+    MTCNN picks, or every face above MULTI_FACE_MIN_PROB in multi-face mode.
+    Frames of equal size share one MTCNN call.
+    """
+    if fast is not None:
+        if MULTI_FACE:
+            found = fast.detect_all(opened, MULTI_FACE_MIN_PROB, MULTI_FACE_MAX)
+        else:
+            found = [[(box, prob)] if box is not None else [] for box, prob in fast.detect(opened)]
+        results = []
+        for frame, faces_found in zip(opened, found):
+            faces = fast.crop_many(frame, [box for box, _ in faces_found])
+            results.append([
+                (face, fast.full_box(frame, box), prob)
+                for face, (box, prob) in zip(faces, faces_found)
+            ])
+        return results
+
+    imgs = opened
+    results = [None] * len(imgs)
+    by_size = {}
+    for i, img in enumerate(imgs):
+        by_size.setdefault(img.size, []).append(i)
+    for idxs in by_size.values():
+        group = [imgs[i] for i in idxs]
+        if MULTI_FACE:
+            found = detect_all(mtcnn, group, MULTI_FACE_MIN_PROB, MULTI_FACE_MAX)
+        else:
+            found = [[(box, prob)] if box is not None else [] for box, prob in detect_best(mtcnn, group)]
+        for i, faces_found in zip(idxs, found):
+            results[i] = [
+                (mtcnn.extract(imgs[i], box.reshape(1, 4), None), box, prob)
+                for box, prob in faces_found
+            ]
+    return results
+
+
+def _start_trace(body: dict, received_ms: float) -> dict:
+    """The frame's trace (the client's well-formed marks, if any) plus receipt here."""
+    return metrics.mark({"trace": metrics.clean_trace(body.get("trace"))}, "fd.recv", received_ms)
+
+
+def _build_messages(request_id: str, filename: str, found, traced: dict):
+    """SQS message bodies for a frame's faces (one, unless multi-face spills over)."""
+    if not MULTI_FACE:
+        face = found[0][0]
+        msg = {
+            "request_id": request_id,
+            "filename": filename,
+            **face_payload.encode(face, FACE_WIRE_FORMAT),
+            "trace": list(traced["trace"]),
+        }
+        return [metrics.mark(msg, "fd.enqueue")]
+
+    parts = face_payload.encode_faces(
+        [f for f, _, _ in found], [b for _, b, _ in found], [p for _, _, p in found],
+        FACE_WIRE_FORMAT,
+    )
+    msgs = []
+    for i, fields in enumerate(parts):
+        msg = {"request_id": request_id, "filename": filename, **fields, "trace": list(traced["trace"])}
+        if len(parts) > 1:
+            msg["part"] = [i + 1, len(parts)]
+        msgs.append(metrics.mark(msg, "fd.enqueue"))
+    return msgs
+
+
+def _send_batches(bodies):
+    """
+    Enqueue message bodies with as few send_message_batch calls as the SQS
+    limits allow. Returns {index: error} for the bodies that were not sent.
+    """
+    failed = {}
+    chunks, current, size = [], [], 0
+    for i, body in enumerate(bodies):
+        if current and (len(current) == SQS_BATCH_ENTRIES or size + len(body) > SQS_BATCH_BYTES):
+            chunks.append(current)
+            current, size = [], 0
+        current.append(i)
+        size += len(body)
+    if current:
+        chunks.append(current)
+
+    for chunk in chunks:
+        try:
+            resp = sqs.send_message_batch(
+                QueueUrl=REQUEST_QUEUE_URL,
+                Entries=[{"Id": str(i), "MessageBody": bodies[i]} for i in chunk],
+            )
+        except Exception as e:
+            print(f"[FD] send_message_batch failed: {e}")
+            failed.update((i, str(e)) for i in chunk)
+            continue
+        for f in resp.get("Failed", []):
+            failed[int(f["Id"])] = f"{f.get('Code')}: {f.get('Message')}"
+    return failed
+
+
+def _handle_frames(frames, received_ms: float):
+    """
+    Batched invocation: detect across all frames, enqueue every face with
+    send_message_batch and report a status per frame.
+    """
+    statuses = []
+    decoded = []    # (status index, opened frame)
+    for frame in frames:
+        status = {"request_id": None}
+        statuses.append(status)
+        try:
+            status["request_id"] = frame["request_id"]
+            decoded.append((len(statuses) - 1, _open_frame(base64.b64decode(frame["content"]))))
+        except Exception as e:
+            status.update(status="error", error=f"bad frame: {e}")
+
+    with _DETECT_MS.time(batch="frames"):
+        found = _detect_faces([frame for _, frame in decoded]) if decoded else []
+
+    bodies, owners = [], []
+    for (idx, _), faces in zip(decoded, found):
+        status = statuses[idx]
+        if not faces:
+            status.update(status="no_face", message="no face detected")
+            continue
+        status.update(status="queued", faces=len(faces))
+        filename = frames[idx].get("filename", "frame.jpg")
+        traced = metrics.mark(_start_trace(frames[idx], received_ms), "fd.detect")
+        for msg in _build_messages(status["request_id"], filename, faces, traced):
+            bodies.append(json.dumps(msg))
+            owners.append(idx)
+
+    failed = _send_batches(bodies)
+    for i, error in failed.items():
+        statuses[owners[i]].update(status="error", error=error)
+
+    queued = sum(1 for s in statuses if s["status"] == "queued")
+    for s in statuses:
+        _FRAMES.inc(outcome=s["status"])
+    print(
+        f"[FD] batch: frames={len(frames)} queued={queued} messages={len(bodies)} "
+        f"send_failures={len(failed)}"
+    )
+    return {
+        "statusCode": 200,
+        "body": json.dumps({"frames": statuses, "queued": queued}),
+    }
+
+
 def lambda_handler(event, context):
+    try:
+        with _profiler.request():
+            return _handle(event)
+    finally:
+        metrics.registry.maybe_dump()
+
+
+def _handle(event):
+    received_ms = time.time() * 1000.0
     if not REQUEST_QUEUE_URL:
         return {
             "statusCode": 500,
@@ -40,19 +292,30 @@ def lambda_handler(event, context):
     try:
         body = _extract_body(event)
 
+        if "frames" in body:
+            frames = body["frames"]
+            if not isinstance(frames, list) or not 0 < len(frames) <= MAX_FRAMES_PER_REQUEST:
+                return {
+                    "statusCode": 400,
+                    "body": json.dumps({
+                        "error": f"frames must be a list of 1 to {MAX_FRAMES_PER_REQUEST} frames",
+                    }),
+                }
+            return _handle_frames(frames, received_ms)
+
         content_b64 = body["content"]
         request_id = body["request_id"]
         filename = body.get("filename", "frame.jpg")
 
         # ------------ Decode image ------------
         img_bytes = base64.b64decode(content_b64)
-        img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-        img = Image.fromarray(np.array(img))
 
         # ------------ Run face detection ------------
-        face, prob = mtcnn(img, return_prob=True, save_path=None)
+        with _DETECT_MS.time(batch="single"):
+            (found,) = _detect_faces([_open_frame(img_bytes)])
 
-        if face is None:
+        if not found:
+            _FRAMES.inc(outcome="no_face")
             return {
                 "statusCode": 200,
                 "body": json.dumps(
@@ -63,51 +326,37 @@ def lambda_handler(event, context):
                 ),
             }
 
-        # Normalize tensor -> uint8 image
-        face_img = face - face.min()
-        face_img = face_img / face_img.max()
-        face_img = (face_img * 255).byte().permute(1, 2, 0).numpy()
-
-        face_pil = Image.fromarray(face_img, mode="RGB")
-
-        # Resize smaller to keep message body well under SQS limits
-        face_pil = face_pil.resize((160, 160))
-
-        buf = io.BytesIO()
-        # JPEG at moderate quality to keep it compact
-        face_pil.save(buf, format="JPEG", quality=70, optimize=True)
-        face_bytes = buf.getvalue()
-        face_b64 = base64.b64encode(face_bytes).decode("utf-8")
-
-        # Build *small* SQS message
-        msg = {
-            "request_id": request_id,
-            "filename": filename,
-            "face_image": face_b64,
-        }
-
-        message_body = json.dumps(msg)
+        # Build *small* SQS message(s) (crops + encode timing)
+        traced = metrics.mark(_start_trace(body, received_ms), "fd.detect")
+        for msg in _build_messages(request_id, filename, found, traced):
+            message_body = json.dumps(msg)
 
-        # Optional: log size in CloudWatch for debugging
-        print(f"[FD] MessageBody length: {len(message_body)} bytes")
+            # Optional: log size in CloudWatch for debugging
+            print(
+                f"[FD] MessageBody length: {len(message_body)} bytes "
+                f"(format={FACE_WIRE_FORMAT}, encode_ms={msg['timing']['encode_ms']})"
+            )
 
-        sqs.send_message(
-            QueueUrl=REQUEST_QUEUE_URL,
-            MessageBody=message_body,
-        )
+            sqs.send_message(
+                QueueUrl=REQUEST_QUEUE_URL,
+                MessageBody=message_body,
+            )
 
+        _FRAMES.inc(outcome="queued")
         return {
             "statusCode": 200,
             "body": json.dumps(
                 {
                     "request_id": request_id,
-                    "message": "face queued for recognition",
+                    "message": "face queued for recognition" if len(found) == 1
+                    else f"{len(found)} faces queued for recognition",
                 }
             ),
         }
 
     except Exception as e:
         print(f"[FD] ERROR: {e}")
+        _FRAMES.inc(outcome="error")
         return {
             "statusCode": 500,
             "body": json.dumps({"error": str(e)}),
@@ -0,0 +1,211 @@
+"""
+Persistent, time-windowed request-id dedup for the FaceDetection component.
+
+A ring of `generations` Bloom filters lives in one memory-mapped file, so
+the seen-set survives component restarts (the moment the workload
+generator retries) in a fixed memory budget. Ids go into the current
+generation; lookups check all of them. Every window / (generations - 1)
+seconds the oldest generation is cleared and becomes the current one, so
+an id is remembered for at least `window_secs` (and at most
+window * generations / (generations - 1)).
+
+Each generation is sized for `capacity` ids at false-positive rate
+`fp_rate` (1M ids at 1e-4 is ~2.4 MB). A false positive drops a frame as a
+duplicate; ids are never missed.
+
+reserve() is check-and-insert under one lock, so of two concurrent copies of
+a request exactly one gets through. A Bloom filter can't delete, so
+release() (processing failed, let a retry through) keeps a small in-memory
+allow-list instead; it doesn't survive a restart.
+"""
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import deque
+
+_MAGIC = b"FDDEDUP1"
+# magic, gens, k, current generation, bits per generation
+_HEADER = struct.Struct("<8sIIIQ")
+# per generation: start time, ids inserted
+_GEN = struct.Struct("<dQ")
+# Bit arrays start page-aligned after the header
+_DATA_OFFSET = 4096
+
+# Released ids remembered at once
+_MAX_RELEASED = 10000
+
+
+def bloom_params(capacity: int, fp_rate: float):
+    """(bits, hash count) for `capacity` ids at false-positive rate `fp_rate`."""
+    bits = math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))
+    bits = (bits + 7) // 8 * 8
+    k = max(1, round(bits / capacity * math.log(2)))
+    return bits, k
+
+
+class DedupStore:
+    def __init__(
+        self,
+        path: str,
+        window_secs: float = 3600.0,
+        capacity: int = 1_000_000,
+        fp_rate: float = 1e-4,
+        generations: int = 4,
+    ):
+        self.path = path
+        self.window_secs = window_secs
+        self.generations = max(2, generations)
+        self.rotate_secs = window_secs / (self.generations - 1)
+        self.bits, self.k = bloom_params(capacity, fp_rate)
+        self.capacity = capacity
+        self._gen_bytes = self.bits // 8
+
+        self._lock = threading.Lock()
+        self._released = set()
+        self._released_order = deque()
+
+        # Stats since the last stats() call (guarded by _lock)
+        self._reserved = 0
+        self._duplicates = 0
+
+        self._mm = self._open()
+        self._rotate(time.time())
+
+    # ---------- file layout ----------
+
+    def _size(self) -> int:
+        return _DATA_OFFSET + self.generations * self._gen_bytes
+
+    def _open(self) -> mmap.mmap:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fresh = os.fstat(fd).st_size != self._size()
+            if not fresh:
+                with os.fdopen(os.dup(fd), "rb") as f:
+                    magic, gens, k, _, bits = _HEADER.unpack(f.read(_HEADER.size))
+                fresh = (magic, gens, k, bits) != (_MAGIC, self.generations, self.k, self.bits)
+                if fresh:
+                    print(f"[dedup] {self.path} has a different layout; starting empty", flush=True)
+            if fresh:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, self._size())
+            mm = mmap.mmap(fd, self._size())
+        finally:
+            os.close(fd)
+
+        if fresh:
+            _HEADER.pack_into(mm, 0, _MAGIC, self.generations, self.k, 0, self.bits)
+            _GEN.pack_into(mm, _HEADER.size, time.time(), 0)
+            mm.flush()
+        return mm
+
+    def _current(self) -> int:
+        return _HEADER.unpack_from(self._mm, 0)[3]
+
+    def _gen_info(self, gen: int):
+        return _GEN.unpack_from(self._mm, _HEADER.size + gen * _GEN.size)
+
+    def _set_gen_info(self, gen: int, started: float, count: int) -> None:
+        _GEN.pack_into(self._mm, _HEADER.size + gen * _GEN.size, started, count)
+
+    def _rotate(self, now: float) -> None:
+        """Advance generations for the time elapsed (also across restarts)."""
+        current = self._current()
+        started, _ = self._gen_info(current)
+        steps = int((now - started) // self.rotate_secs) if now > started else 0
+        if steps <= 0:
+            return
+        for i in range(min(steps, self.generations)):
+            gen = (current + 1 + i) % self.generations
+            off = _DATA_OFFSET + gen * self._gen_bytes
+            self._mm[off:off + self._gen_bytes] = bytes(self._gen_bytes)
+            self._set_gen_info(gen, 0.0, 0)
+        current = (current + steps) % self.generations
+        self._set_gen_info(current, started + steps * self.rotate_secs, 0)
+        _HEADER.pack_into(self._mm, 0, _MAGIC, self.generations, self.k, current, self.bits)
+        self._mm.flush()
+
+    # ---------- Bloom filter ----------
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1, h2 = struct.unpack("<QQ", digest)
+        h2 |= 1
+        return [(h1 + i * h2) % self.bits for i in range(self.k)]
+
+    def _contains(self, gen: int, positions) -> bool:
+        base = _DATA_OFFSET + gen * self._gen_bytes
+        mm = self._mm
+        return all(mm[base + (p >> 3)] & (1 << (p & 7)) for p in positions)
+
+    def _insert(self, gen: int, positions) -> None:
+        base = _DATA_OFFSET + gen * self._gen_bytes
+        mm = self._mm
+        for p in positions:
+            i = base + (p >> 3)
+            mm[i] = mm[i] | (1 << (p & 7))
+        started, count = self._gen_info(gen)
+        self._set_gen_info(gen, started, count + 1)
+
+    # ---------- public API ----------
+
+    def reserve(self, request_id: str) -> bool:
+        """
+        Atomically record `request_id`. True the first time it is seen in the
+        window (process it), False for a duplicate.
+        """
+        positions = self._positions(request_id)
+        with self._lock:
+            self._rotate(time.time())
+            if request_id in self._released:
+                self._released.discard(request_id)
+                self._reserved += 1
+                return True
+            if any(self._contains(g, positions) for g in range(self.generations)):
+                self._duplicates += 1
+                return False
+            self._insert(self._current(), positions)
+            self._reserved += 1
+            return True
+
+    def release(self, request_id: str) -> None:
+        """Let the next copy of `request_id` through again (its processing failed)."""
+        with self._lock:
+            if request_id in self._released:
+                return
+            self._released.add(request_id)
+            self._released_order.append(request_id)
+            if len(self._released_order) > _MAX_RELEASED:
+                self._released.discard(self._released_order.popleft())
+
+    def close(self) -> None:
+        with self._lock:
+            self._mm.flush()
+            self._mm.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            current = self._current()
+            count = self._gen_info(current)[1]
+            total = sum(self._gen_info(g)[1] for g in range(self.generations))
+            # Per-generation FP rate at its fill level; a lookup checks all of them
+            fp = 1.0 - math.prod(
+                1.0 - (1.0 - math.exp(-self.k * self._gen_info(g)[1] / self.bits)) ** self.k
+                for g in range(self.generations)
+            )
+            out = {
+                "window_secs": self.window_secs,
+                "ids_in_window": total,
+                "current_fill": count / self.capacity,
+                "est_false_positive_rate": fp,
+                "file_bytes": self._size(),
+                "reserved": self._reserved,
+                "duplicates": self._duplicates,
+            }
+            self._reserved = self._duplicates = 0
+            return out
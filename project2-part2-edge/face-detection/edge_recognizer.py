@@ -0,0 +1,65 @@
+"""
+Recognition on the Greengrass core: the same InceptionResnetV1 + gallery
+match as the recognition Lambda (common/inference.py, common/gallery.py),
+fed straight from the MTCNN crop instead of an SQS message.
+
+The face goes through face_payload.model_input(), so local and cloud
+recognition see bit-identical inputs for v2 payloads.
+"""
+import time
+
+import torch
+
+import face_payload
+from gallery import Gallery
+from gallery_store import LiveGallery, open_store
+from inference import load_resnet
+
+
+class EdgeRecognizer:
+    def __init__(
+        self,
+        weights_path: str,
+        gallery_mode: str = "float32",
+        store_uri: str = "",
+        refresh_secs: float = 30.0,
+        top_k: int = 1,
+        threshold=None,
+        image_size: int = 240,
+        pretrained="vggface2",
+    ):
+        self.top_k = top_k
+        self.threshold = threshold
+        self._gallery = LiveGallery(
+            Gallery.from_weights(weights_path, mode=gallery_mode),
+            open_store(store_uri) if store_uri else None,
+            refresh_secs=refresh_secs,
+        )
+        # RESNET_ARTIFACT / RESNET_BACKEND as in the Lambda. load_resnet() sizes
+        # torch threads for a dedicated host; keep the component's split
+        # between MTCNN workers instead.
+        threads = torch.get_num_threads()
+        self._resnet = load_resnet(image_size=image_size, pretrained=pretrained)
+        torch.set_num_threads(threads)
+
+    def __len__(self) -> int:
+        return len(self._gallery.current())
+
+    def recognize(self, face: torch.Tensor):
+        """Top-k Match(label, distance) for one MTCNN face, plus the time it took in ms."""
+        started = time.perf_counter()
+        x = face_payload.model_input(face)
+        # Shared by the pool workers like the MTCNN instance (inference only)
+        with torch.no_grad():
+            emb = self._resnet(x)[0].float()
+        matches = self._gallery.current().match(emb, k=self.top_k, threshold=self.threshold)
+        return matches, (time.perf_counter() - started) * 1000.0
+
+    def recognize_many(self, faces):
+        """Top-k matches for each face of one frame in a single forward pass, plus the time in ms."""
+        started = time.perf_counter()
+        x = torch.cat([face_payload.model_input(f) for f in faces])
+        with torch.no_grad():
+            emb = self._resnet(x).float()
+        per_face = self._gallery.current().match_many(emb, k=self.top_k, threshold=self.threshold)
+        return per_face, (time.perf_counter() - started) * 1000.0
@@ -0,0 +1,167 @@
+"""
+Lightweight face tracker for the FaceDetection component.
+
+Faces in consecutive frames of a stream are associated by box IoU plus a
+small appearance signature (8x8 grayscale thumbnail of the crop, compared by
+cosine similarity). A track learns its label from recognition feedback;
+later frames in the track are then answered on the edge with that label
+until the track breaks (no matching face for `max_gap_secs`) or the label
+is older than `reverify_secs`, at which point the next frame goes back to
+the cloud for a fresh recognition. "Unknown" is never cached: an
+unrecognized face keeps going to recognition, so it is picked up as soon as
+it is enrolled (or seen from a better angle).
+"""
+import itertools
+import threading
+import time
+
+import torch
+import torch.nn.functional as F
+
+from gallery import UNKNOWN_LABEL
+
+_SIGNATURE_SIZE = 8
+
+
+def signature(face: torch.Tensor) -> torch.Tensor:
+    """Zero-mean, unit-norm 8x8 grayscale thumbnail of a (3, H, W) face crop."""
+    gray = face.float().mean(dim=0, keepdim=True).unsqueeze(0)
+    sig = F.adaptive_avg_pool2d(gray, _SIGNATURE_SIZE).flatten()
+    sig = sig - sig.mean()
+    return sig / sig.norm().clamp_min(1e-6)
+
+
+def box_iou(a, b) -> float:
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class _Track:
+    __slots__ = ("track_id", "stream", "box", "sig", "last_seen", "label", "label_time")
+
+    def __init__(self, track_id, stream, box, sig, now):
+        self.track_id = track_id
+        self.stream = stream
+        self.box = box
+        self.sig = sig
+        self.last_seen = now
+        self.label = None
+        self.label_time = None
+
+
+class FaceTracker:
+    def __init__(
+        self,
+        iou_min: float = 0.3,
+        similarity_min: float = 0.7,
+        max_gap_secs: float = 2.0,
+        reverify_secs: float = 10.0,
+    ):
+        self.iou_min = iou_min
+        self.similarity_min = similarity_min
+        self.max_gap_secs = max_gap_secs
+        self.reverify_secs = reverify_secs
+
+        self._tracks = {}      # track_id -> _Track
+        self._ids = itertools.count(1)
+        self._prefix = f"{int(time.time()):x}"
+        self._lock = threading.Lock()
+
+        # Stats since the last stats() call (guarded by _lock)
+        self._faces = 0
+        self._local = 0
+        self._new_tracks = 0
+        self._labels = 0
+
+    def _expire(self, now: float) -> None:
+        for tid in [t.track_id for t in self._tracks.values() if now - t.last_seen > self.max_gap_secs]:
+            del self._tracks[tid]
+
+    def update(self, stream: str, box, face: torch.Tensor):
+        """
+        Associate one detected face with a track of `stream`.
+        Returns (track_id, label); label is None unless the frame can be
+        answered locally.
+        """
+        return self.update_many(stream, [box], [face])[0]
+
+    def update_many(self, stream: str, boxes, faces):
+        """
+        update() for all faces of one frame: [(track_id, label), ...] in
+        order. Pairs are matched best IoU first and each track takes at most
+        one face of the frame.
+        """
+        boxes = [[float(v) for v in box] for box in boxes]
+        sigs = [signature(face) for face in faces]
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            self._faces += len(boxes)
+
+            pairs = []
+            for t in self._tracks.values():
+                if t.stream != stream:
+                    continue
+                for i, (box, sig) in enumerate(zip(boxes, sigs)):
+                    iou = box_iou(t.box, box)
+                    if iou >= self.iou_min and float(torch.dot(t.sig, sig)) >= self.similarity_min:
+                        pairs.append((iou, i, t))
+            pairs.sort(key=lambda p: p[0], reverse=True)
+
+            matched, taken = {}, set()
+            for _, i, t in pairs:
+                if i not in matched and t.track_id not in taken:
+                    matched[i] = t
+                    taken.add(t.track_id)
+
+            out = []
+            for i, (box, sig) in enumerate(zip(boxes, sigs)):
+                best = matched.get(i)
+                if best is None:
+                    best = _Track(f"{self._prefix}-{next(self._ids)}", stream, box, sig, now)
+                    self._tracks[best.track_id] = best
+                    self._new_tracks += 1
+                    out.append((best.track_id, None))
+                    continue
+                best.box, best.sig, best.last_seen = box, sig, now
+                if best.label is not None and now - best.label_time < self.reverify_secs:
+                    self._local += 1
+                    out.append((best.track_id, best.label))
+                else:
+                    out.append((best.track_id, None))
+            return out
+
+    def learn(self, track_id: str, label: str) -> bool:
+        """
+        Attach a recognized label to a live track. False if the track is gone.
+        UNKNOWN_LABEL clears the track's label instead of caching it.
+        """
+        with self._lock:
+            t = self._tracks.get(track_id)
+            if t is None:
+                return False
+            if label == UNKNOWN_LABEL:
+                t.label, t.label_time = None, None
+                return True
+            t.label, t.label_time = label, time.monotonic()
+            self._labels += 1
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire(time.monotonic())
+            faces = self._faces
+            out = {
+                "active_tracks": len(self._tracks),
+                "labeled_tracks": sum(1 for t in self._tracks.values() if t.label is not None),
+                "faces": faces,
+                "answered_locally": self._local,
+                "local_ratio": self._local / faces if faces else None,
+                "new_tracks": self._new_tracks,
+                "labels_learned": self._labels,
+            }
+            self._faces = self._local = self._new_tracks = self._labels = 0
+            return out
@@ -1,24 +1,56 @@
 import os
+import sys
 import json
 import base64
 import io
+import threading
 import time
-from collections import deque
 
-import boto3
-import numpy as np
+import torch
 from PIL import Image
 
-# Greengrass IPC for Pubsub
-import awsiot.greengrasscoreipc
-from awsiot.greengrasscoreipc import client as gg_client
-from awsiot.greengrasscoreipc.model import (
-    SubscribeToTopicRequest,
-    SubscriptionResponseMessage,
-)
+# Greengrass IPC for Pubsub. IPC_BACKEND=local swaps in the in-process
+# stand-in (local_ipc.py) to run / test the component without a nucleus.
+if os.environ.get("IPC_BACKEND", "greengrass").strip().lower() == "local":
+    import local_ipc as gg_ipc
+    from local_ipc import SubscribeToTopicStreamHandler
+    from local_ipc import (
+        BinaryMessage,
+        PublishMessage,
+        PublishToTopicRequest,
+        SubscribeToTopicRequest,
+        SubscriptionResponseMessage,
+    )
+else:
+    import awsiot.greengrasscoreipc as gg_ipc
+    from awsiot.greengrasscoreipc.client import SubscribeToTopicStreamHandler
+    from awsiot.greengrasscoreipc.model import (
+        BinaryMessage,
+        PublishMessage,
+        PublishToTopicRequest,
+        SubscribeToTopicRequest,
+        SubscriptionResponseMessage,
+    )
 
 from facenet_pytorch import MTCNN
 
+# Shared helpers (common/) are packaged next to this file; in a repo checkout
+# they live two directories up.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+import aws_clients  # noqa: E402
+import face_payload  # noqa: E402
+import metrics  # noqa: E402
+import profiling  # noqa: E402
+from fast_detect import FastDetector, detect_all, detect_best  # noqa: E402
+
+from frame_pool import FramePool  # noqa: E402
+from microbatch import MicroBatcher  # noqa: E402
+from motion_gate import MotionGate  # noqa: E402
+from face_tracker import FaceTracker  # noqa: E402
+from offload import OffloadScheduler  # noqa: E402
+from sqs_outbox import SqsOutbox  # noqa: E402
+from dedup_store import DedupStore  # noqa: E402
+
 # ---------- CONFIG ----------
 
 ASU_ID = os.environ.get("ASU_ID")
@@ -39,79 +71,444 @@ if not REQUEST_QUEUE_URL:
 # NEW: SQS response queue URL for bonus (No-Face short-circuit)
 RESPONSE_QUEUE_URL = os.environ.get("RESPONSE_QUEUE_URL")
 
+# Face wire format sent to recognition: "v2" (lossless, native size) or "v1" (legacy JPEG)
+FACE_WIRE_FORMAT = os.environ.get("FACE_WIRE_FORMAT", "v2").strip().lower() or "v2"
+
+# v2 crop size. 240 matches the baseline crops the gallery was enrolled from;
+# 160 (InceptionResnetV1's native input) is cheaper but needs a gallery
+# enrolled at 160. v1 always crops at 240.
+FACE_SIZE = int(os.environ.get("FACE_SIZE", "240"))
+
+# Frames are processed off the IPC callback thread by a worker pool fed from
+# a bounded queue. Overload policy: drop-oldest (live video), drop-newest, block.
+POOL_WORKERS = int(os.environ.get("POOL_WORKERS", "0")) or (os.cpu_count() or 1)
+POOL_QUEUE_SIZE = int(os.environ.get("POOL_QUEUE_SIZE", "32"))
+POOL_OVERLOAD_POLICY = os.environ.get("POOL_OVERLOAD_POLICY", "drop-oldest").strip().lower()
+
+# Micro-batched MTCNN: frames from concurrent workers are detected together,
+# up to DETECT_BATCH_SIZE per call, waiting at most DETECT_BATCH_WINDOW_MS for
+# the batch to fill. 1 = off. Batches can't exceed POOL_WORKERS in-flight frames.
+DETECT_BATCH_SIZE = int(os.environ.get("DETECT_BATCH_SIZE", "1"))
+DETECT_BATCH_WINDOW_MS = float(os.environ.get("DETECT_BATCH_WINDOW_MS", "20"))
+
+# Fast detection: decode large JPEGs at reduced scale (DCT-domain), detect on
+# an image of at most DETECT_MAX_SIDE px, crop from the full-resolution frame.
+# MIN_FACE_SIZE is in full-resolution pixels either way.
+FAST_DETECT = os.environ.get("FAST_DETECT", "0") == "1"
+DETECT_MAX_SIDE = int(os.environ.get("DETECT_MAX_SIDE", "640"))
+MIN_FACE_SIZE = int(os.environ.get("MIN_FACE_SIZE", "20"))
+
+# Multi-face mode: every face with probability >= MULTI_FACE_MIN_PROB (at
+# most MULTI_FACE_MAX, largest first) is tracked and recognized. A frame's
+# faces go to the cloud as one "faces" message (split only past the SQS size
+# limit) or through one local forward pass.
+MULTI_FACE = os.environ.get("MULTI_FACE", "0") == "1"
+MULTI_FACE_MIN_PROB = float(os.environ.get("MULTI_FACE_MIN_PROB", "0.9"))
+MULTI_FACE_MAX = int(os.environ.get("MULTI_FACE_MAX", "16"))
+
+# Motion gating: frames whose 32x32 grayscale thumbnail differs from the
+# stream's last detected frame by less than MOTION_THRESHOLD (mean abs diff,
+# 0-255) reuse that frame's outcome (No-Face or the face crop) instead of
+# running MTCNN; at most MOTION_MAX_REUSE times in a row. 0 = off.
+MOTION_THRESHOLD = float(os.environ.get("MOTION_THRESHOLD", "0"))
+MOTION_MAX_REUSE = int(os.environ.get("MOTION_MAX_REUSE", "10"))
+
+# Face tracking: set FEEDBACK_QUEUE_URL (the recognition Lambda's
+# FEEDBACK_QUEUE_URL) to track faces across frames by box IoU + appearance;
+# once a track's label comes back, its later frames are answered on the edge
+# until the track breaks (no match for TRACK_MAX_GAP_SECS) or REVERIFY_SECS pass.
+FEEDBACK_QUEUE_URL = os.environ.get("FEEDBACK_QUEUE_URL", "").strip()
+TRACK_IOU = float(os.environ.get("TRACK_IOU", "0.3"))
+TRACK_MIN_SIMILARITY = float(os.environ.get("TRACK_MIN_SIMILARITY", "0.7"))
+TRACK_MAX_GAP_SECS = float(os.environ.get("TRACK_MAX_GAP_SECS", "2"))
+REVERIFY_SECS = float(os.environ.get("REVERIFY_SECS", "10"))
+
+# Where faces are recognized: "cloud" (recognition Lambda), "local"
+# (InceptionResnetV1 + gallery on this device) or "adaptive" (per frame, from
+# local queue depth, CPU load and the cloud round trip measured via
+# FEEDBACK_QUEUE_URL; CLOUD_RTT_MS until the first one is observed).
+RECOGNITION_MODE = os.environ.get("RECOGNITION_MODE", "cloud").strip().lower() or "cloud"
+CLOUD_RTT_MS = float(os.environ.get("CLOUD_RTT_MS", "1000"))
+OFFLOAD_MAX_LOAD = float(os.environ.get("OFFLOAD_MAX_LOAD", "1.5"))
+OFFLOAD_PROBE_EVERY = int(os.environ.get("OFFLOAD_PROBE_EVERY", "20"))
+
+# Local recognition gallery / matching (same meaning as the recognition Lambda)
+WEIGHTS_PATH = os.environ.get(
+    "WEIGHTS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "resnetV1_video_weights_1.pt"),
+)
+GALLERY_MODE = os.environ.get("GALLERY_MODE", "float32").strip().lower() or "float32"
+MATCH_TOP_K = int(os.environ.get("MATCH_TOP_K", "1"))
+UNKNOWN_THRESHOLD = os.environ.get("UNKNOWN_THRESHOLD", "").strip()
+UNKNOWN_THRESHOLD = float(UNKNOWN_THRESHOLD) if UNKNOWN_THRESHOLD else None
+GALLERY_STORE = os.environ.get("GALLERY_STORE", "").strip()
+GALLERY_REFRESH_SECS = float(os.environ.get("GALLERY_REFRESH_SECS", "30"))
+
+# All SQS sends go through a batching outbox: up to 10 messages per
+# send_message_batch, waiting at most OUTBOX_WINDOW_MS for a batch to fill.
+# Undeliverable messages are spooled to OUTBOX_SPOOL (append-only JSONL) and
+# retried with backoff, up to OUTBOX_MAX_ATTEMPTS times.
+OUTBOX_WINDOW_MS = float(os.environ.get("OUTBOX_WINDOW_MS", "20"))
+OUTBOX_SPOOL = os.environ.get("OUTBOX_SPOOL", "").strip() or os.path.join(os.getcwd(), "outbox-spool.jsonl")
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "8"))
+
+# Request-id dedup: ids are remembered for DEDUP_WINDOW_SECS in a file at
+# DEDUP_PATH sized for DEDUP_CAPACITY ids per rotation at DEDUP_FP_RATE.
+DEDUP_PATH = os.environ.get("DEDUP_PATH", "").strip() or os.path.join(os.getcwd(), "dedup.bin")
+DEDUP_WINDOW_SECS = float(os.environ.get("DEDUP_WINDOW_SECS", "3600"))
+DEDUP_CAPACITY = int(os.environ.get("DEDUP_CAPACITY", "1000000"))
+DEDUP_FP_RATE = float(os.environ.get("DEDUP_FP_RATE", "0.0001"))
+
+# Results over local pub/sub instead of the SQS response queue: when
+# RESULT_TOPIC is set (e.g. "clients/{client}/results"; {client} is the
+# frame's client_id, default "<ASU_ID>-IoTThing"), edge results are published
+# there immediately and one shared consumer on the core relays cloud results
+# from RESPONSE_QUEUE_URL, so clients never poll SQS. Route the topic to IoT
+# Core with the MQTT bridge for off-device clients.
+RESULT_TOPIC = os.environ.get("RESULT_TOPIC", "").strip()
+
+# Queue depth / drops / latency are logged this often
+STATS_INTERVAL_SECS = float(os.environ.get("STATS_INTERVAL_SECS", "60"))
+
+# Metrics endpoint / JSON dump (METRICS_PORT, METRICS_DUMP_SECS; see
+# common/metrics.py). Frames' traces are extended here and observed when the
+# edge answers or the relay forwards a cloud result.
+metrics.configure("fd_component")
+_FRAMES = metrics.registry.counter("frames_total", "frames by outcome")
+_DETECT_MS = metrics.registry.histogram("detect_ms", "face detection time per frame")
+
+# Worker profiling: off unless PROFILE_EVERY / PROFILE_ON_START is set or
+# SIGUSR2 arrives (see common/profiling.py). With DETECT_BATCH_SIZE > 1 the
+# hook moves to the fd-mtcnn batch thread, where detection then runs.
+_profiler = profiling.Profiler("fd_component")
+
 # ---------- GLOBALS ----------
 
-# Use Greengrass IAM credentials; just pin region
-sqs = boto3.client("sqs", region_name=AWS_REGION)
+# Use Greengrass IAM credentials; just pin region. SQS calls come from the
+# outbox's two threads and the relay / feedback long polls, not the workers,
+# so the default pool covers them.
+sqs = aws_clients.client("sqs", region_name=AWS_REGION)
+_outbox = SqsOutbox(sqs, OUTBOX_SPOOL, window_ms=OUTBOX_WINDOW_MS, max_attempts=OUTBOX_MAX_ATTEMPTS)
+
+# Split the cores between workers instead of every worker's torch ops
+# fanning out across all of them. With micro-batching one thread runs all
+# MTCNN calls, so it gets every core.
+if DETECT_BATCH_SIZE > 1:
+    torch.set_num_threads(os.cpu_count() or 1)
+else:
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // POOL_WORKERS))
 
 # Same MTCNN config as Lambda
-mtcnn = MTCNN(image_size=240, margin=0, min_face_size=20)
+mtcnn = MTCNN(
+    image_size=FACE_SIZE if FACE_WIRE_FORMAT == "v2" else 240,
+    margin=0,
+    min_face_size=MIN_FACE_SIZE,
+)
+fast = FastDetector(mtcnn, DETECT_MAX_SIDE, MIN_FACE_SIZE) if FAST_DETECT else None
+
+
+def _detect_batch(imgs):
+    """
+    One MTCNN call per group of equal-size frames (MTCNN only batches
+    equal-dimension images). Returns each frame's [(face, prob, box), ...]
+    in order: at most one face, or every face in multi-face mode.
+    """
+    results = [None] * len(imgs)
+    by_size = {}
+    for i, img in enumerate(imgs):
+        by_size.setdefault(img.size, []).append(i)
+    for idxs in by_size.values():
+        group = [imgs[i] for i in idxs]
+        if MULTI_FACE:
+            found = detect_all(mtcnn, group, MULTI_FACE_MIN_PROB, MULTI_FACE_MAX)
+        else:
+            found = [[(box, prob)] if box is not None else [] for box, prob in detect_best(mtcnn, group)]
+        for i, faces in zip(idxs, found):
+            results[i] = [(mtcnn.extract(imgs[i], box.reshape(1, 4), None), prob, box) for box, prob in faces]
+    return results
+
+
+def _fast_detect_batch(frames):
+    """Box search only: each frame's [(box, prob), ...] in reduced-image coordinates."""
+    if MULTI_FACE:
+        return fast.detect_all(frames, MULTI_FACE_MIN_PROB, MULTI_FACE_MAX)
+    return [[(box, prob)] if box is not None else [] for box, prob in fast.detect(frames)]
+
+
+def _profiled(fn):
+    """Batch function `fn` run under the profiler hook, one batch per request."""
+    def run(items):
+        with _profiler.request():
+            return fn(items)
+    return run
+
+
+# In fast mode only the box search is batched; each worker crops its own faces
+_detector = (
+    MicroBatcher(
+        _profiled(_fast_detect_batch if fast is not None else _detect_batch),
+        DETECT_BATCH_SIZE,
+        DETECT_BATCH_WINDOW_MS,
+        name="fd-mtcnn",
+    )
+    if DETECT_BATCH_SIZE > 1 else None
+)
+
+
+def _detect(img_bytes: bytes):
+    """
+    [(face, prob, box in full-resolution pixels), ...] for one frame (empty
+    if there is no face), batched with other workers' frames if enabled.
+    """
+    if fast is not None:
+        frame = fast.open(img_bytes)
+        found = _fast_detect_batch([frame])[0] if _detector is None else _detector.submit(frame)
+        faces = fast.crop_many(frame, [box for box, _ in found])
+        return [(face, prob, fast.full_box(frame, box)) for face, (box, prob) in zip(faces, found)]
+
+    img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
+    if _detector is None:
+        return _detect_batch([img])[0]
+    return _detector.submit(img)
+
+
+_motion = MotionGate(MOTION_THRESHOLD, MOTION_MAX_REUSE) if MOTION_THRESHOLD > 0 else None
+
+_tracker = (
+    FaceTracker(TRACK_IOU, TRACK_MIN_SIMILARITY, TRACK_MAX_GAP_SECS, REVERIFY_SECS)
+    if FEEDBACK_QUEUE_URL else None
+)
+
+_scheduler = OffloadScheduler(
+    RECOGNITION_MODE, POOL_WORKERS, CLOUD_RTT_MS, OFFLOAD_MAX_LOAD, OFFLOAD_PROBE_EVERY
+)
+_recognizer = None
+if RECOGNITION_MODE != "cloud":
+    # Imported only when used: pulls in the gallery store (and boto3 S3)
+    from edge_recognizer import EdgeRecognizer
+
+    _recognizer = EdgeRecognizer(
+        WEIGHTS_PATH,
+        gallery_mode=GALLERY_MODE,
+        store_uri=GALLERY_STORE,
+        refresh_secs=GALLERY_REFRESH_SECS,
+        top_k=MATCH_TOP_K,
+        threshold=UNKNOWN_THRESHOLD,
+        image_size=FACE_SIZE if FACE_WIRE_FORMAT == "v2" else 240,
+    )
+    print(f"[FD] local recognition: {len(_recognizer)} gallery entries, mode={RECOGNITION_MODE}", flush=True)
 
 # One IPC client for the whole component
-ipc_client = awsiot.greengrasscoreipc.connect()
+ipc_client = gg_ipc.connect()
 TIMEOUT = 10
 
-# ---------- REQUEST-ID DEDUP CACHE ----------
+# ---------- REQUEST-ID DEDUP ----------
 
-# We only need to deduplicate over a recent window to catch retries.
-# Keep up to the last 1000 successfully-processed request_ids.
-_SEEN_MAX = 1000
-_seen_req_ids = set()
-_seen_order = deque()
+# Rotating Bloom filters in a memory-mapped file: survives restarts (when the
+# generator retries), fixed size, ids reserved atomically at first sight.
+_dedup = DedupStore(
+    DEDUP_PATH,
+    window_secs=DEDUP_WINDOW_SECS,
+    capacity=DEDUP_CAPACITY,
+    fp_rate=DEDUP_FP_RATE,
+)
 
 
-def _mark_request_id_seen(request_id: str) -> None:
-    """
-    Remember that we've successfully processed & forwarded this request_id.
-    Bounded LRU-ish cache to avoid unbounded growth.
-    """
-    _seen_req_ids.add(request_id)
-    _seen_order.append(request_id)
-    # Evict oldest if we exceed the bound
-    if len(_seen_order) > _SEEN_MAX:
-        old = _seen_order.popleft()
-        _seen_req_ids.discard(old)
+def _reply_topic(body: dict) -> str:
+    """Per-client result topic for a frame message (RESULT_TOPIC set)."""
+    return RESULT_TOPIC.format(client=body.get("client_id") or f"{ASU_ID}-IoTThing")
 
 
-def _already_seen_request_id(request_id: str) -> bool:
-    return request_id in _seen_req_ids
+def _publish_result(topic: str, out_msg: dict) -> None:
+    request = PublishToTopicRequest(
+        topic=topic,
+        publish_message=PublishMessage(
+            binary_message=BinaryMessage(message=json.dumps(out_msg).encode("utf-8"))
+        ),
+    )
+    operation = ipc_client.new_publish_to_topic()
+    operation.activate(request)
+    operation.get_response().result(TIMEOUT)
 
 
-def _send_no_face_response(request_id: str) -> None:
+def _deliver_result(out_msg: dict, reply_topic, trace=None) -> None:
     """
-    Bonus behavior: if no face is detected on the edge,
-    send a direct 'No-Face' result to the RESPONSE queue
-    instead of sending anything to the REQUEST queue / Lambda.
+    Hand an edge-produced result to the client: straight onto its result
+    topic when RESULT_TOPIC is set, otherwise onto the SQS response queue.
     """
+    if trace is not None:
+        out_msg["trace"] = list(trace)
+        metrics.observe_trace(metrics.mark(out_msg, "edge.respond")["trace"])
+    if reply_topic:
+        _publish_result(reply_topic, out_msg)
+        return
     if not RESPONSE_QUEUE_URL:
         print(
-            f"[FD] WARNING: RESPONSE_QUEUE_URL not set; cannot send No-Face for {request_id}",
+            f"[FD] WARNING: RESPONSE_QUEUE_URL not set; cannot answer {out_msg['request_id']}",
             flush=True,
         )
         return
+    _outbox.send(RESPONSE_QUEUE_URL, json.dumps(out_msg))
+
 
+def _send_no_face_response(request_id: str, reply_topic=None, trace=None) -> None:
+    """
+    Bonus behavior: if no face is detected on the edge,
+    send a direct 'No-Face' result to the client
+    instead of sending anything to the REQUEST queue / Lambda.
+    """
     out_msg = {
         "request_id": request_id,
         "result": "No-Face",
     }
+    print(
+        f"[FD] request_id={request_id}: no face detected; sending No-Face "
+        f"to {reply_topic or 'response SQS'}",
+        flush=True,
+    )
+    _deliver_result(out_msg, reply_topic, trace)
+
 
-    body = json.dumps(out_msg)
+def _send_tracked_response(request_id: str, labels, track_ids, boxes, reply_topic=None, trace=None) -> None:
+    """
+    Every face of the frame belongs to a track that was already recognized:
+    answer on the edge with the tracks' labels instead of another Lambda
+    invocation.
+    """
     print(
-        f"[FD] request_id={request_id}: no face detected; sending No-Face to response SQS "
-        f"(len={len(body)} bytes)",
+        f"[FD] request_id={request_id}: tracks {', '.join(track_ids)} already recognized as "
+        f"{', '.join(labels)}; answering locally",
         flush=True,
     )
+    out_msg = {"request_id": request_id, "result": labels[0]}
+    if MULTI_FACE:
+        out_msg["faces"] = [
+            {"box": [round(float(v), 1) for v in box], "label": label, "track_id": tid}
+            for box, label, tid in zip(boxes, labels, track_ids)
+        ]
+    _deliver_result(out_msg, reply_topic, trace)
+
 
-    sqs.send_message(
-        QueueUrl=RESPONSE_QUEUE_URL,
-        MessageBody=body,
+def _response_relay_loop() -> None:
+    """
+    The core's single consumer of the SQS response queue (RESULT_TOPIC set):
+    relays each cloud recognition result to the result topic of the client
+    that sent the frame (the "reply_to" the recognition Lambda echoes).
+
+    Only messages that were published (or can never be) are deleted; a
+    failed publish stays on the queue and is retried after its visibility
+    timeout, without re-sending the rest of the batch.
+    """
+    default_topic = RESULT_TOPIC.format(client=f"{ASU_ID}-IoTThing")
+    while True:
+        try:
+            resp = sqs.receive_message(
+                QueueUrl=RESPONSE_QUEUE_URL,
+                MaxNumberOfMessages=10,
+                WaitTimeSeconds=20,
+            )
+            done = []
+            for m in resp.get("Messages", []):
+                try:
+                    out_msg = json.loads(m["Body"])
+                except ValueError:
+                    print(f"[FD] dropping unreadable response message {m.get('MessageId')}", flush=True)
+                    done.append(m)
+                    continue
+                if isinstance(out_msg.get("trace"), list):
+                    metrics.observe_trace(metrics.mark(out_msg, "edge.relay")["trace"])
+                try:
+                    _publish_result(out_msg.pop("reply_to", None) or default_topic, out_msg)
+                except Exception as e:
+                    print(f"[FD] relay of {out_msg.get('request_id')} failed ({e}); will retry", flush=True)
+                    continue
+                done.append(m)
+            if done:
+                sqs.delete_message_batch(
+                    QueueUrl=RESPONSE_QUEUE_URL,
+                    Entries=[
+                        {"Id": str(i), "ReceiptHandle": m["ReceiptHandle"]}
+                        for i, m in enumerate(done)
+                    ],
+                )
+        except Exception as e:
+            print(f"[FD] ERROR in response relay: {e}", flush=True)
+            time.sleep(5)
+
+
+def _recognize_locally(request_id: str, found, track_ids, reply_topic=None, trace=None) -> None:
+    """Recognize the frame's faces on this device and answer directly."""
+    per_face, took_ms = _recognizer.recognize_many([face for face, _, _ in found])
+    _scheduler.observe_local(took_ms)
+    if _tracker is not None:
+        for tid, matches in zip(track_ids, per_face):
+            if tid is not None:
+                _tracker.learn(tid, matches[0].label)
+    matches = per_face[0]
+    label = matches[0].label
+
+    out_msg = {
+        "request_id": request_id,
+        "result": label,
+        "distance": round(matches[0].distance, 4),
+    }
+    if MATCH_TOP_K > 1:
+        out_msg["matches"] = [
+            {"label": m.label, "distance": round(m.distance, 4)} for m in matches
+        ]
+    if MULTI_FACE:
+        out_msg["faces"] = [
+            {
+                "box": [round(float(v), 1) for v in box],
+                "label": m[0].label,
+                "distance": round(m[0].distance, 4),
+                **({"track_id": tid} if tid is not None else {}),
+            }
+            for (_, _, box), m, tid in zip(found, per_face, track_ids)
+        ]
+    print(
+        f"[FD] request_id={request_id}: recognized {len(found)} face(s) locally, first as {label} "
+        f"(dist={matches[0].distance:.4f}, {took_ms:.1f} ms)",
+        flush=True,
     )
+    _deliver_result(out_msg, reply_topic, trace)
+
 
-    # Mark as seen so we don't reprocess duplicate retries
-    _mark_request_id_seen(request_id)
+def _feedback_loop() -> None:
+    """
+    Consume recognition feedback ({"track_id", "label", "edge_sent_at", ...})
+    from the recognition Lambda: attach labels to live tracks and feed the
+    observed cloud round trip to the offload scheduler.
+    """
+    while True:
+        try:
+            resp = sqs.receive_message(
+                QueueUrl=FEEDBACK_QUEUE_URL,
+                MaxNumberOfMessages=10,
+                WaitTimeSeconds=20,
+            )
+            messages = resp.get("Messages", [])
+            received = time.time()
+            for m in messages:
+                fb = json.loads(m["Body"])
+                if _tracker is not None and fb.get("track_id") and fb.get("label"):
+                    _tracker.learn(fb["track_id"], fb["label"])
+                if fb.get("edge_sent_at"):
+                    _scheduler.observe_cloud((received - float(fb["edge_sent_at"])) * 1000.0)
+            if messages:
+                sqs.delete_message_batch(
+                    QueueUrl=FEEDBACK_QUEUE_URL,
+                    Entries=[
+                        {"Id": str(i), "ReceiptHandle": m["ReceiptHandle"]}
+                        for i, m in enumerate(messages)
+                    ],
+                )
+        except Exception as e:
+            print(f"[FD] ERROR in feedback loop: {e}", flush=True)
+            time.sleep(5)
 
 
-def _process_frame_message(msg_str: str) -> None:
+def _process_frame_message(msg_str: str, received_ms=None) -> None:
     """
     Handle one JSON message from MQTT topic:
 
@@ -120,9 +517,16 @@ def _process_frame_message(msg_str: str) -> None:
         "request_id": "...",
         "filename": "test_XX.jpg"
     }
+
+    `received_ms` is when the IPC callback got it (epoch ms), for the trace.
     """
+    request_id = None
     try:
         body = json.loads(msg_str)
+        # The publisher's marks are untrusted: clean_trace() bounds them
+        traced = {"trace": metrics.clean_trace(body.get("trace"))}
+        metrics.mark(traced, "edge.recv", received_ms)
+        metrics.mark(traced, "edge.dequeue")
 
         # Part II spec: key is `encoded`, not `content`
         content_b64 = body["encoded"]
@@ -130,69 +534,137 @@ def _process_frame_message(msg_str: str) -> None:
         filename = body.get("filename", "frame.jpg")
 
         # --- Request-id dedup check BEFORE heavy work ---
-        if _already_seen_request_id(request_id):
+        # Reserved at first sight, so a concurrent copy of this frame is
+        # skipped even while this one is still being processed
+        if not _dedup.reserve(request_id):
             print(
                 f"[FD] duplicate request_id={request_id} - skipping re-processing",
                 flush=True,
             )
+            request_id = None
+            _FRAMES.inc(outcome="duplicate")
             return
 
         # --- Decode image ---
         img_bytes = base64.b64decode(content_b64)
-        img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-        img = Image.fromarray(np.array(img))
-
-        # --- Run face detection ---
-        face, prob = mtcnn(img, return_prob=True, save_path=None)
 
-        # BONUS PATH: no face detected -> send No-Face to RESPONSE queue and return
-        if face is None:
-            _send_no_face_response(request_id)
+        # Frames are per publisher; fall back to the topic for a single camera
+        stream = str(body.get("stream_id") or body.get("client_id") or MQTT_TOPIC)
+        reply_topic = _reply_topic(body) if RESULT_TOPIC else None
+
+        # --- Run face detection (or reuse the last one for a static scene) ---
+        reused = None
+        if _motion is not None:
+            thumb, reused = _motion.check(stream, img_bytes)
+
+        if reused is not None:
+            found = reused
+            print(f"[FD] request_id={request_id}: below motion threshold, reusing detection", flush=True)
+        else:
+            started = time.perf_counter()
+            found = _detect(img_bytes)
+            detect_ms = (time.perf_counter() - started) * 1000.0
+            _DETECT_MS.observe(detect_ms)
+            if _motion is not None:
+                _motion.record(stream, thumb, found, detect_ms)
+        metrics.mark(traced, "edge.detect")
+
+        # BONUS PATH: no face detected -> answer No-Face from the edge and return
+        if not found:
+            _FRAMES.inc(outcome="no_face")
+            _send_no_face_response(request_id, reply_topic, traced["trace"])
             return
 
-        # ---------- Existing path: face detected, send to REQUEST queue ----------
-
-        # Normalize tensor -> uint8 RGB image
-        face_img = face - face.min()
-        if face_img.max() > 0:
-            face_img = face_img / face_img.max()
-        face_img = (face_img * 255).byte().permute(1, 2, 0).numpy()
-
-        face_pil = Image.fromarray(face_img, mode="RGB")
-
-        # Resize smaller (same as Part I)
-        face_pil = face_pil.resize((160, 160))
-
-        buf = io.BytesIO()
-        face_pil.save(buf, format="JPEG", quality=70, optimize=True)
-        face_bytes = buf.getvalue()
-        face_b64 = base64.b64encode(face_bytes).decode("utf-8")
+        # --- Same people still in view and already recognized? ---
+        track_ids = [None] * len(found)
+        if _tracker is not None:
+            tracked = _tracker.update_many(
+                stream, [box for _, _, box in found], [face for face, _, _ in found]
+            )
+            track_ids = [tid for tid, _ in tracked]
+            labels = [label for _, label in tracked]
+            if all(label is not None for label in labels):
+                _FRAMES.inc(outcome="tracked")
+                _send_tracked_response(
+                    request_id, labels, track_ids, [box for _, _, box in found], reply_topic,
+                    traced["trace"],
+                )
+                return
 
-        msg = {
-            "request_id": request_id,
-            "filename": filename,
-            "face_image": face_b64,
-        }
+        # --- Recognize here or in the cloud ---
+        if _scheduler.decide(frame_pool.depth()) == "local":
+            _FRAMES.inc(outcome="local")
+            _recognize_locally(request_id, found, track_ids, reply_topic, traced["trace"])
+            return
 
-        message_body = json.dumps(msg)
-        print(
-            f"[FD] request_id={request_id}: sending face to REQUEST SQS, size={len(message_body)} bytes",
-            flush=True,
-        )
+        # ---------- Existing path: face(s) detected, send to REQUEST queue ----------
 
-        # Mark as seen only when we're about to send the job forward
-        _mark_request_id_seen(request_id)
+        if MULTI_FACE:
+            parts = face_payload.encode_faces(
+                [face for face, _, _ in found],
+                [box for _, _, box in found],
+                [prob for _, prob, _ in found],
+                FACE_WIRE_FORMAT,
+            )
+            for entry, tid in zip((e for p in parts for e in p["faces"]), track_ids):
+                if tid is not None:
+                    entry["track_id"] = tid
+            msgs = [{"request_id": request_id, "filename": filename, **p} for p in parts]
+            if len(msgs) > 1:
+                for i, msg in enumerate(msgs):
+                    msg["part"] = [i + 1, len(msgs)]
+        else:
+            msgs = [{
+                "request_id": request_id,
+                "filename": filename,
+                **face_payload.encode(found[0][0], FACE_WIRE_FORMAT),
+            }]
+            if track_ids[0] is not None:
+                # Echoed back on FEEDBACK_QUEUE_URL with the recognized label
+                msgs[0]["track_id"] = track_ids[0]
+
+        for msg in msgs:
+            if RECOGNITION_MODE == "adaptive" and FEEDBACK_QUEUE_URL:
+                # Feedback comes back even without a track, timing the cloud round trip
+                msg["feedback"] = True
+                msg["edge_sent_at"] = time.time()
+            if reply_topic:
+                # Echoed in the response; the relay publishes the result there
+                msg["reply_to"] = reply_topic
+            msg["trace"] = list(traced["trace"])
+            metrics.mark(msg, "edge.enqueue")
+
+            message_body = json.dumps(msg)
+            print(
+                f"[FD] request_id={request_id}: sending {len(msg.get('faces', [None]))} face(s) to "
+                f"REQUEST SQS, size={len(message_body)} bytes "
+                f"(format={FACE_WIRE_FORMAT}, encode_ms={msg['timing']['encode_ms']})",
+                flush=True,
+            )
 
-        sqs.send_message(
-            QueueUrl=REQUEST_QUEUE_URL,
-            MessageBody=message_body,
-        )
+            _outbox.send(REQUEST_QUEUE_URL, message_body)
+        _FRAMES.inc(outcome="cloud")
 
     except Exception as e:
         print(f"[FD] ERROR processing message: {e}", flush=True)
+        _FRAMES.inc(outcome="error")
+        if request_id is not None:
+            # Let the generator's retry of this frame through
+            _dedup.release(request_id)
+
+
+def _handle_frame(item) -> None:
+    """Worker entry point for one (payload, received_ms) item from the frame pool."""
+    if _detector is not None:
+        # Profiled on the batch thread: here it would hold the profiler while
+        # waiting on the batch and keep that thread from being sampled
+        _process_frame_message(*item)
+        return
+    with _profiler.request():
+        _process_frame_message(*item)
 
 
-class StreamHandler(gg_client.SubscribeToTopicStreamHandler):
+class StreamHandler(SubscribeToTopicStreamHandler):
     """
     Proper Greengrass stream handler for local Pubsub.
     Must subclass SubscribeToTopicStreamHandler so the
@@ -231,7 +703,10 @@ class StreamHandler(gg_client.SubscribeToTopicStreamHandler):
                 flush=True,
             )
 
-            _process_frame_message(payload_str)
+            # Hand off to the worker pool; never run MTCNN on the IPC thread
+            if not frame_pool.submit((payload_str, time.time() * 1000.0)):
+                _FRAMES.inc(outcome="dropped")
+                print("[FD] frame queue full - dropped incoming frame", flush=True)
 
         except Exception as e:
             print(f"[FD] ERROR in on_stream_event: {e}", flush=True)
@@ -245,12 +720,28 @@ class StreamHandler(gg_client.SubscribeToTopicStreamHandler):
         print("[FD] Stream closed.", flush=True)
 
 
+frame_pool = FramePool(
+    _handle_frame,
+    workers=POOL_WORKERS,
+    maxsize=POOL_QUEUE_SIZE,
+    policy=POOL_OVERLOAD_POLICY,
+)
+metrics.registry.gauge("frame_queue_depth", "frames waiting for a worker").set_function(frame_pool.depth)
+
+
 def main():
     print(
         f"[FD] Starting FaceDetection component. Subscribing to topic: {MQTT_TOPIC}",
         flush=True,
     )
 
+    _outbox.start()
+    frame_pool.start()
+    if RESULT_TOPIC and RESPONSE_QUEUE_URL:
+        threading.Thread(target=_response_relay_loop, name="fd-relay", daemon=True).start()
+    if FEEDBACK_QUEUE_URL:
+        threading.Thread(target=_feedback_loop, name="fd-feedback", daemon=True).start()
+
     # Build subscribe request
     request = SubscribeToTopicRequest()
     request.topic = MQTT_TOPIC
@@ -262,9 +753,19 @@ def main():
 
     print(f"[FD] Successfully subscribed to {MQTT_TOPIC}", flush=True)
 
-    # Keep component alive
+    # Keep component alive; report pool health periodically
     while True:
-        time.sleep(60)
+        time.sleep(STATS_INTERVAL_SECS)
+        stats = {"pool": frame_pool.stats(), "outbox": _outbox.stats(), "dedup": _dedup.stats()}
+        if _detector is not None:
+            stats["detect_batch"] = _detector.stats()
+        if _motion is not None:
+            stats["motion"] = _motion.stats()
+        if _tracker is not None:
+            stats["tracker"] = _tracker.stats()
+        if RECOGNITION_MODE != "cloud":
+            stats["offload"] = _scheduler.stats()
+        print(f"[FD] stats {json.dumps(stats)}", flush=True)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,137 @@
+"""
+Bounded frame queue + worker pool for the FaceDetection component.
+
+The Greengrass IPC callback only calls FramePool.submit(); MTCNN and the SQS
+sends run on the worker threads. When the queue is full the overload policy
+decides what happens:
+
+  - drop-oldest  evict the oldest queued frame (live video: newest wins)
+  - drop-newest  reject the incoming frame
+  - block        block the IPC callback until a worker frees a slot
+"""
+import threading
+import time
+from collections import deque
+
+POLICIES = ("drop-oldest", "drop-newest", "block")
+
+# Latency samples kept between two stats() snapshots
+_MAX_SAMPLES = 10000
+
+
+def _percentile(sorted_vals, q):
+    if not sorted_vals:
+        return None
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))]
+
+
+class FramePool:
+    def __init__(self, handler, workers: int, maxsize: int, policy: str = "drop-oldest"):
+        if policy not in POLICIES:
+            raise ValueError(f"overload policy must be one of {POLICIES}, got {policy!r}")
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._running = False
+
+        # Counters (guarded by _cond)
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.max_depth = 0
+        self._wait_ms = []
+        self._total_ms = []
+
+    def start(self) -> None:
+        self._running = True
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"fd-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+
+    def submit(self, payload) -> bool:
+        """Queue one payload. Returns False if it was dropped."""
+        with self._cond:
+            self.submitted += 1
+            if len(self._items) >= self.maxsize:
+                if self.policy == "drop-newest":
+                    self.dropped += 1
+                    return False
+                if self.policy == "drop-oldest":
+                    self._items.popleft()
+                    self.dropped += 1
+                else:
+                    while len(self._items) >= self.maxsize and self._running:
+                        self._cond.wait()
+            self._items.append((time.perf_counter(), payload))
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._cond.notify()
+            return True
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while not self._items and self._running:
+                    self._cond.wait()
+                if not self._items:
+                    return
+                enqueued, payload = self._items.popleft()
+                # Wake a submitter blocked on a full queue
+                self._cond.notify_all()
+
+            started = time.perf_counter()
+            ok = True
+            try:
+                self.handler(payload)
+            except Exception as e:
+                ok = False
+                print(f"[FD] ERROR in worker: {e}", flush=True)
+            done = time.perf_counter()
+
+            with self._cond:
+                self.processed += 1
+                if not ok:
+                    self.failed += 1
+                if len(self._total_ms) < _MAX_SAMPLES:
+                    self._wait_ms.append((started - enqueued) * 1000.0)
+                    self._total_ms.append((done - enqueued) * 1000.0)
+
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._items)
+
+    def stats(self) -> dict:
+        """Counters since start, latency percentiles since the last call."""
+        with self._cond:
+            wait_ms, self._wait_ms = sorted(self._wait_ms), []
+            total_ms, self._total_ms = sorted(self._total_ms), []
+            max_depth, self.max_depth = self.max_depth, len(self._items)
+            return {
+                "policy": self.policy,
+                "workers": self.workers,
+                "depth": len(self._items),
+                "max_depth": max_depth,
+                "capacity": self.maxsize,
+                "submitted": self.submitted,
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "frames": len(total_ms),
+                "queue_wait_ms_p50": _percentile(wait_ms, 0.50),
+                "latency_ms_p50": _percentile(total_ms, 0.50),
+                "latency_ms_p95": _percentile(total_ms, 0.95),
+                "latency_ms_max": total_ms[-1] if total_ms else None,
+            }
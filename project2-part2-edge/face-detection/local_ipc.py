@@ -0,0 +1,193 @@
+"""
+In-process stand-in for the Greengrass IPC pub/sub client, for running and
+testing the FaceDetection component without a Greengrass nucleus
+(IPC_BACKEND=local).
+
+It mirrors the parts of awsiot.greengrasscoreipc the component uses -
+connect(), new_subscribe_to_topic(handler), new_publish_to_topic(), the
+request / message model classes and SubscribeToTopicStreamHandler - on top
+of a process-wide broker that delivers messages on a dispatcher thread, as
+the real IPC client does. Topic filters support the MQTT wildcards `+`
+and `#`.
+
+    import local_ipc
+    local_ipc.broker.subscribe("clients/+/results", print)
+    local_ipc.broker.publish("clients/123-IoTThing", b'{"encoded": ...}')
+"""
+import queue
+import threading
+from concurrent.futures import Future
+
+
+# ---------- model (same attribute names as awsiot.greengrasscoreipc.model) ----------
+
+class BinaryMessage:
+    def __init__(self, message=None, context=None):
+        self.message = message
+        self.context = context
+
+
+class JsonMessage:
+    def __init__(self, message=None, context=None):
+        self.message = message
+        self.context = context
+
+
+class PublishMessage:
+    def __init__(self, json_message=None, binary_message=None):
+        self.json_message = json_message
+        self.binary_message = binary_message
+
+
+class PublishToTopicRequest:
+    def __init__(self, topic=None, publish_message=None):
+        self.topic = topic
+        self.publish_message = publish_message
+
+
+class SubscribeToTopicRequest:
+    def __init__(self, topic=None):
+        self.topic = topic
+
+
+class SubscriptionResponseMessage:
+    def __init__(self, json_message=None, binary_message=None):
+        self.json_message = json_message
+        self.binary_message = binary_message
+
+
+class SubscribeToTopicStreamHandler:
+    def on_stream_event(self, event: SubscriptionResponseMessage) -> None:
+        pass
+
+    def on_stream_error(self, error: Exception) -> bool:
+        return True
+
+    def on_stream_closed(self) -> None:
+        pass
+
+
+# ---------- broker ----------
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """MQTT topic filter match (`+` one level, trailing `#` any remaining levels)."""
+    f_parts, t_parts = topic_filter.split("/"), topic.split("/")
+    for i, f in enumerate(f_parts):
+        if f == "#":
+            return True
+        if i >= len(t_parts) or (f != "+" and f != t_parts[i]):
+            return False
+    return len(f_parts) == len(t_parts)
+
+
+class Broker:
+    def __init__(self):
+        self._subs = []   # (topic filter, callback(topic, SubscriptionResponseMessage))
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._dispatch, name="local-ipc", daemon=True)
+        self._thread.start()
+
+    def subscribe(self, topic_filter: str, callback):
+        """callback(topic, payload) for raw use; returns an unsubscribe function."""
+        entry = (topic_filter, callback)
+        with self._lock:
+            self._subs.append(entry)
+
+        def unsubscribe():
+            with self._lock:
+                if entry in self._subs:
+                    self._subs.remove(entry)
+        return unsubscribe
+
+    def has_subscriber(self, topic: str) -> bool:
+        """True if a publish to `topic` would reach at least one subscriber."""
+        with self._lock:
+            return any(topic_matches(f, topic) for f, _ in self._subs)
+
+    def publish(self, topic: str, payload) -> None:
+        """Queue `payload` (bytes, str, or dict for a JSON message) for delivery."""
+        self._queue.put((topic, payload))
+
+    def drain(self, timeout: float = 5.0) -> None:
+        """Block until every message published so far has been delivered."""
+        done = threading.Event()
+        self._queue.put((None, done))
+        done.wait(timeout)
+
+    def _dispatch(self) -> None:
+        while True:
+            topic, payload = self._queue.get()
+            if topic is None:
+                payload.set()
+                continue
+            with self._lock:
+                targets = [cb for f, cb in self._subs if topic_matches(f, topic)]
+            for cb in targets:
+                try:
+                    cb(topic, payload)
+                except Exception as e:
+                    print(f"[local-ipc] subscriber error on {topic}: {e}", flush=True)
+
+
+broker = Broker()
+
+
+# ---------- client ----------
+
+def _done(result=None) -> Future:
+    fut = Future()
+    fut.set_result(result)
+    return fut
+
+
+class _SubscribeOperation:
+    def __init__(self, handler: SubscribeToTopicStreamHandler):
+        self._handler = handler
+        self._unsubscribe = None
+
+    def _deliver(self, topic, payload):
+        if isinstance(payload, (dict, list)):
+            event = SubscriptionResponseMessage(json_message=JsonMessage(payload))
+        else:
+            data = payload.encode("utf-8") if isinstance(payload, str) else bytes(payload)
+            event = SubscriptionResponseMessage(binary_message=BinaryMessage(data))
+        self._handler.on_stream_event(event)
+
+    def activate(self, request: SubscribeToTopicRequest) -> Future:
+        self._unsubscribe = broker.subscribe(request.topic, self._deliver)
+        return _done()
+
+    def get_response(self) -> Future:
+        return _done()
+
+    def close(self) -> Future:
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+        self._handler.on_stream_closed()
+        return _done()
+
+
+class _PublishOperation:
+    def activate(self, request: PublishToTopicRequest) -> Future:
+        msg = request.publish_message
+        if msg.binary_message is not None:
+            broker.publish(request.topic, bytes(msg.binary_message.message))
+        else:
+            broker.publish(request.topic, msg.json_message.message)
+        return _done()
+
+    def get_response(self) -> Future:
+        return _done()
+
+
+class LocalIpcClient:
+    def new_subscribe_to_topic(self, stream_handler) -> _SubscribeOperation:
+        return _SubscribeOperation(stream_handler)
+
+    def new_publish_to_topic(self) -> _PublishOperation:
+        return _PublishOperation()
+
+
+def connect() -> LocalIpcClient:
+    return LocalIpcClient()
@@ -0,0 +1,98 @@
+"""
+Micro-batching stage: callers on many threads submit one item each; a single
+batch thread collects items for up to `window_ms` (or until `max_batch` are
+waiting), runs `fn(items)` once, and hands each caller its own result.
+
+Used to amortize MTCNN's P/R/O-Net passes across frames from several workers.
+"""
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    def __init__(self, fn, max_batch: int, window_ms: float, name: str = "microbatch"):
+        """
+        fn: list of items -> list of results (same length and order).
+        """
+        self.fn = fn
+        self.max_batch = max(1, max_batch)
+        self.window = max(0.0, window_ms) / 1000.0
+
+        self._pending = []
+        self._cond = threading.Condition()
+
+        # Stats since the last stats() call (guarded by _cond)
+        self._batches = 0
+        self._items = 0
+        self._full_batches = 0
+        self._wait_ms = 0.0
+        self._run_ms = 0.0
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """Queue `item` and block until its batch has run. Returns its result."""
+        fut = Future()
+        with self._cond:
+            self._pending.append((time.perf_counter(), item, fut))
+            self._cond.notify()
+        return fut.result()
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            # Window starts at the oldest waiting item, not at wake-up
+            deadline = self._pending[0][0] + self.window
+            while len(self._pending) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            started = time.perf_counter()
+            try:
+                results = list(self.fn([item for _, item, _ in batch]))
+                if len(results) != len(batch):
+                    # A short list would leave callers blocked forever
+                    raise ValueError(f"batch fn returned {len(results)} results for {len(batch)} items")
+                for (_, _, fut), res in zip(batch, results):
+                    fut.set_result(res)
+            except Exception as e:
+                for _, _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+            done = time.perf_counter()
+
+            with self._cond:
+                self._batches += 1
+                self._items += len(batch)
+                if len(batch) == self.max_batch:
+                    self._full_batches += 1
+                self._wait_ms += sum((started - t) * 1000.0 for t, _, _ in batch)
+                self._run_ms += (done - started) * 1000.0
+
+    def stats(self) -> dict:
+        with self._cond:
+            batches, items = self._batches, self._items
+            out = {
+                "max_batch": self.max_batch,
+                "window_ms": self.window * 1000.0,
+                "batches": batches,
+                "items": items,
+                "mean_batch": items / batches if batches else None,
+                "full_batch_ratio": self._full_batches / batches if batches else None,
+                "mean_added_wait_ms": self._wait_ms / items if items else None,
+                "mean_run_ms_per_item": self._run_ms / items if items else None,
+            }
+            self._batches = self._items = self._full_batches = 0
+            self._wait_ms = self._run_ms = 0.0
+            return out
@@ -0,0 +1,105 @@
+"""
+Motion gate for the FaceDetection component: skip MTCNN on frames that are
+nearly identical to the last frame that was actually detected.
+
+Each frame is decoded straight to a tiny grayscale thumbnail (JPEG DCT
+scaling, so this costs a fraction of a full decode) and compared with the
+thumbnail of the stream's last detected keyframe. Below `threshold` (mean
+absolute difference, 0-255 gray levels) the keyframe's detection outcome is
+reused. Comparing against the keyframe, not the previous frame, keeps slow
+drift from accumulating; `max_reuse` forces a fresh detection every so often.
+"""
+import io
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+# Streams tracked at once; least recently seen is forgotten first
+_MAX_STREAMS = 256
+
+
+class MotionGate:
+    def __init__(self, threshold: float, max_reuse: int = 10, thumb_size: int = 32):
+        self.threshold = threshold
+        self.max_reuse = max(0, max_reuse)
+        self.thumb_size = thumb_size
+
+        # stream -> [keyframe thumbnail, outcome, reuses since keyframe]
+        self._streams = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Stats since the last stats() call (guarded by _lock)
+        self._frames = 0
+        self._skipped = 0
+        self._gate_ms = 0.0
+        self._detect_ms = 0.0
+        self._detected = 0
+        # Running mean detection cost; what one skip is assumed to save
+        self._detect_ms_mean = None
+        self._saved_ms = 0.0
+
+    def thumbnail(self, data: bytes) -> np.ndarray:
+        img = Image.open(io.BytesIO(data))
+        img.draft("L", (self.thumb_size, self.thumb_size))
+        img = img.convert("L").resize((self.thumb_size, self.thumb_size), Image.BILINEAR)
+        return np.asarray(img, dtype=np.float32)
+
+    def check(self, stream: str, data: bytes):
+        """
+        (thumbnail, outcome) for a frame. `outcome` is the keyframe's
+        detection result if this frame can reuse it, else None and the caller
+        runs detection and passes the thumbnail back to record().
+        """
+        started = time.perf_counter()
+        thumb = self.thumbnail(data)
+        outcome = None
+        with self._lock:
+            state = self._streams.get(stream)
+            if state is not None:
+                self._streams.move_to_end(stream)
+                key, prev, reuses = state
+                if reuses < self.max_reuse and float(np.abs(thumb - key).mean()) < self.threshold:
+                    state[2] += 1
+                    outcome = prev
+            gate_ms = (time.perf_counter() - started) * 1000.0
+            self._frames += 1
+            self._gate_ms += gate_ms
+            if outcome is not None:
+                self._skipped += 1
+                if self._detect_ms_mean is not None:
+                    self._saved_ms += max(0.0, self._detect_ms_mean - gate_ms)
+        return thumb, outcome
+
+    def record(self, stream: str, thumb: np.ndarray, outcome, detect_ms: float) -> None:
+        """Make this detected frame the stream's new keyframe."""
+        with self._lock:
+            self._streams[stream] = [thumb, outcome, 0]
+            self._streams.move_to_end(stream)
+            if len(self._streams) > _MAX_STREAMS:
+                self._streams.popitem(last=False)
+            self._detected += 1
+            self._detect_ms += detect_ms
+            if self._detect_ms_mean is None:
+                self._detect_ms_mean = detect_ms
+            else:
+                self._detect_ms_mean += 0.1 * (detect_ms - self._detect_ms_mean)
+
+    def stats(self) -> dict:
+        with self._lock:
+            frames = self._frames
+            out = {
+                "threshold": self.threshold,
+                "streams": len(self._streams),
+                "frames": frames,
+                "skipped": self._skipped,
+                "skip_rate": self._skipped / frames if frames else None,
+                "gate_ms_mean": self._gate_ms / frames if frames else None,
+                "detect_ms_mean": self._detect_ms / self._detected if self._detected else None,
+                "detect_ms_saved": self._saved_ms,
+            }
+            self._frames = self._skipped = self._detected = 0
+            self._gate_ms = self._detect_ms = self._saved_ms = 0.0
+            return out
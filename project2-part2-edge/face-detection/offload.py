@@ -0,0 +1,122 @@
+"""
+Per-frame offload decision for edge-local recognition.
+
+RECOGNITION_MODE picks where a detected face is recognized:
+  - cloud     always send it to the recognition Lambda (the original path)
+  - local     always run InceptionResnetV1 + the gallery on the core device
+  - adaptive  estimate both latencies and take the cheaper one per frame
+
+The local estimate is the running mean local recognition time, scaled by
+the frames already queued ahead of this one and by CPU oversubscription
+(1-minute load average / cores). The cloud estimate is the running mean
+round trip observed through recognition feedback (detector send -> feedback
+received), or `cloud_rtt_ms` until the first one arrives. Every
+`probe_every`-th decision goes the other way so both estimates stay fresh.
+"""
+import os
+import threading
+
+MODES = ("cloud", "local", "adaptive")
+
+# Weight of a new sample in the running means
+_EWMA_ALPHA = 0.2
+
+
+class OffloadScheduler:
+    def __init__(
+        self,
+        mode: str,
+        workers: int,
+        cloud_rtt_ms: float = 1000.0,
+        max_load: float = 1.5,
+        probe_every: int = 20,
+    ):
+        """
+        workers: frames recognized locally in parallel (the worker pool size).
+        max_load: load average per core above which nothing runs locally.
+        """
+        if mode not in MODES:
+            raise ValueError(f"recognition mode must be one of {MODES}, got {mode!r}")
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.max_load = max_load
+        self.probe_every = max(0, probe_every)
+        self._cores = os.cpu_count() or 1
+
+        self._local_ms = None
+        self._cloud_ms = cloud_rtt_ms
+        self._cloud_observed = False
+        self._lock = threading.Lock()
+
+        # Stats since the last stats() call (guarded by _lock)
+        self._decisions = 0
+        self._local = 0
+        self._probes = 0
+
+    def _load_per_core(self) -> float:
+        try:
+            return os.getloadavg()[0] / self._cores
+        except (AttributeError, OSError):
+            return 0.0
+
+    def estimate_local_ms(self, queue_depth: int):
+        """Expected local recognition latency for a frame behind `queue_depth` others."""
+        with self._lock:
+            local_ms = self._local_ms
+        if local_ms is None:
+            return None
+        waves = 1.0 + queue_depth / self.workers
+        return local_ms * waves * max(1.0, self._load_per_core())
+
+    def decide(self, queue_depth: int) -> str:
+        """'local' or 'cloud' for the next face."""
+        if self.mode != "adaptive":
+            return self.mode
+
+        local_est = self.estimate_local_ms(queue_depth)
+        overloaded = self._load_per_core() > self.max_load
+        with self._lock:
+            self._decisions += 1
+            if local_est is None:
+                # Nothing measured locally yet: try it once unless the CPU is saturated
+                choice = "cloud" if overloaded else "local"
+            elif overloaded:
+                choice = "cloud"
+            else:
+                choice = "local" if local_est <= self._cloud_ms else "cloud"
+                if self.probe_every and self._decisions % self.probe_every == 0:
+                    choice = "cloud" if choice == "local" else "local"
+                    self._probes += 1
+            if choice == "local":
+                self._local += 1
+            return choice
+
+    def observe_local(self, ms: float) -> None:
+        with self._lock:
+            if self._local_ms is None:
+                self._local_ms = ms
+            else:
+                self._local_ms += _EWMA_ALPHA * (ms - self._local_ms)
+
+    def observe_cloud(self, ms: float) -> None:
+        with self._lock:
+            if not self._cloud_observed:
+                self._cloud_ms, self._cloud_observed = ms, True
+            else:
+                self._cloud_ms += _EWMA_ALPHA * (ms - self._cloud_ms)
+
+    def stats(self) -> dict:
+        with self._lock:
+            decisions = self._decisions
+            out = {
+                "mode": self.mode,
+                "decisions": decisions,
+                "local_ratio": self._local / decisions if decisions else None,
+                "probes": self._probes,
+                "local_ms_ewma": self._local_ms,
+                "cloud_rtt_ms_ewma": self._cloud_ms,
+                "cloud_rtt_observed": self._cloud_observed,
+                "load_per_core": self._load_per_core(),
+            }
+            self._decisions = self._local = self._probes = 0
+            return out
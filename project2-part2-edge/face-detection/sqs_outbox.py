@@ -0,0 +1,373 @@
+"""
+Batched, durable SQS outbox for the FaceDetection component.
+
+send() only queues a message. A sender thread groups messages per queue into
+send_message_batch calls of up to 10 entries (and under the 256 KB batch
+payload limit), waiting at most `window_ms` after the oldest queued message
+for a batch to fill.
+
+Messages that can't be delivered (the call raises, or SQS reports a
+retryable per-entry failure) are appended to a local JSONL spool file
+instead of being lost. A drain thread replays the spool with exponential
+backoff; every replay counts as an attempt, and a message that fails
+`max_attempts` times is moved to `<spool>.dead`. The spool is append-only:
+progress is a byte offset kept in `<spool>.offset`, and the file is
+truncated once everything in it has been delivered. A line torn by a crash
+is moved to `<spool>.dead` as "corrupt" rather than stopping the drain.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# SQS limits for one send_message_batch call
+MAX_BATCH_ENTRIES = 10
+MAX_BATCH_BYTES = 256 * 1024
+
+# Send-latency samples kept between two stats() snapshots
+_MAX_SAMPLES = 10000
+
+
+def _percentile(sorted_vals, q):
+    if not sorted_vals:
+        return None
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))]
+
+
+def _parse_record(line: bytes):
+    """A spool record, or None if the line is torn or malformed."""
+    try:
+        r = json.loads(line)
+        if isinstance(r, dict) and "queue_url" in r and "body" in r:
+            r.setdefault("attempts", 1)
+            return r
+    except ValueError:
+        pass
+    return None
+
+
+class SqsOutbox:
+    def __init__(
+        self,
+        sqs,
+        spool_path: str,
+        window_ms: float = 20.0,
+        max_attempts: int = 8,
+        retry_secs: float = 1.0,
+        max_retry_secs: float = 60.0,
+    ):
+        self.sqs = sqs
+        self.spool_path = spool_path
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_attempts = max(1, max_attempts)
+        self.retry_secs = retry_secs
+        self.max_retry_secs = max_retry_secs
+
+        self._pending = deque()   # (enqueued, queue_url, body)
+        self._cond = threading.Condition()
+        self._spool_lock = threading.Lock()
+        self._drain_wake = threading.Event()
+        self._running = False
+        self._threads = []
+        # After a failed call, skip straight to the spool until this time
+        self._down_until = 0.0
+
+        os.makedirs(os.path.dirname(os.path.abspath(spool_path)), exist_ok=True)
+        self._offset_path = spool_path + ".offset"
+        self._dead_path = spool_path + ".dead"
+        self._spool_depth = self._count_spooled()
+
+        # Stats (guarded by _cond)
+        self.sent = 0
+        self.spooled = 0
+        self.dead = 0
+        self._batches = 0
+        self._batch_entries = 0
+        self._send_ms = []
+        self._queued_ms = []
+
+    # ---------- public API ----------
+
+    def start(self) -> None:
+        self._running = True
+        for target, name in ((self._send_loop, "outbox-send"), (self._drain_loop, "outbox-drain")):
+            t = threading.Thread(target=target, name=name, daemon=True)
+            t.start()
+            self._threads.append(t)
+        if self._spool_depth:
+            self._drain_wake.set()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Flush what's queued (spooling anything that can't be sent) and stop."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._drain_wake.set()
+        for t in self._threads:
+            t.join(timeout)
+
+    def send(self, queue_url: str, body: str) -> None:
+        """Queue one message; delivery (or spooling) happens in the background."""
+        with self._cond:
+            self._pending.append((time.perf_counter(), queue_url, body))
+            self._cond.notify()
+
+    # ---------- batching ----------
+
+    def _take_batch(self):
+        """Up to 10 messages for the queue of the oldest pending one, or None when stopped."""
+        with self._cond:
+            while not self._pending:
+                if not self._running:
+                    return None
+                self._cond.wait()
+            deadline = self._pending[0][0] + self.window
+            queue_url = self._pending[0][1]
+            while self._running:
+                same = sum(1 for _, q, _ in self._pending if q == queue_url)
+                remaining = deadline - time.perf_counter()
+                if same >= MAX_BATCH_ENTRIES or remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch, size, keep = [], 0, deque()
+            while self._pending:
+                item = self._pending.popleft()
+                fits = (
+                    item[1] == queue_url
+                    and len(batch) < MAX_BATCH_ENTRIES
+                    and (not batch or size + len(item[2]) <= MAX_BATCH_BYTES)
+                )
+                if fits:
+                    batch.append(item)
+                    size += len(item[2])
+                else:
+                    keep.append(item)
+            self._pending = keep
+            return queue_url, batch
+
+    def _send_batch(self, queue_url, bodies):
+        """
+        One send_message_batch call. Returns the bodies that should be
+        retried later; raises if the call itself failed.
+        """
+        started = time.perf_counter()
+        resp = self.sqs.send_message_batch(
+            QueueUrl=queue_url,
+            Entries=[{"Id": str(i), "MessageBody": b} for i, b in enumerate(bodies)],
+        )
+        send_ms = (time.perf_counter() - started) * 1000.0
+
+        retry = []
+        for f in resp.get("Failed", []):
+            body = bodies[int(f["Id"])]
+            if f.get("SenderFault"):
+                # Malformed / oversized: retrying can't help
+                print(f"[outbox] rejected message ({f.get('Code')}): {f.get('Message')}", flush=True)
+                self._dead_letter(queue_url, body, f.get("Code"))
+            else:
+                retry.append(body)
+        with self._cond:
+            self._batches += 1
+            self._batch_entries += len(bodies)
+            self.sent += len(bodies) - len(resp.get("Failed", []))
+            if len(self._send_ms) < _MAX_SAMPLES:
+                self._send_ms.append(send_ms)
+        return retry
+
+    def _send_loop(self) -> None:
+        while True:
+            taken = self._take_batch()
+            if taken is None:
+                return
+            queue_url, batch = taken
+            if not batch:
+                continue
+            bodies = [body for _, _, body in batch]
+            if time.monotonic() < self._down_until:
+                retry = bodies
+            else:
+                try:
+                    retry = self._send_batch(queue_url, bodies)
+                except Exception as e:
+                    print(f"[outbox] send failed ({e}); spooling {len(bodies)} messages", flush=True)
+                    self._down_until = time.monotonic() + self.retry_secs
+                    retry = bodies
+            now = time.perf_counter()
+            with self._cond:
+                for enqueued, _, _ in batch:
+                    if len(self._queued_ms) < _MAX_SAMPLES:
+                        self._queued_ms.append((now - enqueued) * 1000.0)
+            if retry:
+                self._spool(queue_url, retry, attempts=1)
+
+    # ---------- spool ----------
+
+    def _count_spooled(self) -> int:
+        try:
+            with open(self.spool_path, "rb") as f:
+                f.seek(self._read_offset())
+                return sum(1 for line in f if line.strip())
+        except FileNotFoundError:
+            return 0
+
+    def _read_offset(self) -> int:
+        try:
+            with open(self._offset_path) as f:
+                offset = int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+        try:
+            size = os.path.getsize(self.spool_path)
+        except FileNotFoundError:
+            size = 0
+        # Past the end: the spool was compacted but the offset not yet reset
+        # (crash in between). Everything now in the file is unsent.
+        return offset if offset <= size else 0
+
+    def _write_offset(self, offset: int) -> None:
+        tmp = self._offset_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(str(offset))
+        os.replace(tmp, self._offset_path)
+
+    def _spool(self, queue_url, bodies, attempts) -> None:
+        lines = "".join(
+            json.dumps({"queue_url": queue_url, "body": b, "attempts": attempts}) + "\n"
+            for b in bodies
+        )
+        with self._spool_lock:
+            with open(self.spool_path, "ab+") as f:
+                # Terminate a torn tail left by a crash so it can't swallow
+                # the first record written here
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        lines = "\n" + lines
+                f.write(lines.encode())
+                f.flush()
+                os.fsync(f.fileno())
+            self._spool_depth += len(bodies)
+        if attempts == 1:
+            with self._cond:
+                self.spooled += len(bodies)
+        self._drain_wake.set()
+
+    def _dead_letter(self, queue_url, body, reason) -> None:
+        with self._spool_lock, open(self._dead_path, "a") as f:
+            f.write(json.dumps({"queue_url": queue_url, "body": body, "reason": reason}) + "\n")
+        with self._cond:
+            self.dead += 1
+
+    def _drain_once(self) -> bool:
+        """Replay the spool once. True if everything in it was delivered."""
+        offset = self._read_offset()
+        try:
+            with open(self.spool_path, "rb") as f:
+                f.seek(offset)
+                raw = f.read()
+        except FileNotFoundError:
+            return True
+
+        # Only whole lines; a tail still being written is picked up next time
+        end = raw.rfind(b"\n") + 1
+        lines = [line for line in raw[:end].splitlines() if line.strip()]
+        records = []
+        for line in lines:
+            r = _parse_record(line)
+            if r is None:
+                # Torn by a crash: keep it for inspection, don't retry
+                print(f"[outbox] unreadable spool line ({len(line)} bytes); dead-lettering", flush=True)
+                self._dead_letter(None, line.decode("utf-8", "replace"), "corrupt")
+            else:
+                records.append(r)
+
+        all_ok = True
+        by_queue = {}
+        for r in records:
+            by_queue.setdefault(r["queue_url"], []).append(r)
+        for queue_url, recs in by_queue.items():
+            for i in range(0, len(recs), MAX_BATCH_ENTRIES):
+                chunk = recs[i:i + MAX_BATCH_ENTRIES]
+                bodies = [r["body"] for r in chunk]
+                try:
+                    retry = set(self._send_batch(queue_url, bodies))
+                except Exception as e:
+                    print(f"[outbox] drain failed: {e}", flush=True)
+                    retry = set(bodies)
+                if retry:
+                    all_ok = False
+                for r in chunk:
+                    if r["body"] not in retry:
+                        continue
+                    if r["attempts"] + 1 >= self.max_attempts:
+                        self._dead_letter(queue_url, r["body"], "max_attempts")
+                    else:
+                        self._spool(queue_url, [r["body"]], attempts=r["attempts"] + 1)
+
+        with self._spool_lock:
+            self._spool_depth -= len(lines)
+            new_offset = offset + end
+            if os.path.getsize(self.spool_path) == new_offset:
+                # Everything delivered (or re-spooled earlier in the file):
+                # compact. Offset first: a crash in between re-sends the
+                # delivered records instead of skipping new ones.
+                self._write_offset(0)
+                open(self.spool_path, "w").close()
+            else:
+                self._write_offset(new_offset)
+        return all_ok
+
+    def _drain_loop(self) -> None:
+        backoff = self.retry_secs
+        while True:
+            self._drain_wake.wait(backoff)
+            self._drain_wake.clear()
+            with self._spool_lock:
+                depth = self._spool_depth
+            if not depth:
+                if not self._running:
+                    return
+                continue
+            try:
+                drained = self._drain_once()
+            except Exception as e:
+                # Keep the loop alive: an unexpected error here would
+                # otherwise strand the spool until restart
+                print(f"[outbox] drain error: {e}", flush=True)
+                drained = False
+            if drained:
+                backoff = self.retry_secs
+                self._down_until = 0.0
+                continue
+            if not self._running:
+                return
+            backoff = min(backoff * 2, self.max_retry_secs)
+            # New spool writes set the wake-up event; still wait out the backoff
+            time.sleep(backoff)
+
+    # ---------- stats ----------
+
+    def stats(self) -> dict:
+        """Counters since start, latency percentiles / fill since the last call."""
+        with self._spool_lock:
+            spool_depth = self._spool_depth
+        with self._cond:
+            send_ms, self._send_ms = sorted(self._send_ms), []
+            queued_ms, self._queued_ms = sorted(self._queued_ms), []
+            batches, entries = self._batches, self._batch_entries
+            self._batches = self._batch_entries = 0
+            return {
+                "pending": len(self._pending),
+                "sent": self.sent,
+                "spooled": self.spooled,
+                "dead_lettered": self.dead,
+                "spool_depth": spool_depth,
+                "batches": batches,
+                "batch_fill_ratio": entries / (batches * MAX_BATCH_ENTRIES) if batches else None,
+                "send_ms_p50": _percentile(send_ms, 0.50),
+                "send_ms_p95": _percentile(send_ms, 0.95),
+                "queued_ms_p50": _percentile(queued_ms, 0.50),
+                "queued_ms_p95": _percentile(queued_ms, 0.95),
+            }
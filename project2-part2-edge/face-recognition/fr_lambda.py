@@ -1,17 +1,47 @@
 import os
+import sys
 import json
 import base64
 import io
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-import boto3
-import numpy as np
-import torch
-from PIL import Image
-from facenet_pytorch import InceptionResnetV1
+# Shared helpers (common/) are packaged next to this file; in a repo checkout
+# they live two directories up.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from init_profile import InitProfile  # noqa: E402
+import metrics  # noqa: E402
+import profiling  # noqa: E402
 
 # ---------- Global init (runs once per container cold start) ----------
 
-sqs = boto3.client("sqs")
+_init = InitProfile("fr_lambda")
+
+
+def _make_sqs_client():
+    with _init.phase("sqs_client"):
+        import aws_clients
+
+        # Cached for the container's lifetime: warm invocations reuse the
+        # client and its kept-alive connections
+        return aws_clients.client("sqs")
+
+
+# Init work that doesn't need the model (boto3, gallery) runs on background
+# threads, overlapping the torch import and model construction below.
+_init_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="init")
+_sqs_future = _init_pool.submit(_make_sqs_client)
+
+# PIL and facenet_pytorch are imported lazily: only the legacy v1 payload
+# needs PIL, and a RESNET_ARTIFACT never needs facenet_pytorch.
+with _init.phase("import"):
+    import numpy as np
+    import torch
+
+    import face_payload
+    from gallery import Gallery
+    from gallery_store import LiveGallery, open_store
+    from inference import load_resnet
 
 # Set via Lambda console (Environment variable)
 RESPONSE_QUEUE_URL = os.environ.get("RESPONSE_QUEUE_URL")
@@ -19,43 +49,87 @@ RESPONSE_QUEUE_URL = os.environ.get("RESPONSE_QUEUE_URL")
 # Path to the weights file (copied in Dockerfile / Lambda package)
 WEIGHTS_PATH = os.environ.get("WEIGHTS_PATH", "/var/task/resnetV1_video_weights_1.pt")
 
-# ------------------ Load embeddings + labels once ---------------------
+# Gallery storage: float32 (exact), float16, or int8 (per-row scales, ~4x smaller)
+GALLERY_MODE = os.environ.get("GALLERY_MODE", "float32").strip().lower() or "float32"
+
+# Number of nearest labels to report, and an optional L2 distance above which
+# the face is reported as "Unknown" (unset = always return the nearest label)
+MATCH_TOP_K = int(os.environ.get("MATCH_TOP_K", "1"))
+UNKNOWN_THRESHOLD = os.environ.get("UNKNOWN_THRESHOLD", "").strip()
+UNKNOWN_THRESHOLD = float(UNKNOWN_THRESHOLD) if UNKNOWN_THRESHOLD else None
 
-_saved = torch.load(WEIGHTS_PATH, map_location="cpu")
-_embedding_list_raw = _saved[0]   # list of tensors/arrays
-_name_list = _saved[1]            # list of strings
+# Optional append-only gallery store (s3://bucket/prefix or a directory) with
+# enrollments applied on top of WEIGHTS_PATH; VERSION is checked this often
+GALLERY_STORE = os.environ.get("GALLERY_STORE", "").strip()
+GALLERY_REFRESH_SECS = float(os.environ.get("GALLERY_REFRESH_SECS", "30"))
 
-_emb_matrix_list = []
-for emb_db in _embedding_list_raw:
-    t = emb_db
-    # Handle numpy arrays as well as tensors
-    if isinstance(t, np.ndarray):
-        t = torch.from_numpy(t)
-    # Flatten (e.g., (1, 512) -> (512,))
-    if t.ndim > 1:
-        t = t.view(-1)
-    _emb_matrix_list.append(t.float())
+# Optional queue for edge feedback: requests carrying a "track_id" (or
+# "feedback": true) get {"track_id", "label", ...} sent here so the edge can
+# answer later frames of that track itself and time the cloud round trip
+FEEDBACK_QUEUE_URL = os.environ.get("FEEDBACK_QUEUE_URL", "").strip()
 
-# Final DB embedding matrix, shape: (N, 512)
-_emb_matrix = torch.stack(_emb_matrix_list, dim=0)
+# Run one dummy forward pass at init so the first request doesn't pay for
+# lazy allocations / graph optimization (FACE_SIZE = expected crop size)
+WARMUP_ON_INIT = os.environ.get("WARMUP_ON_INIT", "1") == "1"
+FACE_SIZE = int(os.environ.get("FACE_SIZE", "240"))
+
+# Metrics: METRICS_DUMP_SECS logs a "[metrics] {...}" line at most this often
+# (checked at the end of each invocation). A request's "trace" is extended
+# here, observed, and returned in the response (see common/metrics.py).
+metrics.configure("fr_lambda", background=False)
+_REQUESTS = metrics.registry.counter("requests_total", "recognition requests by outcome")
+_DECODE_MS = metrics.registry.histogram("decode_ms", "face payload decode time per request")
+_EMBED_MS = metrics.registry.histogram("embed_ms", "forward pass + gallery match time per request")
+
+# Handler profiling: PROFILE_EVERY=N or PROFILE_ON_START=1, PROFILE_TORCH=1
+# for the forward pass's ops (see common/profiling.py)
+_profiler = profiling.Profiler("fr_lambda")
+
+
+def _load_gallery():
+    with _init.phase("gallery"):
+        return LiveGallery(
+            Gallery.from_weights(WEIGHTS_PATH, mode=GALLERY_MODE),
+            open_store(GALLERY_STORE) if GALLERY_STORE else None,
+            refresh_secs=GALLERY_REFRESH_SECS,
+        )
+
+
+_gallery_future = _init_pool.submit(_load_gallery)
 
 # Use CPU (Lambda has no GPU by default)
 device = torch.device("cpu")
 
-_emb_matrix = _emb_matrix.to(device)
-
-# Load FaceNet model once
-_resnet = InceptionResnetV1(pretrained="vggface2").eval().to(device)
+# Load FaceNet model once (RESNET_ARTIFACT / RESNET_BACKEND / TORCH_NUM_THREADS)
+with _init.phase("resnet"):
+    _resnet = load_resnet()
 
 # Disable autograd globally (no training here)
 torch.set_grad_enabled(False)
 
+if WARMUP_ON_INIT:
+    with _init.phase("warmup"), torch.no_grad():
+        _resnet(torch.zeros(1, 3, FACE_SIZE, FACE_SIZE))
+
+with _init.phase("wait_background"):
+    _gallery = _gallery_future.result()
+    sqs = _sqs_future.result()
+_init_pool.shutdown(wait=False)
+
+print(
+    f"[FR] gallery: {len(_gallery.current())} entries (version {_gallery.version}), "
+    f"mode={GALLERY_MODE}, {_gallery.current().nbytes} bytes"
+)
+_init.report()
+
 
 def _preprocess_face_from_b64(face_b64: str) -> torch.Tensor:
     """
     Decode base64 JPEG, convert to tensor, normalize as expected by InceptionResnetV1.
     Output shape: (1, 3, 240, 240) on the correct device.
     """
+    from PIL import Image
+
     face_bytes = base64.b64decode(face_b64)
     img = Image.open(io.BytesIO(face_bytes)).convert("RGB")
     img = img.resize((240, 240))
@@ -70,27 +144,41 @@ def _preprocess_face_from_b64(face_b64: str) -> torch.Tensor:
     return x.to(device)
 
 
-def _recognize_face(face_b64: str) -> str:
+def _preprocess_face(body: dict) -> torch.Tensor:
     """
-    Compute embedding for input face and find nearest neighbor in _emb_matrix.
-    Uses squared L2 distance (same nearest neighbor as plain L2).
+    Decode the request's face crop: v2 payloads go straight to a tensor at
+    their native size; legacy v1 "face_image" JPEGs take the PIL path.
     """
-    x = _preprocess_face_from_b64(face_b64)
+    if face_payload.detect_format(body) == "v2":
+        return face_payload.decode_v2(body["face"])
+    return _preprocess_face_from_b64(body["face_image"])
 
-    with torch.no_grad():
-        emb = _resnet(x)[0].float()   # shape (512,)
 
-        # Vectorized squared L2: d^2 = sum_i (emb_i - db_i)^2 over dim=1
-        emb_row = emb.unsqueeze(0)          # (1, 512)
-        diff = _emb_matrix - emb_row        # (N, 512)
-        dists = (diff * diff).sum(dim=1)    # (N,)
+def _preprocess_request(body: dict) -> torch.Tensor:
+    """(N, 3, H, W) batch of the request's faces: one, or all of a "faces" message."""
+    if "faces" in body:
+        return torch.cat([_preprocess_face(f) for f in body["faces"]])
+    return _preprocess_face(body)
+
 
-        min_idx = int(torch.argmin(dists).item())
+def _recognize_faces(x: torch.Tensor):
+    """
+    Embed a batch of preprocessed faces in one forward pass and return the
+    top-k gallery matches (nearest first) per face as lists of
+    Match(label, distance).
+    """
+    with torch.no_grad():
+        emb = _resnet(x).float()   # shape (N, 512)
 
-    return _name_list[min_idx]
+    return _gallery.current().match_many(emb, k=MATCH_TOP_K, threshold=UNKNOWN_THRESHOLD)
 
 
 def lambda_handler(event, context):
+    with _profiler.request():
+        return _handle_records(event)
+
+
+def _handle_records(event):
     """
     SQS-triggered Lambda handler.
 
@@ -112,22 +200,90 @@ def lambda_handler(event, context):
         for record in records:
             body = json.loads(record["body"])
             request_id = body["request_id"]
-            face_b64 = body["face_image"]
-
+            traced = isinstance(body.get("trace"), list)
+            if traced:
+                metrics.mark(body, "fr.dequeue")
             print(f"[FR] processing request_id={request_id}")
 
-            label = _recognize_face(face_b64)
-            print(f"[FR] recognized label={label} for request_id={request_id}")
+            t0 = time.perf_counter()
+            x = _preprocess_request(body)
+            t1 = time.perf_counter()
+            per_face = _recognize_faces(x)
+            t2 = time.perf_counter()
+            matches = per_face[0]
+            _DECODE_MS.observe((t1 - t0) * 1000.0)
+            _EMBED_MS.observe((t2 - t1) * 1000.0)
+
+            label = matches[0].label
+            print(
+                f"[FR] recognized label={label} (dist={matches[0].distance:.4f}) "
+                f"for request_id={request_id}"
+            )
+            print(
+                f"[FR] request_id={request_id} format={face_payload.detect_format(body)} "
+                f"encode_ms={body.get('timing', {}).get('encode_ms')} "
+                f"decode_ms={(t1 - t0) * 1000.0:.3f} embed_ms={(t2 - t1) * 1000.0:.3f} faces={len(per_face)}"
+            )
 
             out_msg = {
                 "request_id": request_id,
                 "result": label,
+                "distance": round(matches[0].distance, 4),
             }
+            if MATCH_TOP_K > 1:
+                out_msg["matches"] = [
+                    {"label": m.label, "distance": round(m.distance, 4)} for m in matches
+                ]
+            if "faces" in body:
+                # Multi-face request: per-face labels with the detector's boxes;
+                # "result" above is the largest face
+                out_msg["faces"] = [
+                    {
+                        "box": f.get("box"),
+                        "label": m[0].label,
+                        "distance": round(m[0].distance, 4),
+                        **({"track_id": f["track_id"]} if f.get("track_id") else {}),
+                    }
+                    for f, m in zip(body["faces"], per_face)
+                ]
+                if "part" in body:
+                    out_msg["part"] = body["part"]
+            track_id = body.get("track_id")
+            if track_id:
+                out_msg["track_id"] = track_id
+            if body.get("reply_to"):
+                # Edge relays results to this IPC topic instead of clients polling SQS
+                out_msg["reply_to"] = body["reply_to"]
+
+            if traced:
+                out_msg["trace"] = body["trace"]
+                metrics.observe_trace(metrics.mark(out_msg, "fr.respond")["trace"])
 
             sqs.send_message(
                 QueueUrl=RESPONSE_QUEUE_URL,
                 MessageBody=json.dumps(out_msg)
             )
+            _REQUESTS.inc(outcome="answered")
+
+            if FEEDBACK_QUEUE_URL:
+                if "faces" in body:
+                    tracked = [(f.get("track_id"), m[0]) for f, m in zip(body["faces"], per_face)]
+                else:
+                    tracked = [(track_id, matches[0])]
+                for i, (tid, m) in enumerate(tracked):
+                    # One untracked feedback per request still times the round trip
+                    if not (tid or (i == 0 and body.get("feedback"))):
+                        continue
+                    sqs.send_message(
+                        QueueUrl=FEEDBACK_QUEUE_URL,
+                        MessageBody=json.dumps({
+                            "track_id": tid,
+                            "label": m.label,
+                            "distance": round(m.distance, 4),
+                            "request_id": request_id,
+                            "edge_sent_at": body.get("edge_sent_at") if i == 0 else None,
+                        })
+                    )
 
             processed += 1
 
@@ -137,9 +293,12 @@ def lambda_handler(event, context):
         }
 
     except Exception as e:
+        _REQUESTS.inc(outcome="error")
         print(f"[FR] ERROR: {e}")
         return {
             "statusCode": 500,
             "body": json.dumps({"error": str(e)})
         }
+    finally:
+        metrics.registry.maybe_dump()
 
@@ -0,0 +1,173 @@
+"""
+fd_component over the in-process Greengrass IPC (local_ipc) and fake SQS:
+every answer - No-Face, a tracked (cached) label, a relayed cloud result -
+must reach the result topic of the client that sent the frame.
+
+    python -m pytest project2-part2-edge/tests
+"""
+import base64
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+import torch
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FD_DIR = os.path.join(HERE, "..", "face-detection")
+sys.path.insert(0, os.path.join(HERE, "..", "..", "common"))
+sys.path.insert(0, FD_DIR)
+
+from aws_fakes import FakeAws, install_greengrass_ipc  # noqa: E402
+
+BOX = [10.0, 10.0, 110.0, 130.0]
+
+
+@pytest.fixture(scope="module")
+def edge(tmp_path_factory):
+    """fd_component loaded against fakes, with its relay running."""
+    workdir = tmp_path_factory.mktemp("edge")
+    fake = FakeAws()
+    fake.install()
+    ipc = install_greengrass_ipc()
+    saved = dict(os.environ)
+    os.environ.update(
+        IPC_BACKEND="local",
+        ASU_ID="test",
+        RESULT_TOPIC="clients/{client}/results",
+        REQUEST_QUEUE_URL=fake.create_queue("test-req-queue"),
+        # Short visibility timeout: a failed relay comes back within the test
+        RESPONSE_QUEUE_URL=fake.create_queue("test-resp-queue", {"VisibilityTimeout": "1"}),
+        FEEDBACK_QUEUE_URL=fake.create_queue("test-feedback-queue"),
+        OUTBOX_SPOOL=str(workdir / "outbox-spool.jsonl"),
+        DEDUP_PATH=str(workdir / "dedup.bin"),
+        POOL_WORKERS="1",
+    )
+    try:
+        spec = importlib.util.spec_from_file_location("test_fd_component", os.path.join(FD_DIR, "fd_component.py"))
+        fd = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(fd)
+        threading.Thread(target=fd._response_relay_loop, name="test-relay", daemon=True).start()
+
+        results = []
+        unsubscribe = ipc.broker.subscribe(
+            "clients/+/results", lambda topic, payload: results.append((topic, json.loads(payload)))
+        )
+        yield fd, fake, ipc.broker, results
+        unsubscribe()
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+        fake.uninstall()
+
+
+def _frame(request_id: str, client_id: str) -> str:
+    return json.dumps({
+        "encoded": base64.b64encode(b"frame").decode(),
+        "request_id": request_id,
+        "filename": f"{request_id}.jpg",
+        "client_id": client_id,
+    })
+
+
+def _wait_for(results, request_id: str, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        found = [(topic, msg) for topic, msg in results if msg.get("request_id") == request_id]
+        if found:
+            return found
+        time.sleep(0.02)
+    raise AssertionError(f"no result for {request_id}")
+
+
+def test_no_face_reaches_client_topic(edge, monkeypatch):
+    fd, _, broker, results = edge
+    monkeypatch.setattr(fd, "_detect", lambda img_bytes: [])
+
+    fd._process_frame_message(_frame("nf-1", "cam-1"))
+    broker.drain()
+
+    [(topic, msg)] = _wait_for(results, "nf-1")
+    assert topic == "clients/cam-1/results"
+    assert msg["result"] == "No-Face"
+
+
+def test_tracked_label_reaches_client_topic(edge, monkeypatch):
+    fd, _, broker, results = edge
+    face = torch.rand(3, fd.FACE_SIZE, fd.FACE_SIZE)
+    monkeypatch.setattr(fd, "_detect", lambda img_bytes: [(face, 0.99, BOX)])
+    sent = []
+    monkeypatch.setattr(fd._outbox, "send", lambda queue_url, body: sent.append(json.loads(body)))
+
+    # First sighting goes to the cloud with a new track id...
+    fd._process_frame_message(_frame("tr-1", "cam-2"))
+    assert [m["request_id"] for m in sent] == ["tr-1"]
+    assert sent[0]["reply_to"] == "clients/cam-2/results"
+
+    # ...whose label, once fed back, answers the next frame on the edge
+    fd._tracker.learn(sent[0]["track_id"], "Alice")
+    fd._process_frame_message(_frame("tr-2", "cam-2"))
+    broker.drain()
+
+    assert len(sent) == 1
+    [(topic, msg)] = _wait_for(results, "tr-2")
+    assert topic == "clients/cam-2/results"
+    assert msg["result"] == "Alice"
+
+
+def test_relay_publishes_to_reply_topic(edge):
+    fd, fake, _, results = edge
+    sqs = fake.client("sqs")
+    sqs.send_message(
+        QueueUrl=fd.RESPONSE_QUEUE_URL,
+        MessageBody=json.dumps({"request_id": "rl-1", "result": "Bob", "reply_to": "clients/cam-3/results"}),
+    )
+    sqs.send_message(QueueUrl=fd.RESPONSE_QUEUE_URL, MessageBody=json.dumps({"request_id": "rl-2", "result": "Carol"}))
+
+    assert _wait_for(results, "rl-1") == [("clients/cam-3/results", {"request_id": "rl-1", "result": "Bob"})]
+    # No reply_to: the device's own thing
+    assert _wait_for(results, "rl-2") == [("clients/test-IoTThing/results", {"request_id": "rl-2", "result": "Carol"})]
+
+
+def test_relay_retries_only_the_failed_publish(edge, monkeypatch):
+    fd, fake, broker, results = edge
+    publish = fd._publish_result
+    failed = []
+
+    def flaky(topic, out_msg):
+        if out_msg["request_id"] == "rf-bad" and not failed:
+            failed.append(out_msg["request_id"])
+            raise RuntimeError("IPC unavailable")
+        publish(topic, out_msg)
+
+    monkeypatch.setattr(fd, "_publish_result", flaky)
+    sqs = fake.client("sqs")
+    # Under the queue's lock, so the relay receives both in one batch
+    with fake.queues["test-resp-queue"].cond:
+        sqs.send_message_batch(
+            QueueUrl=fd.RESPONSE_QUEUE_URL,
+            Entries=[
+                {"Id": str(i), "MessageBody": json.dumps({"request_id": rid, "result": "Dave"})}
+                for i, rid in enumerate(["rf-ok", "rf-bad"])
+            ],
+        )
+
+    # The failed one is redelivered after its visibility timeout
+    _wait_for(results, "rf-bad")
+    broker.drain()
+    assert failed == ["rf-bad"]
+    assert len(_wait_for(results, "rf-ok")) == 1
+    assert len(_wait_for(results, "rf-bad")) == 1
+
+    # Both deleted once published (the delete follows the publish)
+    deadline = time.monotonic() + 5
+    while True:
+        attrs = sqs.get_queue_attributes(QueueUrl=fd.RESPONSE_QUEUE_URL)["Attributes"]
+        left = int(attrs["ApproximateNumberOfMessages"]) + int(attrs["ApproximateNumberOfMessagesNotVisible"])
+        if not left or time.monotonic() > deadline:
+            break
+        time.sleep(0.05)
+    assert left == 0
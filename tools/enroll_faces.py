@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Enroll new identities into a gallery store (see common/gallery_store.py).
+
+Faces go through the same MTCNN crop and v2 wire decoding the pipeline uses,
+so enrolled embeddings match what the recognition Lambdas compute. All images
+in one run are committed as a single segment; running recognizers pick them
+up on their next GALLERY_REFRESH_SECS check.
+
+    # one identity
+    python tools/enroll_faces.py --store s3://my-bucket/gallery --label alice a1.jpg a2.jpg
+    # a directory laid out as <root>/<label>/*.jpg
+    python tools/enroll_faces.py --store /mnt/gallery --dir ./new_people
+"""
+import argparse
+import os
+import sys
+
+import torch
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+import face_payload  # noqa: E402
+import gallery_store  # noqa: E402
+from inference import load_resnet  # noqa: E402
+
+_IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+
+
+def _collect(args):
+    if args.dir:
+        for label in sorted(os.listdir(args.dir)):
+            sub = os.path.join(args.dir, label)
+            if not os.path.isdir(sub):
+                continue
+            for name in sorted(os.listdir(sub)):
+                if name.lower().endswith(_IMAGE_EXTS):
+                    yield label, os.path.join(sub, name)
+    else:
+        for path in args.images:
+            yield args.label, path
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--store", required=True, help="gallery store: s3://bucket/prefix or a directory")
+    ap.add_argument("--dir", help="root directory of <label>/<image> files")
+    ap.add_argument("--label", help="label for the images given on the command line")
+    ap.add_argument("--face-size", type=int, default=int(os.environ.get("FACE_SIZE", "240")))
+    ap.add_argument("images", nargs="*")
+    args = ap.parse_args()
+    if not args.dir and not (args.label and args.images):
+        ap.error("pass --dir, or --label with one or more images")
+
+    from facenet_pytorch import MTCNN
+
+    torch.set_grad_enabled(False)
+    mtcnn = MTCNN(image_size=args.face_size, margin=0, min_face_size=20)
+    resnet = load_resnet()
+
+    embeddings, labels = [], []
+    for label, path in _collect(args):
+        face = mtcnn(Image.open(path).convert("RGB"))
+        if face is None:
+            print(f"[enroll] no face in {path}; skipped")
+            continue
+        x = face_payload.decode_v2(face_payload.encode_v2(face)["face"])
+        embeddings.append(resnet(x)[0].float().numpy())
+        labels.append(label)
+        print(f"[enroll] {label}: {path}")
+
+    if not labels:
+        print("[enroll] nothing to enroll")
+        return 1
+
+    store = gallery_store.open_store(args.store)
+    version = gallery_store.append(store, embeddings, labels)
+    print(f"[enroll] committed {len(labels)} embeddings as version {version}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Pre-serialize InceptionResnetV1 as a frozen TorchScript artifact so the
+recognition Lambdas load it with torch.jit.load instead of rebuilding it.
+
+Run at image build time and set RESNET_ARTIFACT to the output path:
+
+    python tools/export_models.py --backend script --out /var/task/resnet_script.pt
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from inference import BACKENDS, export_resnet  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--out", required=True)
+    ap.add_argument("--backend", default="script", choices=[b for b in BACKENDS if b != "eager"])
+    ap.add_argument("--image-size", type=int, default=int(os.environ.get("FACE_SIZE", "240")))
+    ap.add_argument("--pretrained", default="vggface2", help="'vggface2', 'casia-webface' or 'none'")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    pretrained = None if args.pretrained == "none" else args.pretrained
+    export_resnet(args.out, args.backend, image_size=args.image_size, pretrained=pretrained)
+    print(
+        f"[export] {args.backend} -> {args.out} "
+        f"({os.path.getsize(args.out)} bytes, {time.perf_counter() - t0:.1f}s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,532 @@
+#!/usr/bin/env python3
+"""
+Load generator for the pipelines' entry points, with latency percentiles.
+
+Targets:
+  http          multipart POST / with "inputFile" (both web tiers); the
+                answer is "<stem>:<label>"
+  function-url  fd_lambda's JSON contract ({content, request_id, filename},
+                or a "frames" array with --frames-per-request > 1)
+  mqtt          {encoded, request_id, filename} frames on an MQTT topic
+                (the FaceDetection component)
+
+For function-url and mqtt a request completes when its {request_id,
+result} arrives on --response-queue-url (or --result-topic); without either,
+function-url completes on the HTTP response.
+
+Load:
+  --rate R            open loop: R arrivals/s (--arrivals fixed|poisson);
+                      latency counts from the scheduled send time, so a
+                      saturated system isn't hidden by a slowed client
+  --concurrency N     closed loop: N clients, each sending its next request
+                      when the previous one completes
+
+Images in --images are replayed round robin; with --labels (CSV of
+name,label) answers are checked against the expected label. The summary
+(throughput, error rates, p50/p95/p99/p99.9, histogram) is printed as JSON
+and written to --out. Frames carry a trace (common/metrics.py); the hops of
+the traces returned with results are summarized under "stages".
+
+    python tools/loadgen.py http --url http://127.0.0.1:8000/ --images ./faces --labels labels.csv --rate 20
+    python tools/loadgen.py function-url --url https://<id>.lambda-url.us-east-1.on.aws/ \\
+        --images ./frames --response-queue-url https://sqs.../resp --concurrency 8
+    python tools/loadgen.py mqtt --mqtt-host <endpoint> --mqtt-port 8883 --ca AmazonRootCA1.pem \\
+        --cert dev.pem.crt --key dev.pem.key --topic clients/<ASU_ID>-IoTThing --images ./frames \\
+        --response-queue-url https://sqs.../resp --rate 5
+    # against an in-process pipeline (tools/local_pipeline.py)
+    python tools/loadgen.py mqtt --local p2-edge --pretrained none --images ./frames --rate 2 --duration 30
+"""
+import argparse
+import base64
+import json
+import math
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+import local_pipeline  # noqa: E402
+import metrics  # noqa: E402
+
+TARGETS = ("http", "function-url", "mqtt")
+
+# Histogram bucket upper bounds (ms)
+_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 60000, 120000, math.inf]
+
+# Local pipeline started for each target by --local
+_LOCAL_DEFAULT = {"http": "p1-app", "function-url": "p2-lambdas", "mqtt": "p2-edge"}
+
+
+def _percentile(sorted_vals, q):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_vals:
+        return None
+    return round(sorted_vals[min(len(sorted_vals) - 1, int(math.ceil(q * len(sorted_vals))) - 1)], 3)
+
+
+class Recorder:
+    """Outcomes and latencies of completed requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = []        # ms, successful (correct or unchecked) requests
+        self.outcomes = {}         # outcome -> count
+        self.examples = {}         # outcome -> first detail seen
+
+    def add(self, latency_ms: float, outcome: str, detail: str = "") -> None:
+        with self._lock:
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            if outcome in ("ok", "unchecked"):
+                self.latencies.append(latency_ms)
+            elif outcome not in self.examples:
+                self.examples[outcome] = detail[:300]
+
+    def summary(self, elapsed: float) -> dict:
+        with self._lock:
+            lat = sorted(self.latencies)
+            outcomes = dict(self.outcomes)
+            examples = dict(self.examples)
+        total = sum(outcomes.values())
+        good = outcomes.get("ok", 0) + outcomes.get("unchecked", 0)
+        hist, start = [], 0
+        for bound in _BUCKETS_MS:
+            end = start
+            while end < len(lat) and lat[end] <= bound:
+                end += 1
+            hist.append({"le_ms": bound if bound != math.inf else "inf", "count": end - start})
+            start = end
+        return {
+            "requests": total,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(good / elapsed, 3) if elapsed > 0 else None,
+            "outcomes": outcomes,
+            "error_rate": round((total - good) / total, 5) if total else None,
+            "latency_ms": {
+                "mean": round(sum(lat) / len(lat), 3) if lat else None,
+                "min": round(lat[0], 3) if lat else None,
+                "p50": _percentile(lat, 0.50),
+                "p95": _percentile(lat, 0.95),
+                "p99": _percentile(lat, 0.99),
+                "p99.9": _percentile(lat, 0.999),
+                "max": round(lat[-1], 3) if lat else None,
+            },
+            "histogram": hist,
+            "error_examples": examples,
+        }
+
+
+class ResultWaiters:
+    """request_id -> one-slot queue, filled by a result consumer."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = {}
+
+    def add(self, request_id: str) -> queue.Queue:
+        q = queue.Queue(maxsize=1)
+        with self._lock:
+            self._waiters[request_id] = q
+        return q
+
+    def discard(self, request_id: str) -> None:
+        with self._lock:
+            self._waiters.pop(request_id, None)
+
+    def deliver(self, payload) -> None:
+        try:
+            data = json.loads(payload) if isinstance(payload, (str, bytes, bytearray)) else payload
+        except ValueError:
+            return
+        with self._lock:
+            q = self._waiters.pop(data.get("request_id"), None)
+        if q is not None:
+            try:
+                q.put_nowait(data)
+            except queue.Full:
+                pass
+
+
+def _consume_queue(sqs, queue_url: str, waiters: ResultWaiters, stop: threading.Event) -> None:
+    while not stop.is_set():
+        try:
+            resp = sqs.receive_message(QueueUrl=queue_url, MaxNumberOfMessages=10, WaitTimeSeconds=1)
+            msgs = resp.get("Messages", [])
+            for m in msgs:
+                waiters.deliver(m["Body"])
+            if msgs:
+                sqs.delete_message_batch(
+                    QueueUrl=queue_url,
+                    Entries=[{"Id": str(i), "ReceiptHandle": m["ReceiptHandle"]} for i, m in enumerate(msgs)],
+                )
+        except Exception as e:
+            print(f"[loadgen] response queue error: {e}", file=sys.stderr, flush=True)
+            time.sleep(0.5)
+
+
+def _check_label(stem: str, label: str, labels: dict):
+    """(outcome, detail) for an answer `label` to image `stem`."""
+    expected = labels.get(stem)
+    if expected is None:
+        return "unchecked", ""
+    if label == expected:
+        return "ok", ""
+    return "wrong_answer", f"{stem}: expected {expected!r}, got {label!r}"
+
+
+class Target:
+    """send(image) -> (outcome, detail) for one request, blocking until it completes."""
+
+    def __init__(self, args, images, labels, pipe=None):
+        self.args = args
+        self.images = images        # [(stem, filename, bytes, base64)]
+        self.labels = labels
+        self.pipe = pipe
+        self.waiters = None
+        self._stop = threading.Event()
+        self._mqtt = None
+        self._http = threading.local()
+        # Per-hop durations from the traces results come back with
+        self.traces = metrics.Registry("loadgen")
+
+        sqs, queue_url = None, args.response_queue_url
+        if pipe is not None and args.target != "http":
+            sqs, queue_url = pipe.fake.client("sqs"), pipe.response_queue_url
+        elif queue_url:
+            import aws_clients
+
+            sqs = aws_clients.client("sqs", region_name=args.region, concurrency=args.result_pollers)
+        if queue_url and not args.no_results:
+            self.waiters = ResultWaiters()
+            for i in range(args.result_pollers):
+                threading.Thread(
+                    target=_consume_queue, args=(sqs, queue_url, self.waiters, self._stop),
+                    name=f"results-{i}", daemon=True,
+                ).start()
+        if args.result_topic and not args.no_results:
+            self.waiters = self.waiters or ResultWaiters()
+
+        if args.target == "mqtt" and pipe is None:
+            self._mqtt = self._connect_mqtt()
+
+    def _session(self):
+        import requests
+
+        s = getattr(self._http, "session", None)
+        if s is None:
+            s = self._http.session = requests.Session()
+        return s
+
+    def _connect_mqtt(self):
+        try:
+            import paho.mqtt.client as mqtt
+        except ImportError:
+            raise SystemExit("mqtt target needs paho-mqtt (pip install paho-mqtt), or use --local")
+        a = self.args
+        client = mqtt.Client(client_id=f"loadgen-{uuid.uuid4().hex[:8]}")
+        if a.ca or a.cert:
+            client.tls_set(ca_certs=a.ca, certfile=a.cert, keyfile=a.key)
+        if a.result_topic:
+            client.on_message = lambda c, u, msg: self.waiters.deliver(msg.payload)
+        client.connect(a.mqtt_host, a.mqtt_port)
+        if a.result_topic:
+            client.subscribe(a.result_topic, qos=1)
+        client.loop_start()
+        return client
+
+    def start_local_results(self) -> None:
+        if self.pipe is not None and self.args.result_topic and self.pipe.broker is not None:
+            self.pipe.broker.subscribe(self.args.result_topic, lambda topic, payload: self.waiters.deliver(payload))
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._mqtt is not None:
+            self._mqtt.loop_stop()
+            self._mqtt.disconnect()
+
+    def _release(self, pending) -> None:
+        """Drop the waiters of a request that stops waiting early (results may never come)."""
+        for request_id, _, _ in pending:
+            self.waiters.discard(request_id)
+
+    def _await(self, pending, deadline):
+        """Wait for every (stem, waiter) result; (outcome, detail) of the first problem, else ok."""
+        worst = ("unchecked", "")
+        for k, (request_id, stem, w) in enumerate(pending):
+            try:
+                result = w.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                self._release(pending[k:])
+                return "timeout", f"no result for {request_id} ({stem})"
+            if isinstance(result.get("trace"), list):
+                metrics.observe_trace(metrics.mark(result, "client.recv")["trace"], self.traces)
+            outcome, detail = _check_label(stem, str(result.get("result")), self.labels)
+            if outcome == "wrong_answer":
+                self._release(pending[k + 1:])
+                return outcome, detail
+            if outcome == "ok":
+                worst = ("ok", "")
+        return worst
+
+    # ---------- targets ----------
+
+    def send(self, i: int):
+        a = self.args
+        deadline = time.monotonic() + a.timeout
+        if a.target == "http":
+            stem, filename, data, _ = self.images[i % len(self.images)]
+            r = self._session().post(a.url, files={"inputFile": (filename, data)}, timeout=a.timeout)
+            if r.status_code != 200:
+                return f"http_{r.status_code}", r.text
+            got_stem, _, label = r.text.strip().partition(":")
+            if got_stem != stem:
+                return "wrong_answer", f"{stem}: got {r.text!r}"
+            return _check_label(stem, label, self.labels)
+
+        n = a.frames_per_request if a.target == "function-url" else 1
+        frames = []
+        for k in range(n):
+            stem, filename, _, b64 = self.images[(i * n + k) % len(self.images)]
+            frames.append((str(uuid.uuid4()), stem, filename, b64))
+        pending = []
+        if self.waiters is not None:
+            pending = [(rid, stem, self.waiters.add(rid)) for rid, stem, _, _ in frames]
+
+        if a.target == "mqtt":
+            for rid, _, filename, b64 in frames:
+                payload = json.dumps(metrics.mark({"encoded": b64, "request_id": rid, "filename": filename},
+                                                  "client.send"))
+                try:
+                    if self.pipe is not None:
+                        self.pipe.publish(payload)
+                    else:
+                        self._mqtt.publish(a.topic, payload, qos=1)
+                except Exception:
+                    self._release(pending)
+                    raise
+            if not pending:
+                return "unchecked", ""
+            return self._await(pending, deadline)
+
+        if n == 1:
+            rid, _, filename, b64 = frames[0]
+            body = metrics.mark({"content": b64, "request_id": rid, "filename": filename}, "client.send")
+        else:
+            body = {"frames": [
+                metrics.mark({"content": b64, "request_id": rid, "filename": fn}, "client.send")
+                for rid, _, fn, b64 in frames
+            ]}
+        try:
+            r = self._session().post(a.url, json=body, timeout=a.timeout)
+        except Exception:
+            self._release(pending)
+            raise
+        if r.status_code != 200:
+            self._release(pending)
+            return f"http_{r.status_code}", r.text
+        resp = r.json()
+        # Frames answered synchronously (no face, bad frame) never reach the response queue
+        statuses = resp.get("frames") or [{"request_id": resp.get("request_id"), "message": resp.get("message")}]
+        stems = {rid: stem for rid, stem, _, _ in frames}
+        sync_done = set()
+        for s in statuses:
+            if s.get("status") == "error":
+                self._release(pending)
+                return "frame_error", json.dumps(s)
+            if s.get("status") == "no_face" or s.get("message") == "no face detected":
+                sync_done.add(s.get("request_id"))
+        worst = ("unchecked", "")
+        for rid in sync_done:
+            if self.waiters is not None:
+                self.waiters.discard(rid)
+            outcome, detail = _check_label(stems.get(rid, ""), "No-Face", self.labels)
+            if outcome == "wrong_answer":
+                self._release(pending)
+                return outcome, detail
+            if outcome == "ok":
+                worst = ("ok", "")
+        pending = [p for p in pending if p[0] not in sync_done]
+        if not pending:
+            return worst
+        outcome, detail = self._await(pending, deadline)
+        return (outcome, detail) if outcome != "unchecked" else worst
+
+
+def _run_one(target: Target, recorder: Recorder, i: int, started: float) -> None:
+    try:
+        outcome, detail = target.send(i)
+    except Exception as e:
+        outcome, detail = "error", f"{type(e).__name__}: {e}"
+    recorder.add((time.perf_counter() - started) * 1000.0, outcome, detail)
+
+
+def run_open(target, recorder, args, rng) -> float:
+    """Arrivals on schedule regardless of completions; returns elapsed seconds."""
+    inflight = threading.Semaphore(args.max_inflight)
+    pool = ThreadPoolExecutor(max_workers=args.max_inflight, thread_name_prefix="req")
+    t0 = time.perf_counter()
+    next_at, i = t0, 0
+    while True:
+        if args.requests and i >= args.requests:
+            break
+        if not args.requests and next_at - t0 >= args.duration:
+            break
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        if inflight.acquire(blocking=False):
+            scheduled = next_at
+
+            def job(i=i, scheduled=scheduled):
+                try:
+                    _run_one(target, recorder, i, scheduled)
+                finally:
+                    inflight.release()
+
+            pool.submit(job)
+        else:
+            recorder.add(0.0, "client_saturated", f"more than {args.max_inflight} requests in flight")
+        i += 1
+        if args.arrivals == "poisson":
+            next_at += rng.expovariate(args.rate)
+        else:
+            next_at = t0 + i / args.rate
+    pool.shutdown(wait=True)
+    return time.perf_counter() - t0
+
+
+def run_closed(target, recorder, args) -> float:
+    """N clients, each sending its next request when the previous completes."""
+    counter = iter(range(10 ** 12))
+    lock = threading.Lock()
+    t0 = time.perf_counter()
+    end = t0 + args.duration
+
+    def client():
+        while True:
+            with lock:
+                i = next(counter)
+            if (args.requests and i >= args.requests) or (not args.requests and time.perf_counter() >= end):
+                return
+            _run_one(target, recorder, i, time.perf_counter())
+
+    threads = [threading.Thread(target=client, name=f"client-{c}") for c in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - t0
+
+
+def _load_images(path):
+    images = []
+    for p in local_pipeline.list_images(path):
+        with open(p, "rb") as f:
+            data = f.read()
+        name = os.path.basename(p)
+        images.append((os.path.splitext(name)[0], name, data, base64.b64encode(data).decode("ascii")))
+    return images
+
+
+def main():
+    ap = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="\n".join(__doc__.strip().splitlines()[1:]),
+    )
+    ap.add_argument("target", choices=TARGETS)
+    ap.add_argument("--url", help="http / function-url endpoint")
+    ap.add_argument("--timeout", type=float, default=60.0, help="per-request timeout (s)")
+    load = ap.add_mutually_exclusive_group(required=True)
+    load.add_argument("--rate", type=float, help="open loop: arrivals per second")
+    load.add_argument("--concurrency", type=int, help="closed loop: concurrent clients")
+    ap.add_argument("--arrivals", choices=("fixed", "poisson"), default="fixed")
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds of load (unless --requests)")
+    ap.add_argument("--requests", type=int, default=0, help="stop after this many requests")
+    ap.add_argument("--max-inflight", type=int, default=512, help="open loop: client-side cap")
+    ap.add_argument("--frames-per-request", type=int, default=1, help="function-url: frames per call")
+    ap.add_argument("--response-queue-url", help="SQS queue carrying {request_id, result}")
+    ap.add_argument("--result-topic", help="MQTT topic (filter) carrying {request_id, result}")
+    ap.add_argument("--result-pollers", type=int, default=2, help="response queue consumers")
+    ap.add_argument("--no-results", action="store_true", help="complete on send / HTTP response only")
+    ap.add_argument("--region", default=os.environ.get("AWS_REGION", "us-east-1"))
+    ap.add_argument("--mqtt-host", default="localhost")
+    ap.add_argument("--mqtt-port", type=int, default=1883)
+    ap.add_argument("--topic", help="mqtt: frame topic, e.g. clients/<ASU_ID>-IoTThing")
+    ap.add_argument("--ca")
+    ap.add_argument("--cert")
+    ap.add_argument("--key")
+    ap.add_argument("--local", nargs="?", const="", choices=("",) + local_pipeline.PIPELINES,
+                    help="start the pipeline in-process against the AWS fakes (default per target)")
+    ap.add_argument("--warmup", type=int, default=0, help="requests sent (and discarded) before measuring")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="also write the JSON summary here")
+    local_pipeline.add_fake_args(ap)
+    args = ap.parse_args()
+    if not args.images:
+        ap.error("--images is required")
+    if args.rate is not None and args.rate <= 0:
+        ap.error("--rate must be > 0")
+    if args.concurrency is not None and args.concurrency < 1:
+        ap.error("--concurrency must be >= 1")
+
+    images = _load_images(args.images)
+    if not images:
+        ap.error(f"no images in {args.images}")
+    labels = local_pipeline.read_labels(args.labels)
+
+    pipe = None
+    if args.local is not None:
+        name = args.local or _LOCAL_DEFAULT[args.target]
+        pipe = local_pipeline.start_pipeline(name, port=0, **local_pipeline.pipeline_opts(args))
+        args.url = args.url or pipe.url
+    elif args.target != "mqtt" and not args.url:
+        ap.error("--url is required (or --local)")
+    elif args.target == "mqtt" and not args.topic:
+        ap.error("--topic is required for mqtt (or --local)")
+
+    target = Target(args, images, labels, pipe)
+    target.start_local_results()
+    try:
+        if args.warmup:
+            warm = Recorder()
+            for i in range(args.warmup):
+                _run_one(target, warm, i, time.perf_counter())
+        recorder = Recorder()
+        if args.rate:
+            elapsed = run_open(target, recorder, args, random.Random(args.seed))
+        else:
+            elapsed = run_closed(target, recorder, args)
+    finally:
+        target.close()
+
+    summary = {
+        "target": args.target,
+        "url": args.url,
+        "local": (args.local or _LOCAL_DEFAULT[args.target]) if args.local is not None else None,
+        "mode": "open" if args.rate else "closed",
+        "rate": args.rate,
+        "arrivals": args.arrivals if args.rate else None,
+        "concurrency": args.concurrency,
+        "frames_per_request": args.frames_per_request,
+        "images": len(images),
+        **recorder.summary(elapsed),
+        "stages": target.traces.snapshot()["histograms"],
+    }
+    if pipe is not None:
+        summary["aws_calls"] = pipe.fake.stats()["calls"]
+        pipe.stop()
+    out = json.dumps(summary, indent=2)
+    print(out)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(out + "\n")
+
+
+if __name__ == "__main__":
+    main()
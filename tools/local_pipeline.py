@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Run one of the pipelines end to end on this machine against the in-process
+AWS fakes (common/aws_fakes.py): every component is the real module, loaded
+with boto3 patched and its queues / buckets / domains created in the fake.
+
+    # P1 Part 1: web tier + S3 + SimpleDB (labels seeded from a CSV of name,label)
+    python tools/local_pipeline.py p1-web --labels labels.csv --port 8000
+    # P1 Part 2: web tier + controller + app-tier instances on fake EC2
+    python tools/local_pipeline.py p1-app --labels labels.csv --images ./faces --predict-ms 300
+    # P2 Part 1: detection behind a local Function URL, recognition on the request queue
+    python tools/local_pipeline.py p2-lambdas --pretrained none --port 8080
+    # P2 Part 2: FaceDetection component on the fake IPC broker + recognition Lambda
+    python tools/local_pipeline.py p2-edge --pretrained none
+
+Component settings (FAST_DETECT, MULTI_FACE, POOL_WORKERS, ...) come from the
+environment as usual. --latency-ms / --service-latency add per-call latency
+to the fakes. App-tier instances run backend.py on a thread per instance
+that dies when the controller stops the instance; without
+--model-dir/model_infer.py they "predict" after --predict-ms by looking the
+image up in --images + --labels. --pretrained none builds an untrained
+InceptionResnetV1 (no weight download) and, unless WEIGHTS_PATH is set, a
+synthetic gallery of --gallery-size identities is generated.
+
+tools/loadgen.py can start these in-process (--local) or drive the HTTP
+entry points started here.
+"""
+import argparse
+import csv
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(_ROOT, "common"))
+from aws_fakes import FakeAws, SqsLambdaTrigger, install_greengrass_ipc  # noqa: E402
+
+PIPELINES = ("p1-web", "p1-app", "p2-lambdas", "p2-edge")
+
+_P1_WEB = os.path.join(_ROOT, "project1-part1-web-tier", "web-tier", "server.py")
+_P1_APP_WEB = os.path.join(_ROOT, "project1-part2-app-tier", "web-tier", "server.py")
+_P1_CONTROLLER = os.path.join(_ROOT, "project1-part2-app-tier", "web-tier", "controller.py")
+_P1_BACKEND = os.path.join(_ROOT, "project1-part2-app-tier", "app-tier", "backend.py")
+_P2_FD = os.path.join(_ROOT, "project2-part1-lambdas", "face-detection", "fd_lambda.py")
+_P2_FR = os.path.join(_ROOT, "project2-part1-lambdas", "face-recognition", "fr_lambda.py")
+_EDGE_DIR = os.path.join(_ROOT, "project2-part2-edge", "face-detection")
+_EDGE_FD = os.path.join(_EDGE_DIR, "fd_component.py")
+_EDGE_FR = os.path.join(_ROOT, "project2-part2-edge", "face-recognition", "fr_lambda.py")
+
+_IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+
+
+def _load(path: str, name: str):
+    """Import the module at `path` under `name` (several files share a name)."""
+    sys.path.insert(0, os.path.dirname(path))
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[name] = mod
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def read_labels(path: str) -> dict:
+    """{image stem: label} from a two-column CSV (a header row is skipped)."""
+    labels = {}
+    if not path:
+        return labels
+    with open(path, newline="") as f:
+        for row in csv.reader(f):
+            if len(row) < 2 or row[0].strip().lower() in ("image", "name", "filename", "item"):
+                continue
+            labels[os.path.splitext(os.path.basename(row[0].strip()))[0]] = row[1].strip()
+    return labels
+
+
+def list_images(path: str):
+    if not path:
+        return []
+    return sorted(
+        os.path.join(path, n) for n in os.listdir(path) if n.lower().endswith(_IMAGE_EXTS)
+    )
+
+
+class _LookupPredictor:
+    """App-tier model stand-in: the --labels entry for the image, after `delay_ms`."""
+
+    def __init__(self, images, labels, delay_ms):
+        self.delay = delay_ms / 1000.0
+        self.by_digest = {}
+        for p in images:
+            stem = os.path.splitext(os.path.basename(p))[0]
+            with open(p, "rb") as f:
+                self.by_digest[hashlib.sha1(f.read()).hexdigest()] = labels.get(stem, "Unknown")
+
+    def __call__(self, img_bytes: bytes) -> str:
+        time.sleep(self.delay)
+        return self.by_digest.get(hashlib.sha1(img_bytes).hexdigest(), "Unknown")
+
+
+class _FunctionUrlServer:
+    """Local Function URL: POST body -> handler({"body": ...}) -> statusCode / body."""
+
+    def __init__(self, handler, port: int):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        lambda_handler = handler
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length", "0") or 0))
+                event = {
+                    "version": "2.0",
+                    "rawPath": self.path,
+                    "headers": {k.lower(): v for k, v in self.headers.items()},
+                    "requestContext": {"http": {"method": "POST", "path": self.path}},
+                    "body": raw.decode("utf-8"),
+                    "isBase64Encoded": False,
+                }
+                try:
+                    result = lambda_handler(event, None)
+                    code, body = int(result.get("statusCode", 200)), result.get("body", "")
+                except Exception as e:
+                    code, body = 502, json.dumps({"message": f"handler raised: {e}"})
+                data = body.encode("utf-8") if isinstance(body, str) else json.dumps(body).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, fmt, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name="function-url", daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+
+
+class LocalPipeline:
+    """A running pipeline: entry points, the fake behind it, and stop()."""
+
+    def __init__(self, name: str, fake: FakeAws, workdir: str):
+        self.name = name
+        self.fake = fake
+        self.workdir = workdir
+        self.url = None                  # HTTP entry point
+        self.request_queue_url = None
+        self.response_queue_url = None
+        self.mqtt_topic = None
+        self.broker = None               # local_ipc broker (p2-edge)
+        self.modules = {}
+        self._stoppers = []
+
+    def publish(self, payload) -> None:
+        """Publish one frame message on the component's MQTT topic (p2-edge)."""
+        self.broker.publish(self.mqtt_topic, payload)
+
+    def stop(self) -> None:
+        for stop in reversed(self._stoppers):
+            try:
+                stop()
+            except Exception as e:
+                print(f"[local] stop failed: {e}", flush=True)
+        self.fake.uninstall()
+
+
+def _set_env(**values):
+    for k, v in values.items():
+        os.environ[k] = str(v)
+
+
+def _recognition_env(pipe: LocalPipeline, opts) -> None:
+    """Model and gallery for the recognition Lambdas when not configured."""
+    import torch
+
+    if opts.get("pretrained", "vggface2") == "none" and not os.environ.get("RESNET_ARTIFACT"):
+        from inference import export_resnet
+
+        artifact = os.path.join(pipe.workdir, "resnet_script.pt")
+        export_resnet(artifact, "script", image_size=int(os.environ.get("FACE_SIZE", "240")), pretrained=None)
+        _set_env(RESNET_ARTIFACT=artifact)
+    if not os.environ.get("WEIGHTS_PATH"):
+        names = sorted(set(opts.get("labels", {}).values())) or [
+            f"person_{i}" for i in range(opts.get("gallery_size", 100))
+        ]
+        emb = torch.nn.functional.normalize(torch.randn(len(names), 512), dim=1)
+        weights = os.path.join(pipe.workdir, "weights.pt")
+        torch.save([list(emb), names], weights)
+        _set_env(WEIGHTS_PATH=weights)
+
+
+def _start_p1_web(pipe, opts):
+    fake = pipe.fake
+    sdb, s3 = fake.client("sdb"), fake.client("s3")
+    s3.create_bucket(Bucket="local-in-bucket")
+    sdb.create_domain(DomainName="local-simpleDB")
+    items = [
+        {"Name": stem, "Attributes": [{"Name": "recognition", "Value": label, "Replace": True}]}
+        for stem, label in opts.get("labels", {}).items()
+    ]
+    for i in range(0, len(items), 25):
+        sdb.batch_put_attributes(DomainName="local-simpleDB", Items=items[i:i + 25])
+    _set_env(INPUT_BUCKET="local-in-bucket", SDB_DOMAIN="local-simpleDB")
+
+    server = _load(_P1_WEB, "p1_web_server")
+    httpd = server.ThreadingHTTPServer(("127.0.0.1", opts.get("port", 8000)), server.Handler)
+    threading.Thread(target=httpd.serve_forever, name="p1-web", daemon=True).start()
+    pipe._stoppers.append(httpd.shutdown)
+    pipe.modules["server"] = server
+    pipe.url = f"http://127.0.0.1:{httpd.server_address[1]}/"
+
+
+def _start_p1_app(pipe, opts):
+    from werkzeug.serving import make_server
+
+    fake = pipe.fake
+    _set_env(
+        INPUT_BUCKET="local-in-bucket", OUTPUT_BUCKET="local-out-bucket",
+        REQ_QUEUE_NAME="local-req-queue", RESP_QUEUE_NAME="local-resp-queue",
+    )
+    # Web tier creates the buckets and queues the app tier and controller look up
+    server = _load(_P1_APP_WEB, "p1_app_server")
+    pipe.request_queue_url, pipe.response_queue_url = server.REQ_URL, server.RESP_URL
+    httpd = make_server("127.0.0.1", opts.get("port", 8000), server.app, threaded=True)
+    threading.Thread(target=httpd.serve_forever, name="p1-app-web", daemon=True).start()
+    pipe._stoppers.append(httpd.shutdown)
+    pipe.url = f"http://127.0.0.1:{httpd.server_port}/"
+
+    model_dir = opts.get("model_dir", "/opt/app")
+    if os.path.exists(os.path.join(model_dir, "model_infer.py")):
+        sys.path.insert(0, model_dir)
+        from model_infer import predict
+    else:
+        predict = _LookupPredictor(
+            list_images(opts.get("images")), opts.get("labels", {}), opts.get("predict_ms", 100.0)
+        )
+
+    ids = fake.add_instances(opts.get("instances", 15), "app-tier-instance-", state="stopped")
+    backends, threads = {}, {}
+    lock = threading.Lock()
+
+    def run_instance(iid):
+        mod = backends.get(iid)
+        if mod is None:
+            mod = backends[iid] = _load(_P1_BACKEND, f"p1_backend_{iid}")
+            # This instance's process: every call fails once it is stopped
+            mod.s3, mod.sqs, mod.ec2 = (fake.client(s, instance_id=iid) for s in ("s3", "sqs", "ec2"))
+            mod.stop_myself = lambda: mod.ec2.stop_instances(InstanceIds=[iid])
+            mod.PREDICT = predict
+        try:
+            mod.main()
+        except BaseException as e:
+            print(f"[local] app-tier {iid} exited ({type(e).__name__})", flush=True)
+
+    def on_state(iid, state):
+        if iid not in ids or state != "running":
+            return
+        with lock:
+            t = threads.get(iid)
+            if t is not None and t.is_alive():
+                return
+            threads[iid] = threading.Thread(target=run_instance, args=(iid,), name=f"app-{iid}", daemon=True)
+            threads[iid].start()
+
+    fake.on_instance_state(on_state)
+    controller = _load(_P1_CONTROLLER, "p1_controller")
+    threading.Thread(target=controller.main, name="p1-controller", daemon=True).start()
+    pipe.modules.update(server=server, controller=controller)
+
+
+def _start_p2_lambdas(pipe, opts):
+    fake = pipe.fake
+    pipe.request_queue_url = fake.create_queue("local-req-queue")
+    pipe.response_queue_url = fake.create_queue("local-resp-queue")
+    _set_env(REQUEST_QUEUE_URL=pipe.request_queue_url, RESPONSE_QUEUE_URL=pipe.response_queue_url)
+    _recognition_env(pipe, opts)
+
+    fd = _load(_P2_FD, "p2_fd_lambda")
+    fr = _load(_P2_FR, "p2_fr_lambda")
+    trigger = SqsLambdaTrigger(
+        fake, pipe.request_queue_url, fr.lambda_handler, batch_size=opts.get("batch_size", 10),
+        concurrency=opts.get("lambda_concurrency", 1), function_name="face-recognition",
+    )
+    trigger.start()
+    pipe._stoppers.append(trigger.stop)
+
+    url = _FunctionUrlServer(fd.lambda_handler, opts.get("port", 8080))
+    url.start()
+    pipe._stoppers.append(url.stop)
+    pipe.modules.update(fd_lambda=fd, fr_lambda=fr)
+    pipe.url = f"http://127.0.0.1:{url.port}/"
+
+
+def _start_p2_edge(pipe, opts):
+    fake = pipe.fake
+    sys.path.insert(0, _EDGE_DIR)
+    ipc = install_greengrass_ipc()
+    pipe.request_queue_url = fake.create_queue("local-req-queue")
+    pipe.response_queue_url = fake.create_queue("local-resp-queue")
+    os.environ.setdefault("ASU_ID", "local")
+    os.environ.setdefault("OUTBOX_SPOOL", os.path.join(pipe.workdir, "outbox-spool.jsonl"))
+    os.environ.setdefault("DEDUP_PATH", os.path.join(pipe.workdir, "dedup.bin"))
+    _set_env(REQUEST_QUEUE_URL=pipe.request_queue_url, RESPONSE_QUEUE_URL=pipe.response_queue_url)
+    if os.environ.get("FEEDBACK_QUEUE_URL", "").strip():
+        _set_env(FEEDBACK_QUEUE_URL=fake.create_queue("local-feedback-queue"))
+    _recognition_env(pipe, opts)
+
+    fr = _load(_EDGE_FR, "p2_edge_fr_lambda")
+    trigger = SqsLambdaTrigger(
+        fake, pipe.request_queue_url, fr.lambda_handler, batch_size=opts.get("batch_size", 10),
+        concurrency=opts.get("lambda_concurrency", 1), function_name="face-recognition",
+    )
+    trigger.start()
+    pipe._stoppers.append(trigger.stop)
+
+    fd = _load(_EDGE_FD, "p2_edge_fd_component")
+    threading.Thread(target=fd.main, name="fd-component", daemon=True).start()
+    pipe._stoppers.append(fd._outbox.stop)
+    pipe.modules.update(fd_component=fd, fr_lambda=fr)
+    pipe.broker = ipc.broker
+    pipe.mqtt_topic = fd.MQTT_TOPIC
+    deadline = time.monotonic() + 30
+    while not ipc.broker.has_subscriber(pipe.mqtt_topic):
+        if time.monotonic() > deadline:
+            raise RuntimeError("fd_component did not subscribe to its topic")
+        time.sleep(0.05)
+
+
+_STARTERS = {
+    "p1-web": _start_p1_web,
+    "p1-app": _start_p1_app,
+    "p2-lambdas": _start_p2_lambdas,
+    "p2-edge": _start_p2_edge,
+}
+
+
+def start_pipeline(name: str, latency_ms=0.0, jitter: float = 0.0, ec2_boot_secs: float = 1.0,
+                   workdir=None, **opts) -> LocalPipeline:
+    """
+    Start pipeline `name` in this process. `opts`: port, labels ({stem:
+    label}), images (dir), predict_ms, model_dir, instances, pretrained,
+    gallery_size, batch_size, lambda_concurrency.
+    """
+    if name not in _STARTERS:
+        raise ValueError(f"pipeline must be one of {PIPELINES}, got {name!r}")
+    fake = FakeAws(latency_ms=latency_ms, jitter=jitter, ec2_boot_secs=ec2_boot_secs)
+    fake.install()
+    pipe = LocalPipeline(name, fake, workdir or tempfile.mkdtemp(prefix=f"{name}-"))
+    try:
+        _STARTERS[name](pipe, opts)
+    except BaseException:
+        pipe.stop()
+        raise
+    return pipe
+
+
+def latency_arg(args):
+    """--latency-ms plus --service-latency overrides as FakeAws(latency_ms=...)."""
+    if not args.service_latency:
+        return args.latency_ms
+    lat = {s: args.latency_ms for s in ("s3", "sdb", "sqs", "ec2")}
+    for item in args.service_latency:
+        key, _, ms = item.partition("=")
+        lat[key] = float(ms)
+    return lat
+
+
+def add_fake_args(ap) -> None:
+    """Options shared with tools/loadgen.py --local."""
+    ap.add_argument("--labels", help="CSV of image name,label (SimpleDB seed / expected answers)")
+    ap.add_argument("--images", help="directory of images (p1-app lookup predictor)")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="added to every fake AWS call")
+    ap.add_argument("--service-latency", nargs="*", default=[], metavar="SVC[.OP]=MS",
+                    help="per-service or per-operation latency, e.g. sqs=5 s3.get_object=30")
+    ap.add_argument("--jitter", type=float, default=0.0, help="+- fraction of the latency")
+    ap.add_argument("--instances", type=int, default=15, help="p1-app: app-tier instances")
+    ap.add_argument("--ec2-boot-secs", type=float, default=1.0)
+    ap.add_argument("--predict-ms", type=float, default=100.0, help="p1-app: lookup predictor delay")
+    ap.add_argument("--model-dir", default="/opt/app", help="p1-app: directory with model_infer.py")
+    ap.add_argument("--pretrained", default="vggface2", help="'vggface2', 'casia-webface' or 'none'")
+    ap.add_argument("--gallery-size", type=int, default=100)
+    ap.add_argument("--lambda-concurrency", type=int, default=1, help="recognition pollers")
+    ap.add_argument("--batch-size", type=int, default=10, help="SQS trigger batch size")
+
+
+def pipeline_opts(args) -> dict:
+    return {
+        "labels": read_labels(args.labels),
+        "images": args.images,
+        "latency_ms": latency_arg(args),
+        "jitter": args.jitter,
+        "ec2_boot_secs": args.ec2_boot_secs,
+        "instances": args.instances,
+        "predict_ms": args.predict_ms,
+        "model_dir": args.model_dir,
+        "pretrained": args.pretrained,
+        "gallery_size": args.gallery_size,
+        "lambda_concurrency": args.lambda_concurrency,
+        "batch_size": args.batch_size,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("pipeline", choices=PIPELINES)
+    ap.add_argument("--port", type=int, default=None, help="HTTP entry point (default 8000, 8080 for p2-lambdas)")
+    ap.add_argument("--stats-secs", type=float, default=30.0, help="period of the fake's stats line")
+    add_fake_args(ap)
+    args = ap.parse_args()
+
+    port = args.port if args.port is not None else (8080 if args.pipeline == "p2-lambdas" else 8000)
+    pipe = start_pipeline(args.pipeline, port=port, **pipeline_opts(args))
+    print(
+        f"[local] {args.pipeline} up: url={pipe.url} mqtt_topic={pipe.mqtt_topic} "
+        f"request_queue={pipe.request_queue_url} response_queue={pipe.response_queue_url}",
+        flush=True,
+    )
+    try:
+        while True:
+            time.sleep(args.stats_secs)
+            print(f"[local] stats {json.dumps(pipe.fake.stats())}", flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pipe.stop()
+
+
+if __name__ == "__main__":
+    main()